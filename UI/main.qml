@@ -297,7 +297,6 @@ ApplicationWindow {
                 
                 onLoaded: {
                     item.currentFolder = Qt.binding(function() { return fileBrowserComponent.currentFolder })
-                    item.folderContents = Qt.binding(function() { return fileBrowserComponent.folderContents })
                     item.fieldtripPath = Qt.binding(function() { return window.fieldtripPath })
                     item.saveMessage = Qt.binding(function() { return window.saveMessage })
                     
@@ -350,7 +349,6 @@ ApplicationWindow {
                     // Bind fileBrowser properties
                     if (item) {
                         item.currentFolder = Qt.binding(function() { return fileBrowserComponent.currentFolder })
-                        item.folderContents = Qt.binding(function() { return fileBrowserComponent.folderContents })
                         
                         // Connect signals
                         item.openFolderDialog.connect(function() { fileBrowserComponent.folderDialog.open() })
@@ -392,7 +390,6 @@ ApplicationWindow {
                     // Bind fileBrowser properties
                     if (item) {
                         item.currentFolder = Qt.binding(function() { return fileBrowserComponent.currentFolder })
-                        item.folderContents = Qt.binding(function() { return fileBrowserComponent.folderContents })
                         
                         // Connect signals
                         item.openFolderDialog.connect(function() { fileBrowserComponent.folderDialog.open() })
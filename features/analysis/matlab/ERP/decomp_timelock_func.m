@@ -19,47 +19,62 @@ else
 end
 
 matFilePath = fullfile(dataFolder, 'data_ICApplied_clean.mat');
-fprintf('Loading data from: %s\n', matFilePath);
-
-if ~exist(matFilePath, 'file')
-    error('Required file data_ICApplied_clean.mat not found in %s', dataFolder);
+storePath = fullfile(dataFolder, 'subjects.h5');
+storeSubjects = {};
+if exist(storePath, 'file') && exist('store_list_subjects', 'file')
+    storeSubjects = store_list_subjects(storePath, 'clean_data');
 end
 
-% Load the cleaned data variable saved by browse_ICA
-try
-    loadedData = load(matFilePath, 'clean_data');
-catch loadErr
-    error('Failed to load data_ICApplied_clean.mat: %s', loadErr.message);
-end
+if ~isempty(storeSubjects)
+    % Subjects are read one at a time from the chunked store inside the loop
+    fprintf('Reading clean_data per subject from: %s\n', storePath);
+    data_ICApplied_clean = storeSubjects(:);
+else
+    fprintf('Loading data from: %s\n', matFilePath);
 
-if ~isfield(loadedData, 'clean_data')
-    error('Variable "clean_data" not found inside data_ICApplied_clean.mat.');
-end
+    if ~exist(matFilePath, 'file')
+        error('Required file data_ICApplied_clean.mat not found in %s', dataFolder);
+    end
+
+    % Load the cleaned data variable saved by browse_ICA
+    try
+        loadedData = load(matFilePath, 'clean_data');
+    catch loadErr
+        error('Failed to load data_ICApplied_clean.mat: %s', loadErr.message);
+    end
+
+    if ~isfield(loadedData, 'clean_data')
+        error('Variable "clean_data" not found inside data_ICApplied_clean.mat.');
+    end
 
-data_ICApplied_clean = loadedData.clean_data;
-fprintf('Successfully loaded clean_data from data_ICApplied_clean.mat\n');
-
-% Normalize loaded data to a cell array so downstream code can use brace indexing
-fprintf('Examining data structure...\n');
-if iscell(data_ICApplied_clean)
-    fprintf('data_ICApplied_clean is a cell array with %d elements\n', length(data_ICApplied_clean));
-    data_ICApplied_clean = data_ICApplied_clean(:);
-elseif isstruct(data_ICApplied_clean)
-    fprintf('data_ICApplied_clean is a struct array with %d element(s)\n', numel(data_ICApplied_clean));
-    if numel(data_ICApplied_clean) == 1
-        data_ICApplied_clean = {data_ICApplied_clean};
+    data_ICApplied_clean = loadedData.clean_data;
+    fprintf('Successfully loaded clean_data from data_ICApplied_clean.mat\n');
+
+    % Normalize loaded data to a cell array so downstream code can use brace indexing
+    fprintf('Examining data structure...\n');
+    if iscell(data_ICApplied_clean)
+        fprintf('data_ICApplied_clean is a cell array with %d elements\n', length(data_ICApplied_clean));
+        data_ICApplied_clean = data_ICApplied_clean(:);
+    elseif isstruct(data_ICApplied_clean)
+        fprintf('data_ICApplied_clean is a struct array with %d element(s)\n', numel(data_ICApplied_clean));
+        if numel(data_ICApplied_clean) == 1
+            data_ICApplied_clean = {data_ICApplied_clean};
+        else
+            data_ICApplied_clean = num2cell(data_ICApplied_clean(:));
+        end
     else
-        data_ICApplied_clean = num2cell(data_ICApplied_clean(:));
+        error('Unsupported data type for data_ICApplied_clean: %s', class(data_ICApplied_clean));
     end
-else
-    error('Unsupported data type for data_ICApplied_clean: %s', class(data_ICApplied_clean));
-end
 
-if isempty(data_ICApplied_clean)
-    error('data_ICApplied_clean is empty after normalization.');
+    if isempty(data_ICApplied_clean)
+        error('data_ICApplied_clean is empty after normalization.');
+    end
 end
 
 first_elem = data_ICApplied_clean{1};
+if ischar(first_elem)
+    first_elem = store_read_subject(storePath, first_elem, 'clean_data', 'trials', 1);
+end
 fprintf('First element type after normalization: %s\n', class(first_elem));
 if isstruct(first_elem)
     fprintf('First element fields: %s\n', strjoin(fieldnames(first_elem), ', '));
@@ -119,56 +134,35 @@ else
     fprintf('FieldTrip already initialized\n');
 end
 
-data_ICApplied_clean_decomp = struct( ...
-    'target_data', cell(1, numTrials), ...
-    'standard_data', cell(1, numTrials), ...
-    'novelty_data', cell(1, numTrials));
+% Condition codes in trialinfo and the ERP_data field each one fills
+condition_codes = [200 201 202];
+condition_names = {'target', 'standard', 'novelty'};
 
-fprintf('Starting decomposition...\n');
-for i = 1:numTrials
-    fprintf('Processing trial %d/%d\n', i, numTrials);
-    
-    % Debug: examine what we're passing to decompose
-    fprintf('Examining data_ICApplied_clean{%d}:\n', i);
-    trial_data = data_ICApplied_clean{i};
-    fprintf('Type: %s\n', class(trial_data));
-    if iscell(trial_data)
-        fprintf('Cell array with %d elements\n', length(trial_data));
-        if length(trial_data) > 0
-            fprintf('First element type: %s\n', class(trial_data{1}));
-        end
-    elseif isstruct(trial_data)
-        fprintf('Struct with fields: %s\n', strjoin(fieldnames(trial_data), ', '));
-        if isfield(trial_data, 'trialinfo')
-            fprintf('Has trialinfo field\n');
-        else
-            fprintf('Missing trialinfo field\n');
-        end
-    else
-        fprintf('Other type: %s\n', class(trial_data));
-    end
-    
-    [data_ICApplied_clean_decomp(i).target_data, ...
-        data_ICApplied_clean_decomp(i).standard_data, ...
-        data_ICApplied_clean_decomp(i).novelty_data] = decompose(data_ICApplied_clean{i});
-end
-fprintf('Decomposition completed\n');
-
-% time lock analysis
+% time lock analysis: one grouped pass per subject instead of a copy and
+% an ft_timelockanalysis per condition
 fprintf('Starting timelock analysis...\n');
 ERP_data = struct( ...
     'target', cell(1, numTrials), ...
     'standard', cell(1, numTrials), ...
     'novelty', cell(1, numTrials));
 
+cfg = [];
+cfg.latency = [0 1];
+
 for i = 1:numTrials
-    fprintf('Timelock analysis for trial %d/%d\n', i, numTrials);
-    cfg = [];
-    cfg.latency = [0 1];
-    
-    ERP_data(i).target = ft_timelockanalysis(cfg, data_ICApplied_clean_decomp(i).target_data);
-    ERP_data(i).standard = ft_timelockanalysis(cfg, data_ICApplied_clean_decomp(i).standard_data);
-    ERP_data(i).novelty = ft_timelockanalysis(cfg, data_ICApplied_clean_decomp(i).novelty_data);
+    fprintf('Timelock analysis for subject %d/%d\n', i, numTrials);
+    trial_data = data_ICApplied_clean{i};
+    if ischar(trial_data)
+        trial_data = store_read_subject(storePath, trial_data, 'clean_data');
+    end
+    if ~isstruct(trial_data) || ~isfield(trial_data, 'trialinfo')
+        error('Subject %d has no trialinfo; cannot split conditions.', i);
+    end
+
+    timelocks = grouped_timelock(trial_data, condition_codes, cfg.latency);
+    for k = 1:numel(condition_codes)
+        ERP_data(i).(condition_names{k}) = timelocks(k);
+    end
 end
 fprintf('Timelock analysis completed\n');
 
@@ -180,7 +174,13 @@ fprintf('Timelock analysis completed\n');
 %old_novelty = extract_erp_data(ERP_data, 'novelty');
 
 outputPath = fullfile(dataFolder, 'erp_output.mat');
-save(outputPath, 'ERP_data');
+if ~isempty(storeSubjects)
+    % Names ERP_data(i), so exports pair results with subjects by name
+    subjects = storeSubjects;
+    save(outputPath, 'ERP_data', 'subjects');
+else
+    save(outputPath, 'ERP_data');
+end
 fprintf('ERP analysis results saved to %s\n', outputPath);
 end
 
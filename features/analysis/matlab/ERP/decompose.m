@@ -1,15 +1,18 @@
 function [target, standard, novelty] =  decompose(data)
 
     cfg= [];
-      
 
-    cfg.trials = (data.trialinfo==200);
+    % Copies of each condition for callers that need them as separate
+    % structures; analyses should pass trial_index positions as cfg.trials
+    conditions = trial_index(data);
+
+    cfg.trials = conditions.target;
     target = ft_selectdata(cfg, data);
 
-    cfg.trials = (data.trialinfo==201);
+    cfg.trials = conditions.standard;
     standard = ft_selectdata(cfg, data);
 
-    cfg.trials = (data.trialinfo==202);
+    cfg.trials = conditions.novelty;
     novelty = ft_selectdata(cfg, data);
 
-end
\ No newline at end of file
+end
@@ -0,0 +1,64 @@
+function timelocks = grouped_timelock(data, codes, latency)
+% GROUPED_TIMELOCK Per-condition ERP (avg/var/dof) of one subject in a single pass
+%   timelocks = grouped_timelock(data, codes, latency)
+%
+% Replaces ft_selectdata per condition followed by ft_timelockanalysis on
+% each copy. Each trial is visited once and added in place to the running
+% sum and sum of squares of its condition, so no copy of the trials is
+% made; avg, var and dof follow the formulas ft_timelockanalysis uses.
+%
+% Inputs:
+%   data    - FieldTrip raw structure with trialinfo (equal-length trials)
+%   codes   - trialinfo codes, e.g. [200 201 202]
+%   latency - [begin end] in seconds; omit or [] for the whole trial
+%
+% Output:
+%   timelocks - struct array, timelocks(k) is the timelock of codes(k) with
+%               avg, var, dof, time, label and dimord ('chan_time')
+
+if nargin < 3 || isempty(latency)
+    latency = [-inf inf];
+end
+
+ntrials = numel(data.trial);
+nchan = numel(data.label);
+time = data.time{1};
+if any(cellfun(@numel, data.time) ~= numel(time))
+    error('grouped_timelock:UnequalTrials', 'grouped_timelock needs trials of equal length.');
+end
+
+% Same tolerance ft_selectdata allows around the latency edges
+tolerance = 1e-6 * median(diff(time));
+selected = time >= latency(1) - tolerance & time <= latency(2) + tolerance;
+ntime = sum(selected);
+
+ncodes = numel(codes);
+sums = zeros(nchan, ntime, ncodes);
+squares = zeros(nchan, ntime, ncodes);
+counts = zeros(1, ncodes);
+trial_codes = data.trialinfo(:, 1);
+for t = 1:ntrials
+    matches = find(codes(:)' == trial_codes(t));
+    if isempty(matches)
+        continue
+    end
+    x = double(data.trial{t}(:, selected));  % accumulate in double even for single-precision trials
+    for k = matches
+        sums(:, :, k) = sums(:, :, k) + x;
+        squares(:, :, k) = squares(:, :, k) + x .^ 2;
+        counts(k) = counts(k) + 1;
+    end
+end
+
+timelocks = struct('avg', {}, 'var', {}, 'dof', {}, 'time', {}, 'label', {}, 'dimord', {});
+for k = 1:numel(codes)
+    n = counts(k);
+    timelocks(k).avg = sums(:, :, k) / n;
+    timelocks(k).var = (squares(:, :, k) - sums(:, :, k) .^ 2 / n) / (n - 1);
+    timelocks(k).dof = repmat(n, nchan, ntime);
+    timelocks(k).time = time(selected);
+    timelocks(k).label = data.label;
+    timelocks(k).dimord = 'chan_time';
+end
+
+end
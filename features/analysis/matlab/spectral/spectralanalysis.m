@@ -11,17 +11,18 @@ cfg.foi = 1 : 0.5 : 15;        % Frequencies of interest (e.g., 1 to 30 Hz in 1
 
 % 3. Run the spectral analysis on the task data variables
 % This will compute the average power spectrum across all trials
-cfg.trials   = (data.trialinfo == S200);
-target = ft_selectdata(cfg, data);
-spectr_target = ft_freqanalysis(cfg, target);
+% Condition positions are found once; ft_freqanalysis selects cfg.trials
+% itself, so no per-condition copy of the data is made
+conditions = trial_index(data);
 
-cfg.trials   = (data.trialinfo == S201);
-standard = ft_selectdata(cfg, data);
-spectr_standard = ft_freqanalysis(cfg, standard);
+cfg.trials   = conditions.target;
+spectr_target = ft_freqanalysis(cfg, data);
 
-cfg.trials   = (data.trialinfo == S202);
-novelty = ft_selectdata(cfg, data);
-spectr_novelty = ft_freqanalysis(cfg, novelty);
+cfg.trials   = conditions.standard;
+spectr_standard = ft_freqanalysis(cfg, data);
+
+cfg.trials   = conditions.novelty;
+spectr_novelty = ft_freqanalysis(cfg, data);
 
 
 % bu scripte gerek yok, time freqle yapılabilir
\ No newline at end of file
@@ -9,17 +9,18 @@ cfg.foi        = 1 : 0.5 : 15;
 cfg.pad = 8;
 cfg.width = 3;
 
-cfg.trials   = (data.trialinfo == S200);
-target = ft_selectdata(cfg, data);
-freq_target = ft_freqanalysis(cfg, target);
+% Condition positions are found once; ft_freqanalysis selects cfg.trials
+% itself, so no per-condition copy of the data is made
+conditions = trial_index(data);
 
-cfg.trials   = (data.trialinfo == S201);
-standard = ft_selectdata(cfg, data);
-freq_standard = ft_freqanalysis(cfg, standard);
+cfg.trials   = conditions.target;
+freq_target = ft_freqanalysis(cfg, data);
 
-cfg.trials   = (data.trialinfo == S202);
-novelty = ft_selectdata(cfg, data);
-freq_novelty = ft_freqanalysis(cfg, novelty);
+cfg.trials   = conditions.standard;
+freq_standard = ft_freqanalysis(cfg, data);
+
+cfg.trials   = conditions.novelty;
+freq_novelty = ft_freqanalysis(cfg, data);
 
 % decomposeu preprocessinge koy, erpden çıkar
 % baseline correction stage, time freqten sonra yap
@@ -0,0 +1,52 @@
+function index = trial_index(data, codes, names)
+% TRIAL_INDEX Trial positions of each condition code, built once per subject
+%   index = trial_index(data)
+%   index = trial_index(data, codes, names)
+%
+% Shared by the analysis scripts instead of re-evaluating
+% (data.trialinfo == code) and copying each condition with ft_selectdata.
+% The positions go straight into cfg.trials of ft_freqanalysis /
+% ft_timelockanalysis, which select the trials themselves, so no per-
+% condition copy of the data is ever kept:
+%
+%   index = trial_index(data);
+%   cfg.trials = index.target;
+%   freq_target = ft_freqanalysis(cfg, data);
+%
+% Inputs:
+%   data  - FieldTrip raw structure with trialinfo
+%   codes - trialinfo codes (default [200 201 202])
+%   names - field name per code (default {'target','standard','novelty'})
+%
+% Output:
+%   index - struct with one field per name holding the ascending trial
+%           positions of that code (empty when the code does not occur),
+%           plus codes, names and counts
+
+if nargin < 2 || isempty(codes)
+    codes = [200 201 202];
+end
+if nargin < 3 || isempty(names)
+    if isequal(codes(:)', [200 201 202])
+        names = {'target', 'standard', 'novelty'};
+    else
+        names = arrayfun(@(code) sprintf('code%d', code), codes, 'UniformOutput', false);
+    end
+end
+if ~isfield(data, 'trialinfo')
+    error('trial_index:NoTrialinfo', 'Data has no trialinfo; cannot split conditions.');
+end
+
+trial_codes = data.trialinfo(:, 1);
+
+index = struct();
+counts = zeros(1, numel(codes));
+for k = 1:numel(codes)
+    index.(names{k}) = find(trial_codes == codes(k))';
+    counts(k) = numel(index.(names{k}));
+end
+index.codes = codes(:)';
+index.names = names;
+index.counts = counts;
+
+end
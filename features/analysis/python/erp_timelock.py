@@ -0,0 +1,138 @@
+"""Grouped ERP timelock over trialinfo codes, for every subject in one sweep.
+
+NumPy counterpart of decomp_timelock_func.m / grouped_timelock.m. Instead of
+copying each condition's trials (ft_selectdata) and averaging every copy
+(ft_timelockanalysis), each subject's trials are reduced once against a
+trials x codes indicator matrix::
+
+    sums    = G' @ X        squares = G' @ X**2        counts = G.sum(0)
+    avg = sums / n          var = (squares - sums**2 / n) / (n - 1)
+
+which are the formulas ft_timelockanalysis uses, so ``avg``/``var``/``dof``
+match its output. Trials are read as zero-copy blocks of the shared trial
+cache and reduced in chunks, so memory stays at one chunk plus the results.
+Any set of codes works; the defaults are the target/standard/novelty codes
+split by decompose.m.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import scipy.io
+
+from features.analysis.python.trial_index import TrialIndex
+from features.preprocessing.python.dataset_registry import shared_trial_cache
+from features.preprocessing.python.trial_cache import CONDITION_CODES, TrialCache
+
+ERP_OUTPUT_FILENAME = 'erp_output.mat'
+DEFAULT_CODES = tuple(CONDITION_CODES)
+DEFAULT_LATENCY = (0.0, 1.0)  # cfg.latency in decomp_timelock_func.m
+CHUNK_TRIALS = 256
+
+
+def latency_mask(time: np.ndarray, latency: Optional[Sequence[float]]) -> np.ndarray:
+    """Samples inside [begin, end] with the small tolerance ft_selectdata allows at the edges"""
+    time = np.asarray(time, dtype=float)
+    if latency is None:
+        return np.ones(len(time), dtype=bool)
+    tolerance = 1e-6 * (np.median(np.diff(time)) if len(time) > 1 else 0.0)
+    return (time >= latency[0] - tolerance) & (time <= latency[1] + tolerance)
+
+
+def grouped_moments(trials: np.ndarray, index: TrialIndex, codes: Sequence[float],
+                    samples: Optional[np.ndarray] = None, chunk: int = CHUNK_TRIALS) -> Dict[str, np.ndarray]:
+    """Per-code sums, sums of squares and counts of a (trials, channels, time) block
+
+    ``samples`` selects time points (e.g. a latency mask). Trials are visited
+    once, ``chunk`` at a time, and accumulated in float64.
+    """
+    indicator = index.indicator(codes)
+    shape = trials.shape[1:] if samples is None else (trials.shape[1], int(np.count_nonzero(samples)))
+    sums = np.zeros((len(codes),) + shape)
+    squares = np.zeros((len(codes),) + shape)
+    for start in range(0, len(trials), chunk):
+        block = np.asarray(trials[start:start + chunk], dtype=np.float64)
+        if samples is not None:
+            block = block[..., samples]
+        weights = indicator[start:start + chunk]
+        sums += np.tensordot(weights, block, axes=(0, 0))
+        squares += np.tensordot(weights, block * block, axes=(0, 0))
+    return {'sums': sums, 'squares': squares, 'counts': indicator.sum(axis=0)}
+
+
+def timelock_from_moments(moments: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """avg/var/dof arrays (codes, channels, time) as ft_timelockanalysis computes them"""
+    counts = moments['counts'][:, None, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = moments['sums'] / counts
+        var = (moments['squares'] - moments['sums'] ** 2 / counts) / (counts - 1)
+    dof = np.broadcast_to(counts, avg.shape).copy()
+    return {'avg': avg, 'var': var, 'dof': dof}
+
+
+def grouped_timelock(trials: np.ndarray, trial_codes: np.ndarray, time: np.ndarray, label: Sequence[str],
+                     codes: Sequence[float] = DEFAULT_CODES,
+                     latency: Optional[Sequence[float]] = DEFAULT_LATENCY) -> List[Dict[str, Any]]:
+    """FieldTrip-style timelock dicts (avg, var, dof, time, label, dimord), one per code"""
+    samples = latency_mask(time, latency)
+    result = timelock_from_moments(grouped_moments(trials, TrialIndex(trial_codes), codes, samples))
+    selected_time = np.asarray(time, dtype=float)[samples]
+    return [
+        {'avg': result['avg'][k], 'var': result['var'][k], 'dof': result['dof'][k],
+         'time': selected_time, 'label': list(label), 'dimord': 'chan_time'}
+        for k in range(len(codes))
+    ]
+
+
+def cache_timelocks(cache: TrialCache, codes: Sequence[float] = DEFAULT_CODES,
+                    latency: Optional[Sequence[float]] = DEFAULT_LATENCY) -> Dict[str, Any]:
+    """Grouped timelocks of every subject of a trial cache, stacked as (subjects, codes, channels, time)"""
+    samples = latency_mask(cache.time, latency)
+    stacked = {name: [] for name in ('avg', 'var', 'dof')}
+    for subject in cache.subjects:
+        block = cache.block(subject)  # zero-copy slice; rows of a subject are contiguous
+        moments = grouped_moments(block, TrialIndex.from_cache(cache, subject), codes, samples)
+        for name, value in timelock_from_moments(moments).items():
+            stacked[name].append(value)
+    return {
+        'subjects': list(cache.subjects),
+        'codes': list(codes),
+        'label': list(cache.label),
+        'time': cache.time[samples],
+        **{name: np.stack(values) if values else np.zeros((0, len(codes), len(cache.label), int(samples.sum())))
+           for name, values in stacked.items()},
+    }
+
+
+def _erp_struct_array(result: Dict[str, Any], names: Sequence[str]) -> np.ndarray:
+    """1 x N ERP_data struct array (one field per condition) as decomp_timelock_func.m saves it"""
+    timelock_fields = ['avg', 'var', 'dof', 'time', 'label', 'dimord']
+    label = np.empty((len(result['label']), 1), dtype=object)
+    label[:, 0] = result['label']
+    out = np.empty((1, len(result['subjects'])), dtype=[(name, object) for name in names])
+    for position in range(len(result['subjects'])):
+        conditions = []
+        for k in range(len(names)):
+            timelock = np.empty((1, 1), dtype=[(name, object) for name in timelock_fields])
+            timelock[0, 0] = (result['avg'][position, k], result['var'][position, k], result['dof'][position, k],
+                              result['time'][None, :], label, 'chan_time')
+            conditions.append(timelock)
+        out[0, position] = tuple(conditions)
+    return out
+
+
+def erp_folder(folder: str, codes: Sequence[float] = DEFAULT_CODES,
+               latency: Optional[Sequence[float]] = DEFAULT_LATENCY, save: bool = True) -> Dict[str, Any]:
+    """Grouped ERPs for a folder's cleaned data, optionally saved as ERP_data (and subjects) in erp_output.mat"""
+    cache = shared_trial_cache(folder)
+    if cache is None:
+        raise FileNotFoundError(f"No cleaned data to build a trial cache from in {folder}")
+    result = cache_timelocks(cache, codes, latency)
+    if save:
+        names = [CONDITION_CODES.get(int(code), f'code{int(code)}') for code in codes]
+        result['path'] = os.path.join(folder, ERP_OUTPUT_FILENAME)
+        scipy.io.savemat(result['path'], {'ERP_data': _erp_struct_array(result, names),
+                                          'subjects': np.array(result['subjects'], dtype=object)},
+                         do_compression=True)
+    return result
@@ -0,0 +1,169 @@
+"""Shared plumbing for the NumPy ft_freqanalysis engines.
+
+Reads the cfg of timefreqanalysis.m / spectralanalysis.m, runs an engine
+over every (subject, condition) of a folder's trial cache (opened once through
+the dataset registry) via the subject's TrialIndex views, and saves the
+results as ``<prefix>_<condition>`` struct arrays (one element per subject),
+which is what the MATLAB scripts produce and what result_export reads.
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+import scipy.io
+
+from features.analysis.python.trial_index import DEFAULT_CODES, TrialIndex, condition_names
+from features.preprocessing.python.dataset_registry import shared_trial_cache
+
+ANALYSIS_MATLAB_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'matlab')
+TIMEFREQ_SCRIPT = os.path.join(ANALYSIS_MATLAB_DIR, 'timefrequency', 'timefreqanalysis.m')
+SPECTRAL_SCRIPT = os.path.join(ANALYSIS_MATLAB_DIR, 'spectral', 'spectralanalysis.m')
+
+# An engine maps (trials x channels x samples, trial time, fsample) to the
+# fields of one FieldTrip freq structure (powspctrm/fourierspctrm, freq, time, dimord)
+Engine = Callable[[np.ndarray, np.ndarray, float], Dict[str, Any]]
+
+
+def matlab_vector(text: str) -> np.ndarray:
+    """Numbers of a MATLAB scalar, [a b c] list or a:step:b range"""
+    text = text.strip().strip('[]').strip()
+    parts = [part.strip() for part in text.split(':')]
+    if len(parts) in (2, 3) and all(parts):
+        start, stop = float(parts[0]), float(parts[-1])
+        step = float(parts[1]) if len(parts) == 3 else 1.0
+        # Same count MATLAB's colon gives, without the float drift of np.arange
+        count = int(np.floor((stop - start) / step + 1e-10)) + 1
+        return start + step * np.arange(max(count, 0))
+    return np.array([float(value) for value in re.split(r'[\s,;]+', text) if value])
+
+
+def read_freq_cfg(script_path: str) -> Dict[str, Any]:
+    """cfg.<name> assignments made before the script's first ft_freqanalysis call
+
+    Quoted values come back as strings, numeric values as float arrays;
+    later cfg blocks (e.g. the baseline correction) are ignored.
+    """
+    with open(script_path, 'r', encoding='utf-8') as file:
+        # Drop comments so disabled settings are not picked up
+        content = '\n'.join(line.split('%', 1)[0] for line in file.read().splitlines())
+    content = content.split('ft_freqanalysis', 1)[0]
+
+    cfg: Dict[str, Any] = {}
+    for name, value in re.findall(r'cfg\.(\w+)\s*=\s*([^;\n]+);', content):
+        value = value.strip()
+        if value.startswith("'"):
+            cfg[name] = value.strip("'")
+        elif name != 'trials':
+            try:
+                cfg[name] = matlab_vector(value)
+            except ValueError:
+                continue
+    return cfg
+
+
+def cfg_scalar(cfg: Dict[str, Any], name: str, default=None):
+    """A numeric cfg value as a float, a string value as is, or ``default``"""
+    value = cfg.get(name, default)
+    if isinstance(value, np.ndarray):
+        return float(value[0]) if value.size else default
+    return value
+
+
+def demean(trials: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """cfg.polyremoval = 0 (ft_freqanalysis' default): remove each trial's mean per channel"""
+    block = np.asarray(trials, dtype=dtype)
+    return block - block.mean(axis=-1, keepdims=True)
+
+
+def padded_length(n_samples: int, fsample: float, pad) -> int:
+    """Samples after cfg.pad: seconds, 'nextpow2' or 'maxperlen'/None (no padding)"""
+    if pad is None or pad == 'maxperlen':
+        return n_samples
+    if pad == 'nextpow2':
+        return int(2 ** np.ceil(np.log2(n_samples)))
+    length = int(round(float(pad) * fsample))
+    if length < n_samples:
+        raise ValueError(f"cfg.pad ({float(pad)} s) is shorter than the trials ({n_samples / fsample} s)")
+    return length
+
+
+def trial_chunks(n_trials: int, bytes_per_trial: int, budget: int) -> List[slice]:
+    """Trial slices whose working set stays under ``budget`` bytes"""
+    size = max(1, int(budget // max(bytes_per_trial, 1)))
+    return [slice(start, min(start + size, n_trials)) for start in range(0, n_trials, size)]
+
+
+def freq_struct_array(results: List[Dict[str, Any]], label: Sequence[str]) -> np.ndarray:
+    """1 x N struct array of FieldTrip freq structures, one per subject"""
+    labels = np.empty((len(label), 1), dtype=object)
+    labels[:, 0] = list(label)
+    fields = ['label'] + (list(results[0]) if results else ['dimord', 'freq', 'powspctrm'])
+    out = np.empty((1, len(results)), dtype=[(name, object) for name in fields])
+    for position, result in enumerate(results):
+        values = {'label': labels, **result}
+        out[0, position] = tuple(
+            np.asarray(values[name], dtype=float)[None, :] if name in ('freq', 'time') else values[name]
+            for name in fields
+        )
+    return out
+
+
+def empty_result(template: Dict[str, Any]) -> Dict[str, Any]:
+    """The result of a condition without trials, shaped after ``template`` (another condition's result)
+
+    Per-trial outputs (dimord 'rpt...') get zero trials; averaged spectra are
+    all NaN, like the avg of an empty condition in erp_timelock.
+    """
+    per_trial = str(template.get('dimord', '')).startswith('rpt')
+    out = {}
+    for name, value in template.items():
+        if name in ('freq', 'time') or not isinstance(value, np.ndarray) or value.dtype.kind not in 'fc':
+            out[name] = value
+        else:
+            out[name] = value[:0] if per_trial else np.full_like(value, np.nan)
+    return out
+
+
+def freq_folder(folder: str, engine: Engine, prefix: str, filename: str,
+                codes: Sequence[float] = DEFAULT_CODES, save: bool = True) -> Dict[str, Any]:
+    """Run ``engine`` on every subject and condition of a folder's trial cache
+
+    Returns {'subjects', 'conditions', 'label', 'results': {condition: [per subject]},
+    'empty': {condition: [subjects without trials]}} and, with ``save``, writes
+    ``<prefix>_<condition>`` variables and the ``subjects`` names to ``filename``. A subject without trials
+    of a condition gets an ``empty_result`` there, so every struct array keeps
+    one element per subject in ``subjects`` order.
+    """
+    cache = shared_trial_cache(folder)
+    if cache is None:
+        raise FileNotFoundError(f"No cleaned data to build a trial cache from in {folder}")
+    names = condition_names(codes)
+    results: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+    empty: Dict[str, List[str]] = {name: [] for name in names}
+    template = None
+    for subject in cache.subjects:
+        index = TrialIndex.from_cache(cache, subject)
+        block = cache.block(subject)  # zero-copy; conditions are contiguous slices of it
+        for name, (code, trials) in zip(names, index.views(block, codes)):
+            if len(trials) == 0:
+                print(f"Warning: {subject} has no '{name}' trials; storing an empty result")
+                empty[name].append(subject)
+                results[name].append(None)
+                continue
+            results[name].append(engine(trials, cache.time, cache.fsample))
+            template = template or results[name][-1]
+    if template is None and cache.subjects:
+        raise ValueError(f"No trials of any condition ({', '.join(names)}) in {folder}")
+    for name in names:
+        results[name] = [empty_result(template) if result is None else result for result in results[name]]
+
+    summary = {'subjects': list(cache.subjects), 'conditions': names, 'label': list(cache.label),
+               'results': results, 'empty': empty}
+    if save:
+        summary['path'] = os.path.join(folder, filename)
+        variables = {f'{prefix}_{name}': freq_struct_array(results[name], cache.label) for name in names}
+        variables['subjects'] = np.array(list(cache.subjects), dtype=object)  # names the struct array elements
+        scipy.io.savemat(summary['path'], variables, do_compression=True)
+    return summary
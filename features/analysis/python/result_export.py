@@ -0,0 +1,322 @@
+"""Columnar (Arrow/Parquet) export of FieldTrip analysis results.
+
+ERP timelocks (``ERP_data``), time-frequency (``freq_*``), spectra
+(``spectr_*``) and inter-trial coherence (``itc``) are flattened into one long
+table::
+
+    subject | condition | measure | channel | freq | time | value
+
+Subjects are named by the ``subjects`` cell array saved beside the results
+(one name per struct array element), so rows are keyed by subject name, not
+by position. ``subject``, ``condition``, ``measure`` and ``channel`` are dictionary
+encoded and rows are written grouped by subject and condition, so Parquet
+row-group statistics let filtered reads skip most of the file. Group-level
+questions (grand averages, per-channel contrasts) then run from Python
+without a MATLAB session.
+
+pyarrow is only needed for writing/reading the tables; the flattening itself
+uses NumPy alone.
+"""
+
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.io
+
+from features.preprocessing.python.eeglab_io import is_hdf5_mat
+from features.preprocessing.python.fieldtrip_h5 import CellProxy, StructProxy, open_fieldtrip_mat
+from features.preprocessing.python.mat_inspect import inspect_mat
+
+RESULTS_FILENAME = 'results.parquet'
+RESULT_PARAMETERS = ('avg', 'var', 'powspctrm', 'fourierspctrm', 'itpc', 'itlc')
+RESULT_VARIABLE_PREFIXES = ('ERP_data', 'freq_', 'spectr_', 'itc')
+DICTIONARY_COLUMNS = ('subject', 'condition', 'measure', 'channel')
+# Cell array of subject names, in struct array order, saved by the analysis engines
+SUBJECTS_VARIABLE = 'subjects'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Result export needs pyarrow; install it with 'pip install pyarrow'") from e
+    return pyarrow, pyarrow.parquet
+
+
+# Struct access shared by scipy mat_structs, dicts and v7.3 proxies ----------
+
+def _field(obj, name: str, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    if isinstance(obj, StructProxy):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def _field_names(obj) -> List[str]:
+    if isinstance(obj, dict):
+        return list(obj.keys())
+    if isinstance(obj, StructProxy):
+        return obj.keys()
+    return list(getattr(obj, '_fieldnames', []))
+
+
+def _elements(obj) -> List[Any]:
+    if isinstance(obj, np.ndarray) and obj.dtype == object:
+        return list(obj.ravel())
+    if isinstance(obj, StructProxy):
+        return list(obj)
+    return [obj]
+
+
+def _strings(value) -> List[str]:
+    if isinstance(value, CellProxy):
+        return [str(item) for item in value]
+    if isinstance(value, str):
+        return [value]
+    return [str(item) for item in np.asarray(value, dtype=object).ravel()]
+
+
+def _is_result(obj) -> bool:
+    return _field(obj, 'dimord') is not None and _field(obj, 'label') is not None
+
+
+def _dimord(obj) -> List[str]:
+    dimord = _field(obj, 'dimord')
+    return str(dimord).split('_')
+
+
+# Flattening -------------------------------------------------------------
+
+def flatten_result(result, parameter: str) -> Optional[Dict[str, np.ndarray]]:
+    """Flatten one FieldTrip result parameter to channel/freq/time/value columns
+
+    Repetition dimensions (rpt, rpttap) are averaged; complex Fourier spectra
+    are exported as power, mean(|F|^2) over tapers.
+    """
+    value = _field(result, parameter)
+    if value is None:
+        return None
+    value = np.asarray(value)
+    if value.dtype.names and set(value.dtype.names) == {'real', 'imag'}:
+        value = value['real'] + 1j * value['imag']  # v7.3 stores complex data as a compound type
+    if value.size == 0 or value.dtype.kind not in 'fciub':
+        return None
+
+    labels = _strings(_field(result, 'label'))
+    sizes = {'chan': len(labels)}
+    freq = _field(result, 'freq')
+    time = _field(result, 'time')
+    if freq is not None:
+        freq = np.atleast_1d(np.asarray(freq, dtype=float)).ravel()
+        sizes['freq'] = len(freq)
+    if time is not None:
+        time = np.atleast_1d(np.asarray(time, dtype=float)).ravel()
+        sizes['time'] = len(time)
+
+    dims = _dimord(result)
+    if any(dim not in sizes and dim not in ('rpt', 'rpttap', 'subj') for dim in dims):
+        return None  # e.g. chan_chan connectivity matrices do not fit the long layout
+    try:
+        value = value.reshape([sizes.get(dim, -1) for dim in dims])
+    except ValueError:
+        return None
+
+    if np.iscomplexobj(value):
+        value = np.abs(value) ** 2
+        measure = 'pow'
+    else:
+        measure = parameter
+    for axis in reversed([axis for axis, dim in enumerate(dims) if dim not in sizes]):
+        value = value.mean(axis=axis)
+    dims = [dim for dim in dims if dim in sizes]
+
+    grid = np.unravel_index(np.arange(value.size), value.shape)
+    axes = dict(zip(dims, grid))
+    count = value.size
+    return {
+        'measure': measure,
+        'channel_index': axes['chan'].astype(np.int32),
+        'channels': labels,
+        'freq': freq[axes['freq']] if 'freq' in axes else np.full(count, np.nan),
+        'time': time[axes['time']] if 'time' in axes else np.full(count, np.nan),
+        'value': value.ravel().astype(np.float32),
+    }
+
+
+def _condition_name(variable: str) -> str:
+    return variable.split('_', 1)[1] if '_' in variable else variable
+
+
+def iter_results(variables: Dict[str, Any], subjects: Optional[Sequence[str]] = None
+                 ) -> Iterator[Tuple[str, str, Any]]:
+    """Yield (subject, condition, result) from loaded .mat variables
+
+    Handles struct arrays keyed by condition (ERP_data(i).target) as well as
+    single results named <prefix>_<condition> (freq_target, spectr_novelty, itc).
+    Element i is named ``subjects[i]`` (the file's own subject list), or sub<i>
+    when the file does not name its subjects.
+    """
+    def subject_name(index: int) -> str:
+        if subjects and index < len(subjects):
+            return subjects[index]
+        return f'sub{index + 1:02d}'
+
+    for variable, value in variables.items():
+        elements = _elements(value)
+        for index, element in enumerate(elements):
+            subject = subject_name(index)
+            if _is_result(element):
+                yield subject, _condition_name(variable), element
+                continue
+            for condition in _field_names(element):
+                result = _field(element, condition)
+                if result is not None and not isinstance(result, (str, np.ndarray)) and _is_result(result):
+                    yield subject, condition, result
+
+
+def build_columns(results: Iterator[Tuple[str, str, Any]]) -> Dict[str, Any]:
+    """Concatenate flattened results into dictionary-encoded column arrays"""
+    dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+    codes = {name: [] for name in DICTIONARY_COLUMNS}
+    numeric = {'freq': [], 'time': [], 'value': []}
+
+    def encode(column: str, text: str) -> int:
+        return dictionaries[column].setdefault(text, len(dictionaries[column]))
+
+    for subject, condition, result in results:
+        for parameter in RESULT_PARAMETERS:
+            flat = flatten_result(result, parameter)
+            if flat is None:
+                continue
+            count = len(flat['value'])
+            channel_codes = np.array([encode('channel', label) for label in flat['channels']], dtype=np.int32)
+            codes['subject'].append(np.full(count, encode('subject', subject), dtype=np.int32))
+            codes['condition'].append(np.full(count, encode('condition', condition), dtype=np.int32))
+            codes['measure'].append(np.full(count, encode('measure', flat['measure']), dtype=np.int32))
+            codes['channel'].append(channel_codes[flat['channel_index']])
+            for name in numeric:
+                numeric[name].append(flat[name])
+
+    columns = {}
+    for name in DICTIONARY_COLUMNS:
+        columns[name] = (
+            np.concatenate(codes[name]) if codes[name] else np.zeros(0, np.int32),
+            list(dictionaries[name]),
+        )
+    for name, parts in numeric.items():
+        dtype = np.float32 if name == 'value' else np.float64
+        columns[name] = np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype)
+    return columns
+
+
+def to_arrow(columns: Dict[str, Any]):
+    """Build a pyarrow Table with dictionary-encoded dimension columns"""
+    pa, _ = _require_pyarrow()
+    arrays, names = [], []
+    for name in DICTIONARY_COLUMNS:
+        indices, dictionary = columns[name]
+        arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(dictionary, pa.string())))
+        names.append(name)
+    for name in ('freq', 'time'):
+        values = columns[name]
+        arrays.append(pa.array(values, mask=np.isnan(values)))
+        names.append(name)
+    arrays.append(pa.array(columns['value']))
+    names.append('value')
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+# .mat loading and export --------------------------------------------------
+
+def _result_variables(mat_path: str) -> List[str]:
+    return [
+        variable.name for variable in inspect_mat(mat_path)
+        if variable.name.startswith(RESULT_VARIABLE_PREFIXES)
+    ]
+
+
+def load_result_variables(mat_path: str):
+    """Return ({name: value}, subjects, closer) for the FieldTrip result variables of a .mat file
+
+    ``subjects`` is the file's subject name list, or None when it has none.
+    """
+    names = _result_variables(mat_path)
+    if not names:
+        return {}, None, None
+    has_subjects = any(variable.name == SUBJECTS_VARIABLE for variable in inspect_mat(mat_path))
+    if is_hdf5_mat(mat_path):
+        mat_file = open_fieldtrip_mat(mat_path)
+        subjects = _strings(mat_file[SUBJECTS_VARIABLE]) if has_subjects else None
+        return {name: mat_file[name] for name in names}, subjects, mat_file
+    wanted = names + [SUBJECTS_VARIABLE] if has_subjects else names
+    mat = scipy.io.loadmat(mat_path, variable_names=wanted, squeeze_me=True, struct_as_record=False)
+    subjects = _strings(mat[SUBJECTS_VARIABLE]) if SUBJECTS_VARIABLE in mat else None
+    return {name: mat[name] for name in names if name in mat}, subjects, None
+
+
+def export_results(mat_paths: Sequence[str], out_path: str) -> Dict[str, Any]:
+    """Flatten the results in ``mat_paths`` into one Parquet file and return a summary"""
+    _, pq = _require_pyarrow()
+    closers = []
+
+    def results():
+        for mat_path in mat_paths:
+            variables, subjects, closer = load_result_variables(mat_path)
+            if closer is not None:
+                closers.append(closer)
+            if variables and subjects is None:
+                print(f"Warning: {os.path.basename(mat_path)} does not name its subjects; exporting them as sub01, sub02, ...")
+            yield from iter_results(variables, subjects)
+
+    try:
+        columns = build_columns(results())
+    finally:
+        for closer in closers:
+            closer.close()
+
+    table = to_arrow(columns)
+    pq.write_table(table, out_path, compression='zstd', use_dictionary=list(DICTIONARY_COLUMNS))
+    return {
+        'path': out_path,
+        'rows': table.num_rows,
+        'subjects': columns['subject'][1],
+        'conditions': columns['condition'][1],
+        'measures': columns['measure'][1],
+    }
+
+
+def export_folder(folder: str, out_path: Optional[str] = None) -> Dict[str, Any]:
+    """Export every .mat in ``folder`` that holds ERP/TFR/spectral/ITC results"""
+    mat_paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith('.mat') and _result_variables(os.path.join(folder, name))
+    )
+    if not mat_paths:
+        raise FileNotFoundError(f"No analysis results (ERP_data, freq_*, spectr_*, itc) found in {folder}")
+    return export_results(mat_paths, out_path or os.path.join(folder, RESULTS_FILENAME))
+
+
+# Querying ---------------------------------------------------------------
+
+def read_results(path: str, columns: Optional[Sequence[str]] = None, **filters):
+    """Read a results table, pushing equality/membership filters down to Parquet
+
+    ``read_results(path, measure='avg', channel=['Cz', 'Pz'])`` only decodes
+    the row groups whose statistics can match.
+    """
+    _, pq = _require_pyarrow()
+    predicates = []
+    for column, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            predicates.append((column, 'in', list(value)))
+        else:
+            predicates.append((column, '=', value))
+    return pq.read_table(path, columns=list(columns) if columns else None, filters=predicates or None)
+
+
+def aggregate(table, by: Sequence[str] = ('condition', 'channel', 'time'), how: str = 'mean'):
+    """Group a results table (e.g. across subjects) with Arrow's vectorized group_by"""
+    return table.group_by(list(by)).aggregate([('value', how)])
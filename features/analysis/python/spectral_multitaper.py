@@ -0,0 +1,220 @@
+"""Multitaper spectral engine (ft_freqanalysis, methods 'mtmfft' and 'mtmwelch').
+
+NumPy counterpart of spectralanalysis.m. Taper matrices are built once and
+cached by (length, NW, K) for DPSS and by (name, length) for the single
+windows (hanning, rectwin, bartlett), so every subject and condition of a
+run shares them. All tapers are applied to all trials of a chunk in one
+broadcast, (trials, tapers, channels, samples), followed by one batched real
+FFT, instead of a loop over trials and tapers.
+
+* ``mtmfft`` tapers the whole trial, as ft_specest_mtmfft: frequencies are
+  the FFT bins nearest to ``foi`` after ``cfg.pad``, spectra are scaled by
+  sqrt(2 / padded length), and Fourier phases are referred to time zero;
+* ``mtmwelch`` cuts each trial into ``cfg.t_ftimwin`` windows (50% overlap by
+  default) with a zero-copy sliding view and averages their power.
+
+``cfg.output`` may be 'pow' (mean over tapers, and over trials unless
+``cfg.keeptrials = 'yes'``), 'avgpow' (always the mean over trials) or
+'fourier' (per trial and taper, with ``cumtapcnt``).
+
+    python -m features.analysis.python.spectral_multitaper <data_dir>
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import scipy.fft
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal.windows import dpss
+
+from features.analysis.python.freq_analysis import (SPECTRAL_SCRIPT, cfg_scalar, demean, freq_folder,
+                                                    padded_length, read_freq_cfg, trial_chunks)
+from features.analysis.python.trial_index import DEFAULT_CODES
+
+SPECTRAL_OUTPUT_FILENAME = 'spectral_output.mat'
+METHODS = ('mtmfft', 'mtmwelch')
+OUTPUTS = ('pow', 'avgpow', 'fourier')
+WINDOWS = ('hanning', 'rectwin', 'bartlett')
+CHUNK_BYTES = 256 * 1024 ** 2
+
+
+@dataclass
+class MultitaperConfig:
+    """The ft_freqanalysis spectral options of spectralanalysis.m"""
+    method: str = 'mtmfft'
+    output: str = 'fourier'
+    taper: str = 'hanning'
+    foi: Optional[Sequence[float]] = tuple(np.arange(1.0, 15.01, 0.5))  # None: every FFT bin
+    tapsmofrq: Optional[float] = None  # Hz of smoothing, required for dpss
+    pad: Any = None  # seconds, 'nextpow2' or 'maxperlen'/None
+    keeptrials: bool = False
+    t_ftimwin: Optional[float] = None  # mtmwelch window in seconds; None is a quarter of the trial
+    overlap: float = 0.5  # mtmwelch window overlap
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any]) -> "MultitaperConfig":
+        config = cls()
+        if isinstance(cfg.get('foi'), np.ndarray):
+            config.foi = tuple(cfg['foi'])
+        for name in ('method', 'output', 'taper', 'tapsmofrq', 'pad', 't_ftimwin', 'overlap'):
+            if name in cfg:
+                setattr(config, name, cfg_scalar(cfg, name))
+        if 'keeptrials' in cfg:
+            config.keeptrials = cfg['keeptrials'] == 'yes'
+        return config
+
+
+def read_multitaper_config(script_path: str = SPECTRAL_SCRIPT) -> MultitaperConfig:
+    """MultitaperConfig from the cfg of spectralanalysis.m"""
+    config = MultitaperConfig.from_cfg(read_freq_cfg(script_path))
+    if config.method not in METHODS:
+        raise ValueError(f"spectralanalysis.m uses cfg.method = '{config.method}', expected one of {METHODS}")
+    return config
+
+
+# Tapers -----------------------------------------------------------------
+
+@lru_cache(maxsize=32)
+def dpss_tapers(n: int, nw: float, k: int) -> np.ndarray:
+    """(k, n) unit-norm Slepian tapers, cached and read-only"""
+    tapers = np.ascontiguousarray(dpss(n, nw, k), dtype=np.float32).reshape(k, n)
+    tapers.flags.writeable = False
+    return tapers
+
+
+@lru_cache(maxsize=32)
+def window_taper(name: str, n: int) -> np.ndarray:
+    """(1, n) single taper as FieldTrip defines it, normalised to unit norm; cached and read-only"""
+    k = np.arange(1, n + 1)
+    if name == 'hanning':
+        window = 0.5 * (1 - np.cos(2 * np.pi * k / (n + 1)))  # MATLAB hanning() omits the zero end points
+    elif name == 'rectwin':
+        window = np.ones(n)
+    elif name == 'bartlett':
+        window = 1 - np.abs(2 * (k - 1) / max(n - 1, 1) - 1)
+    else:
+        raise ValueError(f"Unknown taper '{name}'; expected dpss or one of {WINDOWS}")
+    tapers = (window / np.linalg.norm(window)).astype(np.float32)[None, :]
+    tapers.flags.writeable = False
+    return tapers
+
+
+def taper_matrix(taper: str, n: int, fsample: float, tapsmofrq: Optional[float] = None) -> np.ndarray:
+    """Tapers for ``n``-sample segments, (tapers, n)
+
+    For dpss, NW = n * tapsmofrq / fsample and, as in ft_specest_mtmfft, the
+    last of the 2NW Slepian tapers is dropped.
+    """
+    if taper != 'dpss':
+        return window_taper(taper, n)
+    if not tapsmofrq:
+        raise ValueError("The dpss taper needs cfg.tapsmofrq")
+    nw = n * float(tapsmofrq) / fsample
+    return dpss_tapers(n, float(nw), max(int(np.round(2 * nw)) - 1, 1))
+
+
+def frequency_bins(foi: Optional[Sequence[float]], n_fft: int, fsample: float) -> np.ndarray:
+    """Unique rfft bins nearest to ``foi`` (every bin up to Nyquist when None)"""
+    if foi is None:
+        return np.arange(n_fft // 2 + 1)
+    bins = np.round(np.asarray(foi, dtype=float) * n_fft / fsample).astype(np.int64)
+    return np.unique(bins[(bins >= 0) & (bins <= n_fft // 2)])
+
+
+# Spectra ----------------------------------------------------------------
+
+def tapered_spectra(segments: np.ndarray, tapers: np.ndarray, n_fft: int, bins: np.ndarray,
+                    workers: int = -1) -> np.ndarray:
+    """Spectra of every (segment, taper) at ``bins``: (..., tapers, channels, bins)
+
+    ``segments`` is (..., channels, samples); all tapers go through one
+    broadcast product and one batched real FFT, scaled by sqrt(2 / n_fft).
+    """
+    tapered = segments[..., None, :, :] * tapers[:, None, :]
+    spectrum = scipy.fft.rfft(tapered, n=n_fft, axis=-1, workers=workers)[..., bins]
+    return (spectrum * np.float32(np.sqrt(2.0 / n_fft))).astype(np.complex64)
+
+
+def multitaper_spectrum(trials: np.ndarray, time: np.ndarray, fsample: float,
+                        config: Optional[MultitaperConfig] = None, chunk_bytes: int = CHUNK_BYTES,
+                        workers: int = -1) -> Dict[str, Any]:
+    """mtmfft/mtmwelch spectrum of a (trials, channels, samples) block as FieldTrip freq fields"""
+    config = config or MultitaperConfig()
+    if config.method not in METHODS:
+        raise ValueError(f"Unknown method '{config.method}'; expected one of {METHODS}")
+    if config.output not in OUTPUTS:
+        raise ValueError(f"Unknown output '{config.output}'; expected one of {OUTPUTS}")
+    n_trials, n_channels, n_samples = trials.shape
+
+    if config.method == 'mtmfft':
+        length, step = n_samples, n_samples
+        n_fft = padded_length(n_samples, fsample, config.pad)
+    else:
+        window = config.t_ftimwin if config.t_ftimwin else n_samples / 4 / fsample
+        length = min(int(round(float(window) * fsample)), n_samples)
+        step = max(int(round(length * (1 - float(config.overlap)))), 1)
+        n_fft = length if config.pad in (None, 'maxperlen') else padded_length(length, fsample, config.pad)
+    tapers = taper_matrix(config.taper, length, fsample, config.tapsmofrq)
+    bins = frequency_bins(config.foi, n_fft, fsample)
+    freq = bins * fsample / n_fft
+    n_windows = (n_samples - length) // step + 1
+
+    fourier = config.output == 'fourier'
+    if fourier and config.method == 'mtmwelch':
+        raise ValueError("mtmwelch averages over windows; use mtmfft for output = 'fourier'")
+    keep = config.keeptrials and config.output == 'pow'
+    n_tapers = len(tapers)
+    if fourier:
+        result = np.zeros((n_trials, n_tapers, n_channels, len(bins)), dtype=np.complex64)
+        # ft_specest_mtmfft refers phases to t = 0 rather than to the first sample
+        phase = np.exp(-2j * np.pi * freq * float(time[0])).astype(np.complex64)
+    else:
+        result = np.zeros((n_trials if keep else 1, n_channels, len(bins)), dtype=np.float64)
+
+    bytes_per_trial = n_windows * n_tapers * n_channels * (n_fft // 2 + 1) * 8
+    for part in trial_chunks(n_trials, bytes_per_trial, chunk_bytes):
+        block = demean(trials[part])
+        # (trials, channels, windows, length) view without copying, then windows first
+        segments = np.moveaxis(sliding_window_view(block, length, axis=-1)[:, :, ::step], 2, 1)
+        spectra = tapered_spectra(segments, tapers, n_fft, bins, workers)  # (trials, windows, tapers, chan, bins)
+        if fourier:
+            result[part] = spectra[:, 0] * phase
+            continue
+        power = (spectra.real ** 2 + spectra.imag ** 2).mean(axis=(1, 2))
+        if keep:
+            result[part] = power
+        else:
+            result[0] += power.sum(axis=0)
+
+    out: Dict[str, Any] = {'freq': freq}
+    if fourier:
+        out['dimord'] = 'rpttap_chan_freq'
+        out['fourierspctrm'] = result.reshape(n_trials * n_tapers, n_channels, len(bins))
+        out['cumtapcnt'] = np.full((n_trials, 1), float(n_tapers))
+    elif keep:
+        out['dimord'] = 'rpt_chan_freq'
+        out['powspctrm'] = result.astype(np.float32)
+    else:
+        out['dimord'] = 'chan_freq'
+        out['powspctrm'] = (result[0] / n_trials if n_trials else np.full(result.shape[1:], np.nan)).astype(np.float32)
+    return out
+
+
+def multitaper_folder(folder: str, config: Optional[MultitaperConfig] = None,
+                      codes: Sequence[float] = DEFAULT_CODES, save: bool = True) -> Dict[str, Any]:
+    """Spectra of every subject and condition, saved as spectr_<condition> in spectral_output.mat"""
+    config = config or read_multitaper_config()
+    return freq_folder(folder, lambda trials, time, fsample: multitaper_spectrum(trials, time, fsample, config),
+                       'spectr', SPECTRAL_OUTPUT_FILENAME, codes, save)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multitaper spectra of a folder's cleaned data")
+    parser.add_argument('data_dir', help="Folder with subjects.h5 or data_ICApplied_clean.mat")
+    args = parser.parse_args()
+    summary = multitaper_folder(args.data_dir)
+    print(f"Spectra for {len(summary['subjects'])} subjects saved to {summary['path']}")
@@ -0,0 +1,330 @@
+"""Sliding-window multitaper time-frequency engine (ft_freqanalysis, method 'mtmconvol').
+
+FieldTrip's ft_specest_mtmconvol builds one tapered complex exponential per
+frequency and convolves the whole (padded) trial with it, i.e. one full-length
+inverse FFT per frequency and taper. For every ``toi`` point that is the same
+as taking the DFT of the tapered window of data around it, so this engine:
+
+* frames each demeaned trial once with a zero-copy sliding view
+  (numpy stride tricks) and gathers only the windows centred on ``toi``;
+* groups frequencies that share a window length (and taper) into buckets,
+  so one pass over a bucket's windows serves all of its frequencies: one
+  real FFT per window, padded only to the shortest length on which every
+  frequency of the bucket falls exactly on a bin, or, for buckets with few
+  frequencies, one GEMM against the bucket's tapered exponentials;
+* keeps FieldTrip's full-trial convolution for buckets with long windows at
+  densely spaced ``toi``, where gathering the windows would cost more.
+
+``choose_path`` picks the cheapest of the three per bucket; all of them give
+FieldTrip's values (same frequency rounding, scaling, phase and NaN edges).
+``t_ftimwin`` may be one length for all frequencies, one per frequency, or
+``cycles / foi``. With ``bucket_tolerance`` > 0, window lengths within that
+relative spread share the bucket's longest window, trading exactness for
+fewer, larger FFT batches when windows vary with frequency.
+
+    python -m features.analysis.python.timefreq_mtmconvol <data_dir>
+"""
+
+import re
+from dataclasses import dataclass
+from math import gcd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.fft
+from numpy.lib.stride_tricks import sliding_window_view
+
+from features.analysis.python.freq_analysis import (TIMEFREQ_SCRIPT, cfg_scalar, demean, freq_folder,
+                                                    padded_length, read_freq_cfg, trial_chunks)
+from features.analysis.python.spectral_multitaper import taper_matrix
+from features.analysis.python.timefreq_wavelet import TIMEFREQ_OUTPUT_FILENAME, toi_points, toi_samples
+from features.analysis.python.trial_index import DEFAULT_CODES
+
+CHUNK_BYTES = 256 * 1024 ** 2
+# Per trial and channel, measured on 60 trials x 64 channels: gathering one
+# window sample, one multiply-add of the DFT GEMM, one n*log2(n) unit of FFT
+GATHER_NS = 3.5
+GEMM_NS = 0.16
+FFT_NS = 0.9
+
+
+@dataclass
+class MtmconvolConfig:
+    """The ft_freqanalysis mtmconvol options of timefreqanalysis.m"""
+    foi: Sequence[float] = tuple(np.arange(1.0, 15.01, 0.5))
+    toi: Sequence[float] = tuple(np.round(np.arange(-2.0, 2.001, 0.01), 10))
+    t_ftimwin: Any = 0.5  # seconds: scalar or one per foi
+    cycles: Optional[float] = None  # t_ftimwin = cycles ./ foi when set
+    taper: str = 'hanning'
+    tapsmofrq: Any = None  # Hz, scalar or one per foi; required for dpss
+    pad: Any = 8.0  # seconds, 'nextpow2' or 'maxperlen'; sets the frequency resolution
+    output: str = 'pow'  # 'pow' (averaged over trials and tapers) or 'fourier'
+    bucket_tolerance: float = 0.0
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any]) -> "MtmconvolConfig":
+        config = cls()
+        for name in ('foi', 'toi', 't_ftimwin', 'tapsmofrq'):
+            if isinstance(cfg.get(name), np.ndarray):
+                setattr(config, name, tuple(cfg[name]))
+        for name in ('taper', 'pad', 'output'):
+            if name in cfg:
+                setattr(config, name, cfg_scalar(cfg, name))
+        return config
+
+    def window_seconds(self) -> np.ndarray:
+        foi = np.asarray(self.foi, dtype=float)
+        if self.cycles:
+            return float(self.cycles) / foi
+        return np.broadcast_to(np.asarray(self.t_ftimwin, dtype=float), foi.shape).copy()
+
+    def smoothing(self) -> np.ndarray:
+        foi = np.asarray(self.foi, dtype=float)
+        if self.tapsmofrq is None:
+            return np.zeros(foi.shape)
+        return np.broadcast_to(np.asarray(self.tapsmofrq, dtype=float), foi.shape).copy()
+
+
+def read_mtmconvol_config(script_path: str = TIMEFREQ_SCRIPT) -> MtmconvolConfig:
+    """MtmconvolConfig from the cfg of timefreqanalysis.m, including t_ftimwin = N ./ cfg.foi"""
+    cfg = read_freq_cfg(script_path)
+    if cfg.get('method') != 'mtmconvol':
+        raise ValueError(f"timefreqanalysis.m uses cfg.method = '{cfg.get('method')}', not 'mtmconvol'")
+    config = MtmconvolConfig.from_cfg(cfg)
+    with open(script_path, 'r', encoding='utf-8') as file:
+        content = '\n'.join(line.split('%', 1)[0] for line in file.read().splitlines())
+    match = re.search(r'cfg\.t_ftimwin\s*=\s*([\d.]+)\s*\./\s*cfg\.foi', content)
+    if match:
+        config.cycles = float(match.group(1))
+    return config
+
+
+# Buckets ----------------------------------------------------------------
+
+@dataclass
+class FrequencyBucket:
+    """Frequencies that share one window length and taper"""
+    columns: np.ndarray  # positions in foi
+    length: int  # window samples
+    tapsmofrq: float
+    n_fft: int  # padded window FFT length
+    bins: np.ndarray  # rfft bins of the window FFT, one per column
+
+
+def window_fft_length(length: int, pad_bins: np.ndarray, n_pad: int) -> int:
+    """Shortest FFT length >= ``length`` on which bins k / n_pad all land exactly"""
+    step = n_pad // gcd(n_pad, *[int(k) for k in pad_bins]) if len(pad_bins) else 1
+    return int(step * -(-length // step))
+
+
+def frequency_buckets(config: MtmconvolConfig, fsample: float, n_pad: int,
+                      tolerance: Optional[float] = None) -> Tuple[np.ndarray, List[FrequencyBucket]]:
+    """Rounded frequencies (to fsample / n_pad, as FieldTrip does) and their buckets"""
+    tolerance = config.bucket_tolerance if tolerance is None else tolerance
+    pad_bins = np.round(np.asarray(config.foi, dtype=float) * n_pad / fsample).astype(np.int64)
+    freq = pad_bins * fsample / n_pad
+    lengths = np.round(config.window_seconds() * fsample).astype(np.int64)
+    smoothing = config.smoothing()
+
+    buckets: List[FrequencyBucket] = []
+    for smooth in np.unique(smoothing):
+        members = np.flatnonzero(smoothing == smooth)
+        members = members[np.argsort(lengths[members], kind='stable')]
+        groups: List[List[int]] = []
+        for column in members:
+            if groups and lengths[column] <= lengths[groups[-1][0]] * (1 + tolerance):
+                groups[-1].append(int(column))
+            else:
+                groups.append([int(column)])
+        for group in groups:
+            columns = np.array(group)
+            length = int(lengths[columns].max())
+            n_fft = window_fft_length(length, pad_bins[columns], n_pad)
+            buckets.append(FrequencyBucket(columns, length, float(smooth), n_fft,
+                                           pad_bins[columns] * n_fft // n_pad))
+    return freq, buckets
+
+
+# Engine -----------------------------------------------------------------
+
+@dataclass
+class BucketPlan:
+    """How one bucket is computed and which toi points it fills"""
+    bucket: FrequencyBucket
+    tapers: np.ndarray  # (tapers, length)
+    keep: np.ndarray  # toi positions where the window fits inside the trial
+    starts: np.ndarray  # first trial sample of the window at each kept toi
+    path: str  # 'dft', 'fft' or 'convolution'
+    kernel: Optional[np.ndarray] = None  # DFT matrix or convolution spectra
+
+
+def choose_path(bucket: FrequencyBucket, n_tapers: int, n_toi: int, n_pad: int) -> str:
+    """Cheapest way to compute a bucket, from the estimated time per trial and channel
+
+    * 'dft': gather the framed windows and multiply them with a (length,
+      tapers x freqs) matrix in one float32 GEMM; cheapest for short windows
+      or sparse toi;
+    * 'fft': one real FFT per framed window and taper shared by every
+      frequency of the bucket; pays off for buckets with many frequencies;
+    * 'convolution': FieldTrip's own route, two inverse FFTs of the padded
+      trial per frequency and taper; cheapest for long windows at densely
+      spaced toi, where gathering the windows would dominate.
+    """
+    n_freqs = len(bucket.columns)
+    costs = {
+        'dft': n_toi * bucket.length * (GATHER_NS + GEMM_NS * n_freqs * n_tapers),
+        'fft': n_toi * (GATHER_NS * bucket.length + FFT_NS * n_tapers * bucket.n_fft * np.log2(bucket.n_fft)),
+        'convolution': FFT_NS * n_freqs * n_tapers * n_pad * np.log2(n_pad),
+    }
+    return min(costs, key=costs.get)
+
+
+def _centring(bucket: FrequencyBucket, freq: np.ndarray, fsample: float) -> np.ndarray:
+    """Scale and phase that refer each window's spectrum to its centre sample, as FieldTrip does"""
+    phase = np.exp(1j * np.pi * freq[bucket.columns] * (bucket.length - 1) / fsample)
+    return (np.sqrt(2.0 / bucket.length) * phase).astype(np.complex64)
+
+
+def _wavelets(bucket: FrequencyBucket, tapers: np.ndarray, freq: np.ndarray, fsample: float) -> np.ndarray:
+    """(tapers, freqs, length) tapered exponentials of ft_specest_mtmconvol, centred on the window"""
+    angle = np.arange(bucket.length) - (bucket.length - 1) / 2.0
+    exponentials = np.exp(2j * np.pi * np.outer(freq[bucket.columns], angle) / fsample)
+    return tapers[:, None, :] * exponentials[None, :, :]
+
+
+def plan_bucket(bucket: FrequencyBucket, tapers: np.ndarray, samples: np.ndarray, n_samples: int, n_pad: int,
+                freq: np.ndarray, fsample: float) -> BucketPlan:
+    # ft_specest_mtmconvol keeps a time point only where the whole window lies inside the trial
+    keep = np.flatnonzero((samples >= 0) & (samples + 1 >= bucket.length / 2)
+                          & (samples + 1 < n_samples - bucket.length / 2))
+    starts = samples[keep] - (bucket.length + 1) // 2 + 1
+    plan = BucketPlan(bucket, tapers, keep, starts, choose_path(bucket, len(tapers), len(keep), n_pad))
+    scale = np.sqrt(2.0 / bucket.length)
+    if plan.path == 'dft':
+        # Convolution with the wavelet is correlation with it reversed (matters for odd dpss tapers)
+        kernel = (_wavelets(bucket, tapers, freq, fsample)[..., ::-1] * scale).transpose(2, 0, 1)
+        kernel = kernel.reshape(bucket.length, -1)
+        plan.kernel = np.ascontiguousarray(np.concatenate([kernel.real, kernel.imag], axis=1), dtype=np.float32)
+    elif plan.path == 'convolution':
+        # Wavelets wrapped around sample 0 so that output sample t is the window around trial sample t
+        wrapped = np.zeros((len(tapers), len(bucket.columns), n_pad), dtype=np.complex128)
+        wrapped[..., (np.arange(bucket.length) - bucket.length // 2) % n_pad] = \
+            _wavelets(bucket, tapers, freq, fsample) * scale
+        plan.kernel = np.stack([scipy.fft.rfft(wrapped.real, axis=-1),
+                                scipy.fft.rfft(wrapped.imag, axis=-1)]).astype(np.complex64)
+    return plan
+
+
+def _bucket_spectrum(plan: BucketPlan, block: np.ndarray, frames: np.ndarray, padded: Optional[np.ndarray],
+                     freq: np.ndarray, fsample: float, workers: int) -> np.ndarray:
+    """Spectra of one bucket for a chunk of trials as (trials, tapers, channels, freqs, kept toi)"""
+    bucket, tapers = plan.bucket, plan.tapers
+    n_trials, n_channels = block.shape[:2]
+    if plan.path == 'convolution':
+        n_pad = (padded.shape[-1] - 1) * 2
+        spectrum = np.empty((n_trials, len(tapers), n_channels, len(bucket.columns), len(plan.keep)), np.complex64)
+        toi = plan.starts + (bucket.length + 1) // 2 - 1
+        for taper in range(len(tapers)):
+            for k in range(len(bucket.columns)):
+                real = scipy.fft.irfft(padded * plan.kernel[0, taper, k], n=n_pad, axis=-1, workers=workers)
+                imag = scipy.fft.irfft(padded * plan.kernel[1, taper, k], n=n_pad, axis=-1, workers=workers)
+                spectrum[:, taper, :, k] = real[..., toi] + 1j * imag[..., toi]
+        return spectrum
+
+    windows = frames[:, :, plan.starts]  # (trials, channels, toi, length), the only copy of the samples
+    if plan.path == 'fft':
+        tapered = windows[:, None] * tapers[None, :, None, None, ::-1]
+        spectrum = scipy.fft.rfft(tapered, n=bucket.n_fft, axis=-1, workers=workers)[..., bucket.bins]
+        spectrum = spectrum * _centring(bucket, freq, fsample)  # (trials, tapers, channels, toi, freqs)
+    else:
+        product = windows.reshape(-1, bucket.length) @ plan.kernel
+        half = len(tapers) * len(bucket.columns)
+        spectrum = (product[:, :half] + 1j * product[:, half:]).astype(np.complex64)
+        spectrum = spectrum.reshape(n_trials, n_channels, len(plan.keep), len(tapers), len(bucket.columns))
+        spectrum = np.moveaxis(spectrum, 3, 1)
+    return np.moveaxis(spectrum, -1, -2)
+
+
+def mtmconvol_tfr(trials: np.ndarray, time: np.ndarray, fsample: float,
+                  config: Optional[MtmconvolConfig] = None, chunk_bytes: int = CHUNK_BYTES,
+                  workers: int = -1) -> Dict[str, Any]:
+    """mtmconvol TFR of a (trials, channels, samples) block as FieldTrip freq fields"""
+    config = config or MtmconvolConfig()
+    n_trials, n_channels, n_samples = trials.shape
+    n_pad = padded_length(n_samples, fsample, config.pad)
+    freq, buckets = frequency_buckets(config, fsample, n_pad)
+    toi = toi_points(config.toi, fsample)
+    samples = toi_samples(time, fsample, toi)
+
+    plans = []
+    for bucket in buckets:
+        if bucket.length > n_samples:
+            raise ValueError(f"A {bucket.length}-sample window is longer than the trials ({n_samples} samples)")
+        tapers = taper_matrix(config.taper, bucket.length, fsample, bucket.tapsmofrq or None)
+        plans.append(plan_bucket(bucket, tapers, samples, n_samples, n_pad, freq, fsample))
+
+    fourier = config.output == 'fourier'
+    n_tapers = max(len(plan.tapers) for plan in plans) if plans else 1
+    shape = (n_channels, len(freq), len(toi))
+    if fourier:
+        if len({len(plan.tapers) for plan in plans}) > 1:
+            raise ValueError("output = 'fourier' needs the same number of tapers at every frequency")
+        result = np.full((n_trials, n_tapers) + shape, np.nan, dtype=np.complex64)
+    else:
+        result = np.zeros(shape, dtype=np.float64)
+
+    # Working set per trial and channel: the gathered windows and spectra of the largest bucket, or the padded trial
+    per_channel = max([len(plan.keep) * (plan.bucket.length + len(plan.tapers) * (plan.bucket.n_fft // 2 + 1) * 2)
+                       for plan in plans if plan.path != 'convolution'] + [4 * n_pad])
+    for part in trial_chunks(n_trials, n_channels * per_channel * 4, chunk_bytes):
+        block = demean(trials[part])
+        padded = None
+        if any(plan.path == 'convolution' for plan in plans):
+            padded = scipy.fft.rfft(block, n=n_pad, axis=-1, workers=workers)
+        frames = {}  # one zero-copy framing of the chunk per window length
+        for plan in plans:
+            length = plan.bucket.length
+            if length not in frames:
+                frames[length] = sliding_window_view(block, length, axis=-1)
+            values = _bucket_spectrum(plan, block, frames[length], padded, freq, fsample, workers)
+            columns, keep = plan.bucket.columns[:, None], plan.keep[None, :]
+            if fourier:
+                result[part, :, :, columns, keep] = values
+            else:
+                result[:, columns, keep] += (values.real ** 2 + values.imag ** 2).mean(axis=1).sum(axis=0)
+
+    out: Dict[str, Any] = {'freq': freq, 'time': toi}
+    if fourier:
+        out['dimord'] = 'rpttap_chan_freq_time'
+        out['fourierspctrm'] = result.reshape((n_trials * n_tapers,) + shape)
+        out['cumtapcnt'] = np.full((n_trials, len(freq)), float(n_tapers))
+        return out
+    powspctrm = (result / n_trials if n_trials else np.full(shape, np.nan)).astype(np.float32)
+    for plan in plans:
+        invalid = np.setdiff1d(np.arange(len(toi)), plan.keep)
+        powspctrm[:, plan.bucket.columns[:, None], invalid[None, :]] = np.nan
+    out['dimord'] = 'chan_freq_time'
+    out['powspctrm'] = powspctrm
+    return out
+
+
+def mtmconvol_folder(folder: str, config: Optional[MtmconvolConfig] = None,
+                     codes: Sequence[float] = DEFAULT_CODES, save: bool = True) -> Dict[str, Any]:
+    """mtmconvol TFRs of every subject and condition, saved as freq_<condition> in timefreq_output.mat"""
+    config = config or read_mtmconvol_config()
+    return freq_folder(folder, lambda trials, time, fsample: mtmconvol_tfr(trials, time, fsample, config),
+                       'freq', TIMEFREQ_OUTPUT_FILENAME, codes, save)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sliding-window multitaper TFRs of a folder's cleaned data")
+    parser.add_argument('data_dir', help="Folder with subjects.h5 or data_ICApplied_clean.mat")
+    parser.add_argument('--bucket-tolerance', type=float, default=0.0,
+                        help="Share one window between lengths within this relative spread")
+    args = parser.parse_args()
+    settings = read_mtmconvol_config()
+    settings.bucket_tolerance = args.bucket_tolerance
+    summary = mtmconvol_folder(args.data_dir, settings)
+    print(f"mtmconvol TFRs for {len(summary['subjects'])} subjects saved to {summary['path']}")
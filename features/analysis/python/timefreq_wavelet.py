@@ -0,0 +1,186 @@
+"""FFT-based Morlet wavelet time-frequency engine (ft_freqanalysis, method 'wavelet').
+
+NumPy counterpart of timefreqanalysis.m. FieldTrip's ft_specest_wavelet
+convolves every trial with one complex Morlet wavelet per frequency through
+the FFT; this engine does the same with three changes that matter for speed:
+
+* the wavelet spectra depend only on (fsample, foi, width, gwidth, padded
+  length), so they are built once and cached across subjects and conditions;
+* the data are real, so each chunk of trials is transformed once with a
+  batched real FFT over all channels, and the complex result is recovered
+  from two real inverse transforms (cosine and sine kernels);
+* only the ``toi`` sample points are kept from each inverse transform, in
+  float32, and trials are processed in chunks so memory stays bounded.
+
+The transforms use every core through scipy.fft's ``workers``. Wavelets are
+sampled, placed, normalised and scaled as in ft_specest_wavelet, ``toi`` is
+snapped to samples with MATLAB's rounding, and points where the wavelet does
+not fit inside the trial are NaN, so ``powspctrm`` matches FieldTrip up to
+float32 rounding.
+
+    python -m features.analysis.python.timefreq_wavelet <data_dir>
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.fft
+
+from features.analysis.python.freq_analysis import (TIMEFREQ_SCRIPT, cfg_scalar, demean, freq_folder,
+                                                    padded_length, read_freq_cfg, trial_chunks)
+from features.analysis.python.trial_index import DEFAULT_CODES
+from features.preprocessing.python.trial_definition import matlab_round
+
+TIMEFREQ_OUTPUT_FILENAME = 'timefreq_output.mat'
+CHUNK_BYTES = 256 * 1024 ** 2
+
+
+@dataclass
+class WaveletConfig:
+    """The ft_freqanalysis wavelet options of timefreqanalysis.m"""
+    foi: Sequence[float] = tuple(np.arange(1.0, 15.01, 0.5))
+    toi: Sequence[float] = tuple(np.round(np.arange(-2.0, 2.001, 0.01), 10))
+    width: float = 3.0
+    gwidth: float = 3.0
+    pad: Any = 8.0  # seconds, 'nextpow2' or 'maxperlen'
+    output: str = 'pow'  # 'pow' (averaged over trials) or 'fourier' (per trial)
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any]) -> "WaveletConfig":
+        config = cls()
+        for name in ('foi', 'toi'):
+            if isinstance(cfg.get(name), np.ndarray):
+                setattr(config, name, tuple(cfg[name]))
+        for name in ('width', 'gwidth', 'pad', 'output'):
+            if name in cfg:
+                setattr(config, name, cfg_scalar(cfg, name))
+        return config
+
+
+def read_wavelet_config(script_path: str = TIMEFREQ_SCRIPT) -> WaveletConfig:
+    """WaveletConfig from the cfg of timefreqanalysis.m"""
+    cfg = read_freq_cfg(script_path)
+    if cfg.get('method', 'wavelet') != 'wavelet':
+        raise ValueError(f"timefreqanalysis.m uses cfg.method = '{cfg['method']}', not 'wavelet'")
+    return WaveletConfig.from_cfg(cfg)
+
+
+@lru_cache(maxsize=16)
+def wavelet_kernels(fsample: float, foi: Tuple[float, ...], width: float, gwidth: float,
+                    n_fft: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Real-FFT spectra of the cosine and sine parts of each Morlet wavelet
+
+    Returns (cosine, sine) as complex64 (frequencies, n_fft // 2 + 1) arrays
+    and the wavelet lengths in samples. The taper is sampled on MATLAB's
+    ``-gwidth*st : 1/fs : gwidth*st`` (which need not be symmetric about 0)
+    and the carrier on the centred ``-(L-1)/2 : (L-1)/2`` samples, as in
+    ft_specest_wavelet. Wavelet sample j sits at lag ``j - floor(L/2)``, the
+    placement its ``ceil(N/2) - floor(L/2)`` zero padding and fftshift give,
+    so sample t of the inverse transform is FieldTrip's value at trial sample t.
+    """
+    cosine = np.zeros((len(foi), n_fft // 2 + 1), dtype=np.complex64)
+    sine = np.zeros_like(cosine)
+    lengths = np.zeros(len(foi), dtype=np.int64)
+    for k, freq in enumerate(foi):
+        st = 1.0 / (2.0 * np.pi * (freq / width))
+        # Element count of the MATLAB colon range, with its tolerance for float steps
+        length = int(np.floor(2.0 * gwidth * st * fsample + 1e-10)) + 1
+        lengths[k] = length
+        if length > n_fft:
+            raise ValueError(f"The {freq} Hz wavelet ({length} samples) is longer than the padded trials")
+        t = -gwidth * st + np.arange(length) / fsample
+        taper = np.exp(-t ** 2 / (2.0 * st ** 2)) / np.sqrt(st * np.sqrt(np.pi))
+        angle = (np.arange(length) - (length - 1) / 2.0) * (2.0 * np.pi * freq / fsample)
+        wrapped = np.zeros((2, n_fft))
+        wrapped[:, (np.arange(length) - length // 2) % n_fft] = [taper * np.cos(angle), taper * np.sin(angle)]
+        spectra = scipy.fft.rfft(wrapped, axis=-1)
+        cosine[k], sine[k] = spectra[0], spectra[1]
+    return cosine, sine, lengths
+
+
+def toi_points(toi: Sequence[float], fsample: float) -> np.ndarray:
+    """cfg.toi snapped to the sample grid without duplicates, as ft_specest_* report ``time``"""
+    return np.unique(matlab_round(np.asarray(toi, dtype=float) * fsample) / fsample)
+
+
+def toi_samples(time: np.ndarray, fsample: float, toi: Sequence[float]) -> np.ndarray:
+    """Trial sample of each toi point (-1 where it falls outside the trial)"""
+    offset = matlab_round(float(time[0]) * fsample)
+    samples = matlab_round(np.asarray(toi, dtype=float) * fsample - offset).astype(np.int64)
+    samples[(samples < 0) | (samples >= len(time))] = -1
+    return samples
+
+
+def wavelet_tfr(trials: np.ndarray, time: np.ndarray, fsample: float,
+                config: Optional[WaveletConfig] = None, chunk_bytes: int = CHUNK_BYTES,
+                workers: int = -1) -> Dict[str, Any]:
+    """Morlet wavelet TFR of a (trials, channels, samples) block
+
+    Returns the fields of a FieldTrip freq structure: ``powspctrm``
+    (chan_freq_time, mean over trials) or ``fourierspctrm``
+    (rpttap_chan_freq_time), with ``freq`` and ``time``.
+    """
+    config = config or WaveletConfig()
+    foi = tuple(float(freq) for freq in config.foi)
+    toi = toi_points(config.toi, fsample)
+    n_trials, n_channels, n_samples = trials.shape
+    n_fft = padded_length(n_samples, fsample, config.pad)
+    cosine, sine, lengths = wavelet_kernels(float(fsample), foi, float(config.width), float(config.gwidth), n_fft)
+    scale = np.float32(np.sqrt(2.0 / fsample))
+
+    samples = toi_samples(time, fsample, toi)
+    columns = np.flatnonzero(samples >= 0)
+    # ft_specest_wavelet keeps a time point only where the whole wavelet lies inside the trial
+    valid = [(samples[columns] + 1 >= length / 2) & (samples[columns] + 1 < n_samples - length / 2)
+             for length in lengths]
+
+    fourier = config.output == 'fourier'
+    shape = (n_channels, len(foi), len(toi))
+    result = np.full((n_trials,) + shape, np.nan, dtype=np.complex64) if fourier else np.zeros(shape, np.float64)
+    # Working set per trial: its spectrum plus the two inverse transforms of one frequency
+    bytes_per_trial = n_channels * (n_fft // 2 + 1) * 8 + 2 * n_channels * n_fft * 4
+    for part in trial_chunks(n_trials, bytes_per_trial, chunk_bytes):
+        spectrum = scipy.fft.rfft(demean(trials[part]), n=n_fft, axis=-1, workers=workers)
+        for k in range(len(foi)):
+            real = scipy.fft.irfft(spectrum * cosine[k], n=n_fft, axis=-1, workers=workers)
+            imag = scipy.fft.irfft(spectrum * sine[k], n=n_fft, axis=-1, workers=workers)
+            kept = samples[columns][valid[k]]
+            values = (real[..., kept] + 1j * imag[..., kept]).astype(np.complex64) * scale
+            if fourier:
+                result[part, :, k, columns[valid[k]]] = values
+            else:
+                result[:, k, columns[valid[k]]] += (values.real ** 2 + values.imag ** 2).sum(axis=0)
+
+    out: Dict[str, Any] = {'freq': np.asarray(foi), 'time': toi}
+    if fourier:
+        out['dimord'] = 'rpttap_chan_freq_time'
+        out['fourierspctrm'] = result
+        return out
+    powspctrm = (result / n_trials if n_trials else np.full(shape, np.nan)).astype(np.float32)
+    for k in range(len(foi)):
+        invalid = np.ones(len(toi), dtype=bool)
+        invalid[columns[valid[k]]] = False
+        powspctrm[:, k, invalid] = np.nan
+    out['dimord'] = 'chan_freq_time'
+    out['powspctrm'] = powspctrm
+    return out
+
+
+def wavelet_folder(folder: str, config: Optional[WaveletConfig] = None, codes: Sequence[float] = DEFAULT_CODES,
+                   save: bool = True) -> Dict[str, Any]:
+    """Wavelet TFRs of every subject and condition, saved as freq_<condition> in timefreq_output.mat"""
+    config = config or read_wavelet_config()
+    return freq_folder(folder, lambda trials, time, fsample: wavelet_tfr(trials, time, fsample, config),
+                       'freq', TIMEFREQ_OUTPUT_FILENAME, codes, save)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Morlet wavelet TFRs of a folder's cleaned data")
+    parser.add_argument('data_dir', help="Folder with subjects.h5 or data_ICApplied_clean.mat")
+    args = parser.parse_args()
+    summary = wavelet_folder(args.data_dir)
+    print(f"Wavelet TFRs for {len(summary['subjects'])} subjects saved to {summary['path']}")
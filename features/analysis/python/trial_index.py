@@ -0,0 +1,97 @@
+"""Condition code -> trial positions of one subject, shared by the analysis engines.
+
+Built once per subject from its trialinfo codes (one ``np.unique`` pass) and
+then used by every engine instead of re-deriving ``trialinfo == code`` masks
+and copying each condition's trials. For a (trials, channels, samples) array
+whose condition rows are contiguous, as in the trial cache, ``view`` returns
+a slice, so iterating conditions never copies samples; a FieldTrip-style list
+of trials yields lists of the existing trial arrays.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from features.preprocessing.python.trial_cache import CONDITION_CODES, TrialCache, condition_name
+
+DEFAULT_CODES = tuple(float(code) for code in CONDITION_CODES)
+
+
+class TrialIndex:
+    """Positions of each trialinfo code within one subject's trials"""
+
+    def __init__(self, trial_codes: Sequence[float]):
+        codes = np.asarray(trial_codes, dtype=float)
+        self.trial_codes = codes.reshape(len(codes), -1)[:, 0] if codes.size else np.zeros(0)
+        self.codes, inverse, counts = np.unique(self.trial_codes, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        self._positions: Dict[float, np.ndarray] = {
+            float(code): order[bounds[k]:bounds[k + 1]] for k, code in enumerate(self.codes)
+        }
+
+    @classmethod
+    def from_cache(cls, cache: TrialCache, subject) -> "TrialIndex":
+        """Index of one subject of a trial cache; positions are relative to ``cache.block(subject)``"""
+        return cls(cache.index['trialinfo'][cache.rows(subject=subject)])
+
+    def __len__(self):
+        return len(self.trial_codes)
+
+    def __contains__(self, code) -> bool:
+        return float(code) in self._positions
+
+    def count(self, code) -> int:
+        return len(self.positions(code))
+
+    def counts(self, codes: Optional[Sequence[float]] = None) -> Dict[float, int]:
+        return {float(code): self.count(code) for code in (self.codes if codes is None else codes)}
+
+    def positions(self, code) -> np.ndarray:
+        """Trial positions of ``code`` in ascending order (empty when absent)"""
+        return self._positions.get(float(code), np.zeros(0, dtype=np.int64))
+
+    def span(self, code) -> Optional[slice]:
+        """The slice covering ``code``'s trials when they are contiguous, else None"""
+        positions = self.positions(code)
+        if len(positions) == 0:
+            return slice(0, 0)
+        if positions[-1] - positions[0] + 1 == len(positions):
+            return slice(int(positions[0]), int(positions[-1]) + 1)
+        return None
+
+    def mask(self, code) -> np.ndarray:
+        """Boolean trial mask, the equivalent of cfg.trials = (trialinfo == code)"""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.positions(code)] = True
+        return mask
+
+    def indicator(self, codes: Sequence[float]) -> np.ndarray:
+        """(trials, codes) 0/1 matrix for grouped reductions over several codes at once"""
+        indicator = np.zeros((len(self), len(codes)), dtype=np.float64)
+        for column, code in enumerate(codes):
+            indicator[self.positions(code), column] = 1.0
+        return indicator
+
+    def view(self, trials: Union[np.ndarray, Sequence[np.ndarray]], code) -> Union[np.ndarray, List[np.ndarray]]:
+        """The trials of ``code``: a zero-copy slice of an array when contiguous
+
+        Lists of trials give a list of the same trial objects; scattered rows
+        of an array fall back to one gather.
+        """
+        if not isinstance(trials, np.ndarray):
+            return [trials[position] for position in self.positions(code)]
+        span = self.span(code)
+        return trials[span] if span is not None else trials[self.positions(code)]
+
+    def views(self, trials: Union[np.ndarray, Sequence[np.ndarray]], codes: Optional[Sequence[float]] = None
+              ) -> Iterator[Tuple[float, Any]]:
+        """Yield (code, trials of that code) for ``codes`` (default: every code present)"""
+        for code in (self.codes if codes is None else codes):
+            yield float(code), self.view(trials, code)
+
+
+def condition_names(codes: Sequence[float]) -> List[str]:
+    """target/standard/novelty for the known codes, the code itself otherwise"""
+    return [condition_name(float(code)) for code in codes]
+
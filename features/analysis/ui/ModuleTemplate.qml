@@ -10,7 +10,6 @@ Item {
     property string displayText: "Analysis Module"
     property bool expanded: false
     property string currentFolder: ""
-    property var folderContents: []
     property string errorMessage: ""
     property string moduleName: ""  // Name used to find corresponding MATLAB file
     property bool editModeEnabled: false  // Track edit mode state
@@ -237,18 +236,9 @@ Item {
             return false
         }
         
-        var foundCleanMat = false
-        for (var i = 0; i < folderContents.length; i++) {
-            var rawEntry = folderContents[i]
-            var sanitizedEntry = rawEntry.replace(/^[^\w]+/, '').trim()
-            if (sanitizedEntry.toLowerCase() === targetFileName.toLowerCase()) {
-                foundCleanMat = true
-                break
-            }
-        }
-        
-        if (!foundCleanMat) {
-            errorMessage = "data_ICApplied_clean.mat not found in the selected folder"
+        // With the .mat outputs turned off the cleaned data lives only in subjects.h5
+        if (!fileBrowser || !(fileBrowser.containsFile(targetFileName) || fileBrowser.containsFile("subjects.h5"))) {
+            errorMessage = "Neither data_ICApplied_clean.mat nor subjects.h5 found in the selected folder"
             return false
         }
         
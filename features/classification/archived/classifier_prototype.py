@@ -9,6 +9,7 @@ the Qt UI via ``config_manager``.
 from __future__ import annotations
 
 import argparse
+import sys
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, List, Optional, Tuple
@@ -21,6 +22,11 @@ from torch.optim import AdamW
 from torch.utils.data import DataLoader, Dataset, random_split
 
 PROJECT_ROOT = Path(__file__).resolve().parents[3]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from features.preprocessing.python.trial_cache import TrialCache, is_trial_cache  # noqa: E402
+
 CONV_LAYER_SPEC: List[dict] = [   {'inChannels': 3, 'kernelSize': 3, 'outChannels': 32, 'padding': 0},
     {'inChannels': 32, 'kernelSize': 3, 'outChannels': 64, 'padding': 1},
     {'inChannels': 64, 'kernelSize': 5, 'outChannels': 128, 'padding': 2},
@@ -110,8 +116,11 @@ class EEGConvNet(nn.Module):
 class NpyWindowDataset(Dataset):
     """Dataset wrapper for pre-extracted tensor windows.
 
-    If ``root`` is ``None`` or empty, synthetic samples are generated so the
-    training loop can still execute end-to-end.
+    ``root`` may be a trial cache directory (``trial_cache`` built by the
+    preprocessing pipeline), in which case samples are zero-copy slices of its
+    shared memmap labelled by condition. If ``root`` is ``None`` or empty,
+    synthetic samples are generated so the training loop can still execute
+    end-to-end.
     """
 
     def __init__(self, root: Optional[Path], length: int, channels: int, timepoints: int, num_classes: int):
@@ -120,8 +129,14 @@ class NpyWindowDataset(Dataset):
         self.channels = channels
         self.timepoints = timepoints
         self.num_classes = num_classes
+        self.cache: Optional[TrialCache] = None
 
-        if self.root and self.root.exists():
+        if self.root and is_trial_cache(self.root):
+            # Copy-on-write pages keep the memmap zero-copy but writable for torch.from_numpy
+            self.cache = TrialCache(str(self.root), mode="c")
+            self.length = len(self.cache)
+            self.files: List[Path] = []
+        elif self.root and self.root.exists():
             self.files = sorted(self.root.glob("*.pt")) + sorted(self.root.glob("*.pth"))
             self.files += sorted(self.root.glob("*.npy"))
             if not self.files:
@@ -134,6 +149,9 @@ class NpyWindowDataset(Dataset):
         return self.length
 
     def __getitem__(self, index: int) -> Tuple[Tensor, int]:
+        if self.cache is not None:
+            tensor = torch.from_numpy(self.cache.trials[index]).unsqueeze(1)
+            return tensor, int(self.cache.index["condition"][index])
         if self.files:
             path = self.files[index]
             if path.suffix == ".npy":
@@ -259,7 +277,7 @@ def run_training(cfg: TrainingConfig) -> None:
 
 def parse_args() -> TrainingConfig:
     parser = argparse.ArgumentParser(description="Prototype deep-learning classifier trainer")
-    parser.add_argument("--dataset", type=str, default=None, help="Directory containing .pt/.pth/.npy tensors")
+    parser.add_argument("--dataset", type=str, default=None, help="Trial cache directory or directory containing .pt/.pth/.npy tensors")
     parser.add_argument("--epochs", type=int, default=30)
     parser.add_argument("--batch-size", type=int, default=32)
     parser.add_argument("--lr", type=float, default=3e-4)
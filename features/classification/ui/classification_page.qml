@@ -11,7 +11,6 @@ Item {
     
     property bool editModeEnabled: false
     property string currentFolder: ""
-    property var folderContents: []
     
     // Signals to communicate with main.qml
     signal openFolderDialog()
@@ -134,7 +133,7 @@ Item {
                         ListView {
                             id: folderListView
                             anchors.fill: parent
-                            model: classificationPageRoot.folderContents
+                            model: fileBrowser.folderModel
                             
                             delegate: Item {
                                 width: folderListView.width
@@ -154,7 +153,7 @@ Item {
                                         
                                         onClicked: function(mouse) {
                                             if (mouse.button === Qt.LeftButton) {
-                                                var cleanFilename = modelData.replace(/^[^\w]+/, '')
+                                                var cleanFilename = model.display.replace(/^[^\w]+/, '')
                                                 
                                                 if (cleanFilename.toLowerCase().endsWith('.mat')) {
                                                     var isICAFile = cleanFilename.toLowerCase().includes('ica') || 
@@ -181,18 +180,18 @@ Item {
                                         spacing: 5
                                         
                                         Text {
-                                            text: modelData
+                                            text: model.display
                                             font.pixelSize: 10
-                                            color: modelData.endsWith('.mat') ? 
-                                                (modelData.includes('ICA') || modelData.includes('ica') ? "#4caf50" : "#007bff") : "#333"
-                                            font.underline: modelData.endsWith('.mat') && fileMouseArea.containsMouse
+                                            color: model.display.endsWith('.mat') ? 
+                                                (model.display.includes('ICA') || model.display.includes('ica') ? "#4caf50" : "#007bff") : "#333"
+                                            font.underline: model.display.endsWith('.mat') && fileMouseArea.containsMouse
                                         }
                                         
                                         Text {
-                                            text: modelData.endsWith('.mat') ? 
-                                                (modelData.includes('ICA') || modelData.includes('ica') ? "🧠" : "📊") : ""
+                                            text: model.display.endsWith('.mat') ? 
+                                                (model.display.includes('ICA') || model.display.includes('ica') ? "🧠" : "📊") : ""
                                             font.pixelSize: 8
-                                            visible: modelData.endsWith('.mat') && fileMouseArea.containsMouse
+                                            visible: model.display.endsWith('.mat') && fileMouseArea.containsMouse
                                         }
                                     }
                                 }
@@ -1,4 +1,29 @@
-function [ICApplied_data] = applyICA(data)
+function [ICApplied_data] = applyICA(data, numcomponent, cache_files)
+% APPLYICA Run fastica on every subject, optionally after PCA reduction
+%   ICApplied_data = applyICA(data)
+%   ICApplied_data = applyICA(data, numcomponent)
+%   ICApplied_data = applyICA(data, numcomponent, cache_files)
+%
+% numcomponent selects the PCA dimension passed as cfg.numcomponent:
+%   'rank'  - detected data rank (default); equals the channel count for
+%             full-rank data, lower after re-referencing or interpolation
+%   N >= 1  - at most N components
+%   0<N<1   - fewest components explaining that fraction of the variance
+% The chosen rank, variance retained and decomposition time are printed.
+%
+% cache_files (one .mat path per subject, e.g. ica_cache/<subject>.mat)
+% enables warm starts: a previous unmixing of the same recording is used as
+% fastica's initGuess when the channels and component count match and
+% U*C*U' (C = covariance of the new data) stays within max_drift of the
+% identity. Every run writes its unmixing/topolabel back to the cache.
+
+if nargin < 2 || isempty(numcomponent)
+    numcomponent = 'rank';
+end
+if nargin < 3
+    cache_files = {};
+end
+max_drift = 0.2;
 
 %ICApplied_data = [];
 
@@ -6,10 +31,74 @@ function [ICApplied_data] = applyICA(data)
 for i = 1:length(data)
 
     cfg        = [];
-    cfg.method = 'fastica'; 
+    cfg.method = 'fastica';
 
+    [ncomp, data_rank, retained, covariance] = choose_numcomponent(data(i), numcomponent);
+    nchan = numel(data(i).label);
+    if ncomp < nchan
+        cfg.numcomponent = ncomp;
+    end
+
+    cache_file = '';
+    start_note = '';
+    if i <= numel(cache_files)
+        cache_file = cache_files{i};
+    end
+    if ~isempty(cache_file) && exist(cache_file, 'file')
+        previous = load(cache_file, 'unmixing', 'topolabel');
+        if isfield(previous, 'unmixing') && isequal(cellstr(previous.topolabel(:)), data(i).label(:)) ...
+                && size(previous.unmixing, 1) == ncomp
+            drift = norm(previous.unmixing * covariance * previous.unmixing' - eye(ncomp), 'fro') / sqrt(ncomp);
+            if drift <= max_drift
+                % fastica's initGuess is a mixing matrix in sensor space
+                cfg.fastica.initGuess = pinv(previous.unmixing);
+                start_note = sprintf(', warm-started (drift %.3f)', drift);
+            else
+                start_note = sprintf(', cold start (drift %.3f > %.2f)', drift, max_drift);
+            end
+        end
+    end
+
+    tic;
     ICApplied_data(i) = ft_componentanalysis(cfg, data(i));
+    fprintf('Subject %d: %d of %d channels (rank %d), %.2f%% variance retained, ICA took %.1f s%s\n', ...
+        i, ncomp, nchan, data_rank, 100 * retained, toc, start_note);
+
+    if ~isempty(cache_file)
+        cache_dir = fileparts(cache_file);
+        if ~isempty(cache_dir) && ~exist(cache_dir, 'dir')
+            mkdir(cache_dir);
+        end
+        unmixing = ICApplied_data(i).unmixing;
+        topolabel = ICApplied_data(i).topolabel;
+        save(cache_file, 'unmixing', 'topolabel');
+    end
 
 end
 
-end
\ No newline at end of file
+end
+
+function [ncomp, data_rank, retained, covariance] = choose_numcomponent(subject, numcomponent)
+% Eigenvalues of the covariance of the demeaned, concatenated trials (as fastica sees them)
+nchan = numel(subject.label);
+covariance = zeros(nchan);
+nsamples = 0;
+for t = 1:numel(subject.trial)
+    trial = subject.trial{t};
+    trial = trial - mean(trial, 2);
+    covariance = covariance + trial * trial';
+    nsamples = nsamples + size(trial, 2);
+end
+covariance = covariance / nsamples;
+eigenvalues = sort(max(eig(covariance), 0), 'descend');
+data_rank = sum(eigenvalues > eigenvalues(1) * 1e-7);
+explained = cumsum(eigenvalues) / sum(eigenvalues);
+
+ncomp = data_rank;
+if isnumeric(numcomponent) && numcomponent > 0 && numcomponent < 1
+    ncomp = min(ncomp, find(explained >= numcomponent, 1, 'first'));
+elseif isnumeric(numcomponent) && numcomponent >= 1
+    ncomp = min(ncomp, round(numcomponent));
+end
+retained = explained(ncomp);
+end
@@ -0,0 +1,89 @@
+function results = benchmark_storage_formats(data_dir, repeats)
+% BENCHMARK_STORAGE_FORMATS Time writing/reading one subject in every output format
+%   results = benchmark_storage_formats(data_dir)
+%   results = benchmark_storage_formats(data_dir, repeats)
+%
+% Uses the first subject of <data_dir>/subjects.h5 as the sample, writes it
+% next to the data (so the local disk is measured) in each MAT format and
+% store compression, and reports the best write time, read time and size.
+% Pick the winner in config/storage_formats.json.
+
+if nargin < 2 || isempty(repeats)
+    repeats = 3;
+end
+
+store_path = fullfile(data_dir, 'subjects.h5');
+subjects = store_list_subjects(store_path, 'data');
+if isempty(subjects)
+    error('No preprocessed subjects in %s; run preprocessing first.', store_path);
+end
+sample = store_read_subject(store_path, subjects{1}, 'data');
+fprintf('Benchmarking storage formats on subject %s (%d trials)\n', subjects{1}, numel(sample.trial));
+
+work_dir = fullfile(data_dir, sprintf('storage_bench_%s', datestr(now, 'yyyymmddHHMMSS')));
+mkdir(work_dir);
+cleanup = onCleanup(@() rmdir(work_dir, 's'));
+
+mat_formats = {'v6', 'v7', 'v7.3', 'v7.3-nocompression'};
+store_compressions = {'none', 'gzip', 'lz4', 'zstd'};
+results = struct('format', {}, 'write_s', {}, 'read_s', {}, 'size_mb', {});
+
+for fIdx = 1:numel(mat_formats)
+    fmt = mat_formats{fIdx};
+    target = fullfile(work_dir, sprintf('sample_%d.mat', fIdx));
+    flags = {['-' fmt]};
+    if strcmp(fmt, 'v7.3-nocompression')
+        flags = {'-v7.3', '-nocompression'};
+    end
+    S = struct('data', sample);
+    write_times = zeros(1, repeats);
+    read_times = zeros(1, repeats);
+    for r = 1:repeats
+        if exist(target, 'file')
+            delete(target);
+        end
+        t0 = tic;
+        save(target, '-struct', 'S', flags{:});
+        write_times(r) = toc(t0);
+        t0 = tic;
+        loaded = load(target, 'data'); %#ok<NASGU>
+        read_times(r) = toc(t0);
+    end
+    file_info = dir(target);
+    results(end+1) = struct('format', fmt, 'write_s', min(write_times), ...
+        'read_s', min(read_times), 'size_mb', file_info.bytes / 2^20); %#ok<AGROW>
+end
+
+for cIdx = 1:numel(store_compressions)
+    compression = store_compressions{cIdx};
+    write_times = zeros(1, repeats);
+    read_times = zeros(1, repeats);
+    target = fullfile(work_dir, sprintf('store_%s.h5', compression));
+    try
+        for r = 1:repeats
+            if exist(target, 'file')
+                delete(target);
+            end
+            t0 = tic;
+            store_write_subject(target, 'sample', 'data', sample, compression);
+            write_times(r) = toc(t0);
+            t0 = tic;
+            loaded = store_read_subject(target, 'sample', 'data'); %#ok<NASGU>
+            read_times(r) = toc(t0);
+        end
+    catch benchErr
+        fprintf('Skipping store-%s: %s\n', compression, benchErr.message);
+        continue;
+    end
+    file_info = dir(target);
+    results(end+1) = struct('format', ['store-' compression], 'write_s', min(write_times), ...
+        'read_s', min(read_times), 'size_mb', file_info.bytes / 2^20); %#ok<AGROW>
+end
+
+fprintf('\n%-20s%12s%12s%12s\n', 'format', 'write (s)', 'read (s)', 'size (MB)');
+for rIdx = 1:numel(results)
+    fprintf('%-20s%12.3f%12.3f%12.2f\n', results(rIdx).format, results(rIdx).write_s, ...
+        results(rIdx).read_s, results(rIdx).size_mb);
+end
+
+end
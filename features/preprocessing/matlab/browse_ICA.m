@@ -24,6 +24,11 @@ try
         ICA_data = loaded_data.data_ICApplied;
         var_used = 'data_ICApplied';
         fprintf('Found ICA data in variable: %s\n', var_used);
+    elseif isfield(loaded_data, 'ica_weights')
+        % Weights-only output: activations are rebuilt per subject from data.mat
+        ICA_data = loaded_data.ica_weights;
+        var_used = 'ica_weights';
+        fprintf('Found ICA weights in variable: %s (activations rebuilt on demand)\n', var_used);
     end
     
     raw_data = [];
@@ -41,6 +46,11 @@ try
         catch rawLoadErr
             fprintf('Warning: Failed to load %s (%s).\n', raw_data_path, rawLoadErr.message);
         end
+    elseif ~isempty(store_list_subjects(fullfile(mat_folder, 'subjects.h5'), 'data'))
+        % Store-only outputs (mat_outputs off): read the sensor-space data per subject from subjects.h5
+        raw_data = read_store_stage(fullfile(mat_folder, 'subjects.h5'), 'data');
+        raw_var_used = 'data';
+        fprintf('Loaded sensor-space data from %s (stage: data)\n', fullfile(mat_folder, 'subjects.h5'));
     else
         fprintf('Warning: data.mat not found in %s. Falling back to reconstructing raw data if needed.\n', mat_folder);
     end
@@ -106,7 +116,12 @@ try
         fprintf('Showing components for subject %d\n', i);
         
         % Call ft_databrowser and wait for it to complete
-        cfg_out = ft_databrowser(cfg, ICA_data(i));
+        subject_comp = ICA_data(i);
+        if ~isfield(subject_comp, 'trial')
+            subject_comp = ica_component_data(subject_comp, raw_entry(raw_data, i));
+        end
+        cfg_out = ft_databrowser(cfg, subject_comp);
+        clear subject_comp;
         
         % Collect rejected ICs for current subject
         if isfield(cfg_out, 'rejected_ICs') && ~isempty(cfg_out.rejected_ICs)
@@ -166,10 +181,29 @@ try
         clean_data = reject_components(sensor_space_data, ICApplied, rejected_ICs_array);
         assignin('base', 'clean_data', clean_data);
         fprintf('Cleaned data assigned to workspace as "clean_data".\n');
-        clean_filename = 'data_ICApplied_clean.mat';
-        clean_fullpath = fullfile(mat_folder, clean_filename);
-        save(clean_fullpath, 'clean_data');
-        fprintf('Cleaned data saved to %s\n', clean_fullpath);
+        if stage_mat_outputs()
+            clean_filename = 'data_ICApplied_clean.mat';
+            clean_fullpath = fullfile(mat_folder, clean_filename);
+            save_stage_output(clean_fullpath, 'clean_data', clean_data, 'clean_data');
+            fprintf('Cleaned data saved to %s\n', clean_fullpath);
+        end
+        store_path = fullfile(mat_folder, 'subjects.h5');
+        store_subjects = store_list_subjects(store_path, 'data');
+        if numel(store_subjects) == numel(clean_data)
+            for sIdx = 1:numel(store_subjects)
+                if iscell(clean_data)
+                    clean_entry = clean_data{sIdx};
+                else
+                    clean_entry = clean_data(sIdx);
+                end
+                clean_group = sprintf('/subjects/%s/clean_data', store_subjects{sIdx});
+                if stage_exists(store_path, clean_group)
+                    delete_stage(store_path, clean_group);
+                end
+                store_write_subject(store_path, store_subjects{sIdx}, 'clean_data', clean_entry);
+            end
+            fprintf('Cleaned data written to per-subject store %s\n', store_path);
+        end
         fprintf('Rejected component indices stored inside each clean_data entry (field "rejected_components").\n');
     catch rejectionME
         fprintf('Warning: Failed to apply reject_components within browse_ICA (%s).\n', rejectionME.message);
@@ -269,9 +303,22 @@ end
         end
     end
 
+    function entry = raw_entry(container, index)
+        % Sensor-space data of one subject from a struct or cell container
+        entry = [];
+        if iscell(container) && index <= numel(container)
+            entry = container{index};
+        elseif isstruct(container) && index <= numel(container)
+            entry = container(index);
+        end
+    end
+
     function data = derive_sensor_space_data(raw_candidate, ICA_struct)
         % Decide whether to use existing raw data or reconstruct from ICA
         expected_subjects = numel(ICA_struct);
+        if isempty(raw_candidate) && ~isfield(ICA_struct, 'trial')
+            error('ICA weights were saved without activations; data.mat is required to reject components.');
+        end
         if isempty(raw_candidate)
             data = reconstruct_sensor_data(ICA_struct);
             return;
@@ -368,4 +415,29 @@ end
         end
     end
 
-end
\ No newline at end of file
+end
+
+function data = read_store_stage(store_path, stage)
+% Struct array of every subject's stage, in the order preprocessing.m wrote data.mat
+subjects = store_list_subjects(store_path, stage);
+data = store_read_subject(store_path, subjects{1}, stage);
+for sIdx = 2:numel(subjects)
+    data(sIdx) = store_read_subject(store_path, subjects{sIdx}, stage);
+end
+end
+
+function exists = stage_exists(store_path, group_path)
+exists = false;
+try
+    h5info(store_path, group_path);
+    exists = true;
+catch
+end
+end
+
+function delete_stage(store_path, group_path)
+% Remove a previous clean_data group so browsing again can rewrite it
+fid = H5F.open(store_path, 'H5F_ACC_RDWR', 'H5P_DEFAULT');
+cleanup = onCleanup(@() H5F.close(fid));
+H5L.delete(fid, group_path, 'H5P_DEFAULT');
+end
@@ -0,0 +1,23 @@
+function comp = ica_component_data(entry, data)
+% ICA_COMPONENT_DATA Return a full FieldTrip component structure for one subject
+%   comp = ica_component_data(entry, data)
+%
+% Entries that already carry activations (trial field) are returned as is.
+% Weights-only entries saved by ica_weights_only are expanded by applying
+% their unmixing matrix to the subject's preprocessed sensor data.
+
+if isfield(entry, 'trial')
+    comp = entry;
+    return;
+end
+
+if nargin < 2 || isempty(data)
+    error('ICA weights for this subject need its preprocessed data (data.mat) to rebuild component activations.');
+end
+
+cfg = [];
+cfg.unmixing = entry.unmixing;
+cfg.topolabel = entry.topolabel;
+comp = ft_componentanalysis(cfg, data);
+
+end
@@ -0,0 +1,22 @@
+function weights = ica_weights_only(comp)
+% ICA_WEIGHTS_ONLY Strip FieldTrip component structures down to their weights
+%   weights = ica_weights_only(comp)
+%
+% Keeps unmixing, topo, topolabel and the component labels of every entry
+% and drops the activation time courses, which are unmixing * data and can
+% be rebuilt with ica_component_data.
+
+weights = struct('unmixing', {}, 'topo', {}, 'topolabel', {}, 'label', {});
+for idx = 1:numel(comp)
+    if iscell(comp)
+        entry = comp{idx};
+    else
+        entry = comp(idx);
+    end
+    weights(idx).unmixing = entry.unmixing;
+    weights(idx).topo = entry.topo;
+    weights(idx).topolabel = entry.topolabel;
+    weights(idx).label = entry.label;
+end
+
+end
@@ -13,8 +13,22 @@ addpath(preprocessing_dir);
 cd(data_dir);
 files = dir('*.set');
 
+% Per-subject chunked store (subjects.h5): the primary output of every stage. The full
+% .mat files are only written while the mat_outputs transition switch is on (stage_mat_outputs)
+write_mat_outputs = stage_mat_outputs();
+store_path = fullfile(data_dir, 'subjects.h5');
+if exist(store_path, 'file')
+    delete(store_path);
+end
+subject_ids = cell(1, length(files));
+
 accepted_channels = {'F4', 'Fz', 'C3', 'Pz', 'P3', 'O1', 'Oz', 'O2', 'P4', 'Cz', 'C4', 'F3'};
 
+% PCA dimension for ICA: 'rank' (detected rank), a component count, or a variance fraction such as 0.99
+ica_numcomponent = 'rank';
+% Set to true to start ICA from the unmixing of the previous run (ica_cache/<subject>.mat) when the data barely changed
+ica_warm_start = false;
+
 % Loop through each .set file
 for i = 1:length(files)
     
@@ -26,23 +40,50 @@ for i = 1:length(files)
     
     % Process the data - this automatically stores in MATLAB workspace
     data(i) = preprocess_data(dataset, accepted_channels);
+    [~, subject_ids{i}] = fileparts(filename);
+    store_write_subject(store_path, subject_ids{i}, 'data', data(i));
     
 end
 
 fprintf('Batch processing complete. %d files processed and stored in workspace variable "data"\n', length(data));
 
 % Save the preprocessed data prior to ICA for reproducibility
-raw_output_filename = fullfile(data_dir, 'data.mat');
-save(raw_output_filename, 'data', '-v7.3');
-fprintf('Preprocessed data saved to: %s\n', raw_output_filename);
+if write_mat_outputs
+    raw_output_filename = fullfile(data_dir, 'data.mat');
+    save_stage_output(raw_output_filename, 'data', data, 'data');
+    fprintf('Preprocessed data saved to: %s\n', raw_output_filename);
+end
 
 % Apply ICA to the preprocessed data
 fprintf('Applying ICA to preprocessed data...\n');
-data_ICApplied = applyICA(data);
+ica_cache_files = {};
+if ica_warm_start
+    ica_cache_files = cellfun(@(id) fullfile(data_dir, 'ica_cache', [id '.mat']), subject_ids, 'UniformOutput', false);
+end
+data_ICApplied = applyICA(data, ica_numcomponent, ica_cache_files);
 fprintf('ICA processing complete.\n');
 
-% Save the final ICA-processed data
 ica_output_filename = fullfile(data_dir, 'data_ICApplied.mat');
-save(ica_output_filename, 'data_ICApplied', '-v7.3');
-fprintf('Final ICA-processed data saved to: %s\n', ica_output_filename);
+if strcmpi(storage_format('data_ICApplied'), 'unmixing')
+    % Activations are unmixing * data; keep only the weights and rebuild them when browsing
+    ica_weights = ica_weights_only(data_ICApplied);
+    for i = 1:length(ica_weights)
+        store_write_subject(store_path, subject_ids{i}, 'data_ICApplied', ica_weights(i));
+    end
+else
+    for i = 1:length(data_ICApplied)
+        store_write_subject(store_path, subject_ids{i}, 'data_ICApplied', data_ICApplied(i));
+    end
+end
+if write_mat_outputs && ~strcmpi(storage_format('data_ICApplied'), 'unmixing')
+    % Save the final ICA-processed data
+    save_stage_output(ica_output_filename, 'data_ICApplied', data_ICApplied, 'data_ICApplied');
+    fprintf('Final ICA-processed data saved to: %s\n', ica_output_filename);
+else
+    % The small weights file is what browse_ICA opens; activations come from data.mat or the store
+    ica_weights = ica_weights_only(data_ICApplied);
+    save(ica_output_filename, 'ica_weights', '-v7');
+    fprintf('ICA weights (unmixing/topo/topolabel) saved to: %s\n', ica_output_filename);
+end
+fprintf('Per-subject store written to: %s\n', store_path);
 
@@ -4,7 +4,8 @@ function [clean_data] = reject_components(data, ICApplied, rejected_comps)
 %
 % Inputs:
 %   data - Cell or struct array of raw data structures
-%   ICApplied - Cell or struct array of ICA results
+%   ICApplied - Cell or struct array of ICA results, full or weights-only
+%               (ica_weights_only); only unmixing/topo/topolabel are used
 %   rejected_comps - Cell array or numeric matrix/vector of components to reject
 %
 % Outputs:
@@ -44,9 +45,9 @@ for idx = 1:num_records
     if isempty(components_to_reject)
         updated_data = current_data;
     else
-        cfg = [];
-        cfg.component = components_to_reject;
-        updated_data = ft_rejectcomponent(cfg, current_ica, current_data);
+        % Same montage ft_rejectcomponent applies, but as one product over all trials;
+        % only unmixing/topo are needed, so weights-only ICA output works as is
+        updated_data = project_out_components(current_data, current_ica, components_to_reject);
     end
     
     cleaned_entry = current_data; % direct copy preserves hdr and metadata
@@ -94,6 +95,28 @@ else
 end
 end
 
+function data = project_out_components(data, comp, components)
+% PROJECT_OUT_COMPONENTS Apply I - topo(:,rej) * unmixing(rej,:) to every trial at once
+%   The projection is built once per subject and multiplied with the trials
+%   concatenated along time, then split back into the original trials.
+
+if any(components > size(comp.unmixing, 1))
+    error('reject_components:ComponentOutOfRange', ...
+        'Component %d requested but only %d components exist.', max(components), size(comp.unmixing, 1));
+end
+[found, rows] = ismember(comp.topolabel, data.label);
+if ~all(found)
+    error('reject_components:MissingChannels', ...
+        'ICA channels missing from the data: %s', strjoin(comp.topolabel(~found), ', '));
+end
+
+projection = eye(numel(rows)) - comp.topo(:, components) * comp.unmixing(components, :);
+lengths = cellfun(@(trial) size(trial, 2), data.trial);
+buffer = [data.trial{:}];
+buffer(rows, :) = projection * buffer(rows, :);
+data.trial = mat2cell(buffer, size(buffer, 1), lengths);
+end
+
 function components = normalize_components(entry)
 % NORMALIZE_COMPONENTS Flatten and clean component selections for rejection
 %   Ensures that nested cell arrays and zero/empty markers are handled.
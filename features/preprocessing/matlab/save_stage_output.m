@@ -0,0 +1,30 @@
+function save_stage_output(file_path, var_name, value, stage)
+% SAVE_STAGE_OUTPUT Save a pipeline output in the format configured for its stage
+%   save_stage_output(file_path, var_name, value, stage)
+%
+% The format comes from storage_format(stage). v6/v7 cannot hold variables
+% of 2 GB or more, so those fall back to v7.3 with a warning.
+
+fmt = storage_format(stage);
+S = struct();
+S.(var_name) = value;
+
+info = whos('value');
+if any(strcmpi(fmt, {'v6', 'v7'})) && info.bytes >= 2^31
+    fprintf('Warning: %s is %.1f GB, too large for -%s. Saving as -v7.3 instead.\n', ...
+        var_name, info.bytes / 2^30, fmt);
+    fmt = 'v7.3';
+end
+
+switch lower(fmt)
+    case 'v6'
+        save(file_path, '-struct', 'S', '-v6');
+    case 'v7'
+        save(file_path, '-struct', 'S', '-v7');
+    case 'v7.3-nocompression'
+        save(file_path, '-struct', 'S', '-v7.3', '-nocompression');
+    otherwise
+        save(file_path, '-struct', 'S', '-v7.3');
+end
+
+end
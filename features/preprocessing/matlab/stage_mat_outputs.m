@@ -0,0 +1,26 @@
+function enabled = stage_mat_outputs()
+% STAGE_MAT_OUTPUTS Whether pipeline stages are also saved as full .mat files
+%   enabled = stage_mat_outputs()
+%
+% subjects.h5 is the primary output of every stage. While the transition
+% switch mat_outputs in config/storage_formats.json is true (the default),
+% data.mat, data_ICApplied.mat and data_ICApplied_clean.mat are written as
+% well; when it is false the store is the only full copy and
+% data_ICApplied.mat holds just the ICA weights browse_ICA opens.
+
+enabled = true;
+config_path = fullfile(fileparts(mfilename('fullpath')), '..', '..', '..', 'config', 'storage_formats.json');
+if ~exist(config_path, 'file')
+    return;
+end
+
+try
+    config = jsondecode(fileread(config_path));
+    if isfield(config, 'mat_outputs')
+        enabled = logical(config.mat_outputs);
+    end
+catch configErr
+    fprintf('Warning: Could not read %s (%s). Writing .mat outputs.\n', config_path, configErr.message);
+end
+
+end
@@ -0,0 +1,29 @@
+function fmt = storage_format(stage)
+% STORAGE_FORMAT Output format configured for a pipeline stage
+%   fmt = storage_format('data')   -> 'v6', 'v7', 'v7.3' or 'v7.3-nocompression'
+%   fmt = storage_format('store')  -> 'none', 'gzip', 'lz4' or 'zstd'
+%
+% Reads config/storage_formats.json (shared with storage_formats.py) and
+% falls back to v7.3 / gzip when the file or the stage entry is missing.
+
+defaults = struct('data', 'v7.3', 'data_ICApplied', 'v7.3', 'clean_data', 'v7.3', 'store', 'gzip');
+fmt = 'v7.3';
+if isfield(defaults, stage)
+    fmt = defaults.(stage);
+end
+
+config_path = fullfile(fileparts(mfilename('fullpath')), '..', '..', '..', 'config', 'storage_formats.json');
+if ~exist(config_path, 'file')
+    return;
+end
+
+try
+    config = jsondecode(fileread(config_path));
+    if isfield(config, 'stages') && isfield(config.stages, stage)
+        fmt = config.stages.(stage);
+    end
+catch configErr
+    fprintf('Warning: Could not read %s (%s). Using %s.\n', config_path, configErr.message, fmt);
+end
+
+end
@@ -0,0 +1,29 @@
+function subjects = store_list_subjects(store_path, stage)
+% STORE_LIST_SUBJECTS List subject ids in the chunked subject store
+%   subjects = store_list_subjects(store_path)         all subjects
+%   subjects = store_list_subjects(store_path, stage)  subjects that have the given stage
+%
+% Subjects are returned in case-insensitive name order, the order
+% SubjectStore.subjects() uses on the Python side.
+
+subjects = {};
+if ~exist(store_path, 'file')
+    return;
+end
+
+info = h5info(store_path, '/subjects');
+for gIdx = 1:numel(info.Groups)
+    group = info.Groups(gIdx);
+    subject = regexprep(group.Name, '^/subjects/', '');
+    if nargin > 1
+        stage_names = regexprep({group.Groups.Name}, '^.*/', '');
+        if ~ismember(stage, stage_names)
+            continue;
+        end
+    end
+    subjects{end+1} = subject; %#ok<AGROW>
+end
+[~, order] = sort(lower(subjects));
+subjects = subjects(order);
+
+end
@@ -0,0 +1,98 @@
+function s = store_read_subject(store_path, subject, stage, varargin)
+% STORE_READ_SUBJECT Read one subject from the chunked subject store
+%   s = store_read_subject(store_path, subject, stage)
+%   s = store_read_subject(..., 'channel', {'Cz', 'Pz'}, 'trials', 1:20, 'latency', [0 1])
+%
+% Only the requested channels, trials and time window are read from disk;
+% the result is a FieldTrip structure (label, trial, time, fsample and any
+% stored trialinfo/sampleinfo/unmixing/topo/topolabel).
+
+parser = inputParser;
+addParameter(parser, 'channel', 'all');
+addParameter(parser, 'trials', []);
+addParameter(parser, 'latency', []);
+parse(parser, varargin{:});
+opts = parser.Results;
+
+group = sprintf('/subjects/%s/%s', subject, stage);
+info = h5info(store_path, group);
+dataset_names = {info.Datasets.Name};
+
+label = split_labels(h5readatt(store_path, group, 'label'));
+if ischar(opts.channel) && strcmpi(opts.channel, 'all')
+    chan_idx = 1:numel(label);
+else
+    [found, chan_idx] = ismember(opts.channel, label);
+    chan_idx = chan_idx(found);
+end
+
+s = [];
+s.label = label(chan_idx);
+s.label = s.label(:);
+s.fsample = h5readatt(store_path, group, 'fsample');
+
+bounds = zeros(0, 2);
+if ismember('bounds', dataset_names)
+    bounds = h5read(store_path, [group '/bounds']);
+end
+trials = opts.trials;
+if isempty(trials)
+    trials = 1:size(bounds, 1);
+end
+
+% Read the contiguous channel span covering the selection, then subset
+first_chan = min(chan_idx);
+span = max(chan_idx) - first_chan + 1;
+
+s.trial = cell(1, numel(trials));
+s.time = cell(1, numel(trials));
+for k = 1:numel(trials)
+    trial_bounds = bounds(trials(k), :);
+    time = h5read(store_path, [group '/time'], trial_bounds(1), trial_bounds(2) - trial_bounds(1) + 1)';
+    cols = 1:numel(time);
+    if ~isempty(opts.latency)
+        cols = find(time >= opts.latency(1) & time <= opts.latency(2));
+    end
+    if isempty(cols) || isempty(chan_idx)
+        s.trial{k} = zeros(numel(chan_idx), 0);
+        s.time{k} = zeros(1, 0);
+        continue;
+    end
+    block = h5read(store_path, [group '/trial'], ...
+        [first_chan, trial_bounds(1) + cols(1) - 1], [span, cols(end) - cols(1) + 1]);
+    s.trial{k} = block(chan_idx - first_chan + 1, :);
+    s.time{k} = time(cols);
+end
+
+per_trial_fields = {'trialinfo', 'sampleinfo'};
+for fIdx = 1:numel(per_trial_fields)
+    field_name = per_trial_fields{fIdx};
+    if ismember(field_name, dataset_names)
+        value = h5read(store_path, [group '/' field_name]);
+        s.(field_name) = value(trials, :);
+    end
+end
+
+component_fields = {'unmixing', 'topo'};
+for fIdx = 1:numel(component_fields)
+    field_name = component_fields{fIdx};
+    if ismember(field_name, dataset_names)
+        s.(field_name) = h5read(store_path, [group '/' field_name]);
+    end
+end
+if ~isempty(info.Attributes) && ismember('topolabel', {info.Attributes.Name})
+    s.topolabel = split_labels(h5readatt(store_path, group, 'topolabel'));
+    s.topolabel = s.topolabel(:);
+end
+
+end
+
+function labels = split_labels(value)
+value = char(value);
+value = value(value ~= 0);
+if isempty(value)
+    labels = {};
+else
+    labels = strsplit(value, newline);
+end
+end
@@ -0,0 +1,111 @@
+function store_write_subject(store_path, subject, stage, s, compression)
+% STORE_WRITE_SUBJECT Write one FieldTrip raw/comp structure into the chunked subject store
+%   store_write_subject(store_path, subject, stage, s)
+%   store_write_subject(store_path, subject, stage, s, compression)
+%
+% Inputs:
+%   store_path - HDF5 file (created on first write), usually <data_dir>/subjects.h5
+%   subject    - subject id, e.g. the .set file name without extension
+%   stage      - 'data', 'data_ICApplied' or 'clean_data'
+%   s          - FieldTrip structure with label/trial/time (and optionally
+%                trialinfo, sampleinfo, unmixing, topo, topolabel); weights-only
+%                ICA entries without trial/time store just their matrices
+%   compression - 'none', 'gzip', 'lz4' or 'zstd'; defaults to storage_format('store').
+%                 lz4/zstd use HDF5 filter plugins (R2022a+, HDF5_PLUGIN_PATH set)
+%
+% Layout (one group per subject and stage):
+%   trial      [nchan x total_samples]  trials concatenated along time
+%   time       [total_samples]          concatenated time axis
+%   bounds     [ntrials x 2]            first/last column of each trial
+%   trialinfo, sampleinfo, unmixing, topo as stored in s
+%   attributes label/topolabel (newline-joined) and fsample
+%
+% trial is chunked a few channels wide and several thousand samples long so
+% store_read_subject can fetch one channel or time window without decompressing
+% the rest of the subject.
+
+chunk_channels = 4;
+chunk_samples = 8192;
+if nargin < 5 || isempty(compression)
+    compression = storage_format('store');
+end
+filter_args = store_filter_args(compression);
+
+group = sprintf('/subjects/%s/%s', subject, stage);
+nchan = numel(s.label);
+lengths = [];
+if isfield(s, 'trial')
+    lengths = cellfun(@(trial) size(trial, 2), s.trial);
+end
+last = cumsum(lengths(:));
+bounds = [last - lengths(:) + 1, last];
+total = sum(lengths);
+
+if total > 0
+    h5create(store_path, [group '/trial'], [nchan total], 'Datatype', 'double', ...
+        'ChunkSize', [min(nchan, chunk_channels) min(total, chunk_samples)], filter_args{:});
+    h5create(store_path, [group '/time'], total, 'Datatype', 'double', ...
+        'ChunkSize', min(total, chunk_samples), filter_args{:});
+    % Write trial by trial so the subject is never concatenated in memory
+    for idx = 1:numel(s.trial)
+        h5write(store_path, [group '/trial'], double(s.trial{idx}), [1 bounds(idx, 1)], [nchan lengths(idx)]);
+        h5write(store_path, [group '/time'], double(s.time{idx}(:)), bounds(idx, 1), lengths(idx));
+    end
+    write_matrix(store_path, [group '/bounds'], bounds);
+end
+
+optional_fields = {'trialinfo', 'sampleinfo', 'unmixing', 'topo'};
+for fIdx = 1:numel(optional_fields)
+    field_name = optional_fields{fIdx};
+    if isfield(s, field_name) && isnumeric(s.(field_name)) && ~isempty(s.(field_name))
+        write_matrix(store_path, [group '/' field_name], double(s.(field_name)));
+    end
+end
+
+% h5writeatt needs an existing group, which entries without datasets never create
+ensure_group(store_path, group);
+h5writeatt(store_path, group, 'label', strjoin(s.label(:)', newline));
+if isfield(s, 'topolabel') && ~isempty(s.topolabel)
+    h5writeatt(store_path, group, 'topolabel', strjoin(s.topolabel(:)', newline));
+end
+if isfield(s, 'fsample')
+    h5writeatt(store_path, group, 'fsample', double(s.fsample));
+end
+
+end
+
+function ensure_group(store_path, group)
+if exist(store_path, 'file')
+    fid = H5F.open(store_path, 'H5F_ACC_RDWR', 'H5P_DEFAULT');
+else
+    fid = H5F.create(store_path, 'H5F_ACC_EXCL', 'H5P_DEFAULT', 'H5P_DEFAULT');
+end
+cleanup = onCleanup(@() H5F.close(fid));
+try
+    gid = H5G.open(fid, group);
+catch
+    lcpl = H5P.create('H5P_LINK_CREATE');
+    H5P.set_create_intermediate_group(lcpl, 1);
+    gid = H5G.create(fid, group, lcpl, 'H5P_DEFAULT', 'H5P_DEFAULT');
+    H5P.close(lcpl);
+end
+H5G.close(gid);
+end
+
+function write_matrix(store_path, name, value)
+h5create(store_path, name, size(value), 'Datatype', 'double');
+h5write(store_path, name, value);
+end
+
+function args = store_filter_args(compression)
+switch lower(compression)
+    case 'none'
+        args = {};
+    case 'lz4'
+        args = {'Shuffle', true, 'CustomFilterID', 32004, 'CustomFilterParameters', 0};
+    case 'zstd'
+        args = {'Shuffle', true, 'CustomFilterID', 32015, 'CustomFilterParameters', 3};
+    otherwise
+        args = {'Deflate', 4, 'Shuffle', true};
+end
+end
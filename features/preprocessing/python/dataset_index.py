@@ -0,0 +1,236 @@
+"""SQLite index of the EEG recordings and .mat outputs in a data folder.
+
+The indexer lists the files directly inside the folder (the ones
+preprocessing.m picks up; subfolders are not walked), parses only headers
+(.set) or variable tables (.mat), and stores one row per file keyed by path.
+Files whose mtime and size are unchanged since the last pass are skipped, so
+re-indexing a folder after a run only touches the new outputs. The index is
+refreshed on demand by the views that read it, not on every browse.
+
+The event table of every .set file is folded into an inverted index of
+(eventtype, eventvalue) -> recording counts, so trial definitions can be
+checked against the whole folder without starting MATLAB.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from features.preprocessing.python.eeglab_io import read_set_header
+from features.preprocessing.python.mat_inspect import inspect_mat
+
+# Beside the project's config/ directory, like the other app state
+INDEX_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'cache', 'index',
+)
+INDEXED_EXTENSIONS = ('.set', '.mat')
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    nbchan INTEGER,
+    srate REAL,
+    pnts INTEGER,
+    trials INTEGER,
+    duration REAL,
+    labels TEXT,
+    variables TEXT,
+    datfile TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_recordings_shape ON recordings (nbchan, srate);
+CREATE INDEX IF NOT EXISTS idx_recordings_root ON recordings (root);
+CREATE TABLE IF NOT EXISTS events (
+    path TEXT NOT NULL,
+    eventtype TEXT NOT NULL,
+    eventvalue TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path, eventtype, eventvalue)
+);
+CREATE INDEX IF NOT EXISTS idx_events_key ON events (eventtype, eventvalue);
+"""
+
+_COLUMNS = ('path', 'root', 'kind', 'mtime', 'size', 'nbchan', 'srate', 'pnts', 'trials',
+            'duration', 'labels', 'variables', 'datfile', 'error')
+
+
+def _read_record(path: str, root: str, mtime: float, size: int) -> Dict:
+    kind = os.path.splitext(path)[1].lower().lstrip('.')
+    record = dict.fromkeys(_COLUMNS)
+    record.update({'path': path, 'root': root, 'kind': kind, 'mtime': mtime, 'size': size})
+    record['event_counts'] = {}
+    try:
+        if kind == 'set':
+            header = read_set_header(path, with_events=True)
+            counts = {}
+            for event in header['events']:
+                key = (event['type'], event['value'])
+                counts[key] = counts.get(key, 0) + 1
+            record['event_counts'] = counts
+            record.update({
+                'nbchan': header['nbchan'],
+                'srate': header['srate'],
+                'pnts': header['pnts'],
+                'trials': header['trials'],
+                'duration': header['duration'],
+                'labels': json.dumps(header['labels']),
+                'datfile': header['datfile'],
+            })
+        else:
+            record['variables'] = json.dumps([variable.as_dict() for variable in inspect_mat(path)])
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict:
+    record = dict(row)
+    for key in ('labels', 'variables'):
+        record[key] = json.loads(record[key]) if record.get(key) else []
+    return record
+
+
+class DatasetIndex:
+    """Persistent header/metadata index for one data folder"""
+
+    def __init__(self, root: str, db_path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        if db_path is None:
+            # One database per folder, kept out of the data folder itself
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            digest = hashlib.sha1(os.path.normcase(self.root).encode('utf-8')).hexdigest()[:16]
+            db_path = os.path.join(INDEX_DIR, f'{digest}.sqlite')
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # Older layouts lack tables filled during parsing; rebuild from scratch
+            self._conn.executescript('DROP TABLE IF EXISTS recordings; DROP TABLE IF EXISTS events;')
+            self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _scan(self) -> Dict[str, tuple]:
+        found = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(INDEXED_EXTENSIONS):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                found[entry.path] = (stat.st_mtime, stat.st_size)
+        return found
+
+    def update(self, max_workers: Optional[int] = None) -> Dict[str, int]:
+        """Re-index changed files in the folder and drop rows for deleted ones"""
+        found = self._scan()
+        with self._lock:
+            known = {
+                row['path']: (row['mtime'], row['size'])
+                for row in self._conn.execute('SELECT path, mtime, size FROM recordings WHERE root = ?', (self.root,))
+            }
+        stale = [path for path, signature in found.items() if known.get(path) != signature]
+        removed = [path for path in known if path not in found]
+
+        # Header parsing is dominated by file I/O, so threads overlap it well
+        workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            records = list(pool.map(lambda path: _read_record(path, self.root, *found[path]), stale))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO recordings ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                [tuple(record[column] for column in _COLUMNS) for record in records],
+            )
+            self._conn.executemany('DELETE FROM recordings WHERE path = ?', [(path,) for path in removed])
+            self._conn.executemany('DELETE FROM events WHERE path = ?', [(path,) for path in stale + removed])
+            self._conn.executemany(
+                'INSERT INTO events (path, eventtype, eventvalue, count) VALUES (?, ?, ?, ?)',
+                [
+                    (record['path'], eventtype, eventvalue, count)
+                    for record in records
+                    for (eventtype, eventvalue), count in record['event_counts'].items()
+                ],
+            )
+
+        return {'scanned': len(found), 'updated': len(records), 'removed': len(removed)}
+
+    def get(self, path: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM recordings WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def query(self, nbchan: Optional[int] = None, srate: Optional[float] = None,
+              kind: Optional[str] = None, folder: Optional[str] = None) -> List[Dict]:
+        """Return indexed files matching every given constraint"""
+        clauses, params = ['root = ?'], [self.root]
+        if nbchan is not None:
+            clauses.append('nbchan = ?')
+            params.append(int(nbchan))
+        if srate is not None:
+            clauses.append('ABS(srate - ?) < 1e-6')
+            params.append(float(srate))
+        if kind:
+            clauses.append('kind = ?')
+            params.append(kind.lower().lstrip('.'))
+        if folder:
+            clauses.append('path LIKE ?')
+            params.append(os.path.join(os.path.abspath(folder), '%'))
+        sql = f"SELECT * FROM recordings WHERE {' AND '.join(clauses)} ORDER BY path"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+
+    def event_counts(self, eventtype: str, eventvalues: List[str]) -> Dict[str, Dict[str, int]]:
+        """Per-recording event counts for each requested value of one event type
+
+        Every indexed .set file in the folder is returned, with zero counts
+        for values it does not contain, so typos show up as empty conditions.
+        """
+        values = [str(value) for value in eventvalues]
+        with self._lock:
+            paths = [row['path'] for row in self._conn.execute(
+                "SELECT path FROM recordings WHERE root = ? AND kind = 'set' ORDER BY path", (self.root,))]
+            rows = []
+            if values:
+                placeholders = ', '.join('?' for _ in values)
+                rows = self._conn.execute(
+                    f"SELECT e.path, e.eventvalue, e.count FROM events e JOIN recordings r ON r.path = e.path "
+                    f"WHERE r.root = ? AND e.eventtype = ? AND e.eventvalue IN ({placeholders})",
+                    [self.root, eventtype] + values,
+                ).fetchall()
+        counts = {path: dict.fromkeys(values, 0) for path in paths}
+        for row in rows:
+            counts.setdefault(row['path'], dict.fromkeys(values, 0))[row['eventvalue']] = row['count']
+        return counts
+
+    def event_catalog(self) -> List[Dict]:
+        """All (eventtype, eventvalue) pairs in the folder with recording and event totals"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT e.eventtype, e.eventvalue, COUNT(DISTINCT e.path) AS recordings, SUM(e.count) AS total "
+                "FROM events e JOIN recordings r ON r.path = e.path WHERE r.root = ? "
+                "GROUP BY e.eventtype, e.eventvalue ORDER BY e.eventtype, e.eventvalue",
+                (self.root,),
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,363 @@
+"""Process-wide registry of datasets held in memory.
+
+Datasets are registered under a short handle together with their source path
+and resident size. The registry enforces a memory budget by evicting the least
+recently used datasets, and lets analysis code pick up an already-loaded
+subject by handle or source path instead of reading the .mat file again.
+Memory-mapped arrays are tracked but not counted against the budget, since
+their pages belong to the OS cache rather than to the process.
+
+.mat files are registered as ``LazyMat`` handles that read a variable only
+when it is first used, and the analysis engines open a folder's trial cache
+through ``shared_trial_cache`` so every engine reuses one registered cache.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import scipy.io
+
+from features.preprocessing.python.eeglab_io import EEGLABRecording, is_hdf5_mat
+from features.preprocessing.python.fieldtrip_h5 import FieldTripMatFile
+from features.preprocessing.python.trial_cache import TrialCache, cache_source, load_trial_cache
+
+DEFAULT_BUDGET_BYTES = 4096 * 1024 * 1024  # FileBrowser.setRamBudget changes it at run time
+
+
+class LazyMat:
+    """Variables of a .mat file, each read on first access instead of all at load time
+
+    v7.3 files are opened with fieldtrip_h5's lazy proxies, which read only
+    the cells that are indexed. v5 files cannot be read partially, so each
+    variable is loaded whole on first access and kept.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._h5 = FieldTripMatFile(self.path) if is_hdf5_mat(self.path) else None
+        if self._h5 is not None:
+            self._names = self._h5.keys()
+        else:
+            self._names = [name for name, _, _ in scipy.io.whosmat(self.path)]
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def keys(self) -> List[str]:
+        return list(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._names:
+            raise KeyError(f"{os.path.basename(self.path)} has no variable '{name}'")
+        if self._h5 is not None:
+            return self._h5[name]
+        with self._lock:
+            if name not in self._loaded:
+                mat = scipy.io.loadmat(self.path, variable_names=[name], squeeze_me=True, struct_as_record=False)
+                self._loaded[name] = mat[name]
+            return self._loaded[name]
+
+    def loaded(self) -> Dict[str, Any]:
+        """The v5 variables read so far (v7.3 proxies keep nothing resident)"""
+        with self._lock:
+            return dict(self._loaded)
+
+    def close(self):
+        if self._h5 is not None:
+            self._h5.close()
+        self._loaded = {}
+
+
+def measure_bytes(value: Any, _seen=None) -> Dict[str, int]:
+    """Return {'resident': ..., 'mapped': ...} byte counts for nested arrays/containers"""
+    seen = _seen if _seen is not None else set()
+    totals = {'resident': 0, 'mapped': 0}
+    if id(value) in seen:
+        return totals
+    seen.add(id(value))
+
+    def add(child):
+        child_totals = measure_bytes(child, seen)
+        totals['resident'] += child_totals['resident']
+        totals['mapped'] += child_totals['mapped']
+
+    if isinstance(value, np.ndarray):
+        base = value
+        while isinstance(base, np.ndarray) and base.base is not None and not isinstance(base, np.memmap):
+            base = base.base
+        if isinstance(value, np.memmap) or isinstance(base, np.memmap):
+            totals['mapped'] += value.nbytes
+        elif value.dtype == object:
+            for item in value.flat:
+                add(item)
+        else:
+            totals['resident'] += value.nbytes
+    elif isinstance(value, EEGLABRecording):
+        totals['mapped'] += value.n_samples * value.nbchan * 4
+    elif isinstance(value, LazyMat):
+        add(value.loaded())
+    elif isinstance(value, TrialCache):
+        add(value.trials)
+        add(value.index)
+    elif isinstance(value, dict):
+        for item in value.values():
+            add(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            add(item)
+    elif hasattr(value, '_fieldnames'):  # scipy.io mat_struct
+        for name in value._fieldnames:
+            add(getattr(value, name, None))
+    elif isinstance(value, (str, bytes)):
+        totals['resident'] += len(value)
+    return totals
+
+
+@dataclass
+class RegisteredDataset:
+    handle: str
+    name: str
+    data: Any
+    source_path: Optional[str] = None
+    source_mtime: Optional[float] = None
+    resident_bytes: int = 0
+    mapped_bytes: int = 0
+    loaded_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+    pinned: bool = False
+
+
+class DatasetRegistry:
+    """Thread-safe LRU store of loaded datasets with a resident-memory budget"""
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_BYTES):
+        self._budget = int(budget_bytes)
+        self._datasets: "OrderedDict[str, RegisteredDataset]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[], None]] = []
+        self._counter = itertools.count(1)
+        self._loading: Dict[str, threading.Event] = {}  # source path -> load in progress
+
+    # Listeners ----------------------------------------------------------
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Register a callback run (from the mutating thread) after any change"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in dataset registry listener: {e}")
+
+    # Budget -------------------------------------------------------------
+
+    @property
+    def budget_bytes(self) -> int:
+        return self._budget
+
+    def set_budget(self, budget_bytes: int):
+        with self._lock:
+            self._budget = max(0, int(budget_bytes))
+            evicted = self._evict()
+        if evicted:
+            self._close(evicted)
+            self._notify()
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.resident_bytes for entry in self._datasets.values())
+
+    @staticmethod
+    def _close(entries: List[RegisteredDataset]):
+        """Close the data of dropped entries (open files, memmaps); called outside the lock"""
+        for entry in entries:
+            close = getattr(entry.data, 'close', None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"Error closing dataset {entry.handle}: {e}")
+
+    def _evict(self, keep: Optional[str] = None) -> List[RegisteredDataset]:
+        evicted = []
+        total = sum(entry.resident_bytes for entry in self._datasets.values())
+        for handle in list(self._datasets):
+            if total <= self._budget:
+                break
+            entry = self._datasets[handle]
+            if handle == keep or entry.pinned:
+                continue
+            total -= entry.resident_bytes
+            del self._datasets[handle]
+            evicted.append(entry)
+        return evicted
+
+    # Registration -------------------------------------------------------
+
+    def register(self, name: str, data: Any, source_path: Optional[str] = None,
+                 pinned: bool = False) -> str:
+        """Store ``data`` and return its handle; replaces an entry for the same source path"""
+        sizes = measure_bytes(data)
+        mtime = None
+        if source_path:
+            source_path = os.path.abspath(source_path)
+            try:
+                mtime = os.path.getmtime(source_path)
+            except OSError:
+                mtime = None
+        with self._lock:
+            replaced = []
+            if source_path:
+                for handle, entry in list(self._datasets.items()):
+                    if entry.source_path == source_path:
+                        del self._datasets[handle]
+                        if entry.data is not data:
+                            replaced.append(entry)
+            handle = f"ds{next(self._counter)}"
+            self._datasets[handle] = RegisteredDataset(
+                handle=handle,
+                name=name,
+                data=data,
+                source_path=source_path,
+                source_mtime=mtime,
+                resident_bytes=sizes['resident'],
+                mapped_bytes=sizes['mapped'],
+                pinned=pinned,
+            )
+            evicted = self._evict(keep=handle)
+        if evicted:
+            print(f"Dataset registry evicted {', '.join(entry.handle for entry in evicted)} to stay within budget")
+        self._close(replaced + evicted)
+        self._notify()
+        return handle
+
+    def get(self, handle: str) -> Any:
+        """Return the data for a handle and mark it most recently used"""
+        with self._lock:
+            entry = self._datasets.get(handle)
+            if entry is None:
+                raise KeyError(f"No dataset registered under handle '{handle}'")
+            self._datasets.move_to_end(handle)
+            entry.last_access = time.time()
+            evicted = []
+            if isinstance(entry.data, LazyMat):
+                # Variables read since the last access now count against the budget
+                entry.resident_bytes = measure_bytes(entry.data)['resident']
+                evicted = self._evict(keep=handle)
+            data = entry.data
+        if evicted:
+            self._close(evicted)
+            self._notify()
+        return data
+
+    def find(self, source_path: str) -> Optional[str]:
+        """Handle of the up-to-date dataset loaded from ``source_path``, if any"""
+        source_path = os.path.abspath(source_path)
+        try:
+            mtime = os.path.getmtime(source_path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            for handle, entry in self._datasets.items():
+                if entry.source_path == source_path and entry.source_mtime == mtime:
+                    return handle
+        return None
+
+    def get_or_load(self, source_path: str, loader: Callable[[str], Any] = LazyMat,
+                    name: Optional[str] = None) -> str:
+        """Return the handle for ``source_path``, loading it with ``loader`` if needed
+
+        Concurrent calls for the same path load it once: later callers wait for
+        the first load and get its handle (or retry if it failed).
+        """
+        source_path = os.path.abspath(source_path)
+        while True:
+            with self._lock:
+                handle = self.find(source_path)
+                if handle is not None:
+                    self.get(handle)
+                    return handle
+                pending = self._loading.get(source_path)
+                if pending is None:
+                    pending = self._loading[source_path] = threading.Event()
+                    break
+            pending.wait()
+        try:
+            data = loader(source_path)
+            return self.register(name or os.path.basename(source_path), data, source_path=source_path)
+        finally:
+            with self._lock:
+                del self._loading[source_path]
+            pending.set()
+
+    def release(self, handle: str) -> bool:
+        with self._lock:
+            entry = self._datasets.pop(handle, None)
+        if entry is None:
+            return False
+        self._close([entry])
+        self._notify()
+        return True
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._datasets.values())
+            self._datasets.clear()
+        self._close(entries)
+        self._notify()
+
+    def entries(self) -> List[RegisteredDataset]:
+        """Snapshot of the registered datasets, least recently used first"""
+        with self._lock:
+            return list(self._datasets.values())
+
+
+_registry: Optional[DatasetRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DatasetRegistry:
+    """Return the process-wide registry shared by the UI and analysis engines"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DatasetRegistry()
+        return _registry
+
+
+def shared_trial_cache(folder: str) -> Optional[TrialCache]:
+    """load_trial_cache through the registry, so every engine reuses one open cache per folder
+
+    The entry is keyed on the cache's source (subjects.h5 or the clean .mat):
+    once that file changes, the next call rebuilds and re-registers the cache.
+    """
+    source = cache_source(folder)
+    if source is None:
+        return load_trial_cache(folder)
+    registry = get_registry()
+
+    def open_cache(_source_path):
+        cache = load_trial_cache(folder)
+        if cache is None:
+            raise FileNotFoundError(f"No cleaned data to build a trial cache from in {folder}")
+        return cache
+
+    name = f"{os.path.basename(os.path.normpath(folder))} trial cache"
+    return registry.get(registry.get_or_load(source, loader=open_cache, name=name))
@@ -0,0 +1,488 @@
+"""Lightweight readers for EEGLAB .set/.fdt recordings.
+
+The header helpers parse only the .set file (channel count, sample rate,
+length, channel labels and the event table) and never touch the signal.
+EEGLABRecording adds signal access: the .fdt payload is a raw little-endian
+float32 matrix written sample by sample (all channels of sample 1, then of
+sample 2, ...), which maps onto an ``np.memmap`` of shape (samples, channels)
+so channel/sample slices read only the pages they cover.
+
+Because every sample row interleaves all channels, a channel subset still
+touches every page of its sample range. For repeated subset reads a
+channel-major copy of the payload can be built once next to the .fdt; reads
+then fetch only the bytes of the requested channels.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import scipy.io
+
+
+def is_hdf5_mat(path: str) -> bool:
+    """MATLAB v7.3 files are HDF5 containers with a 512-byte MATLAB preamble"""
+    with open(path, 'rb') as handle:
+        handle.seek(512)
+        return handle.read(8) == b'\x89HDF\r\n\x1a\n'
+
+
+def _scalar(value, default=None):
+    try:
+        array = np.asarray(value).ravel()
+        if array.size == 0:
+            return default
+        return array[0].item()
+    except Exception:
+        return default
+
+
+def _as_list(value) -> List[Any]:
+    if value is None:
+        return []
+    if isinstance(value, np.ndarray):
+        return list(value.ravel())
+    return [value]
+
+
+def _h5_string(dataset) -> str:
+    """Decode a MATLAB char array stored in HDF5 (uint16 code points)"""
+    array = np.asarray(dataset[()]).ravel()
+    if array.dtype.kind in ('u', 'i'):
+        return ''.join(chr(int(code)) for code in array if code)
+    return ''
+
+
+def _h5_value(group, name, default=None):
+    if name not in group:
+        return default
+    return _scalar(group[name][()], default)
+
+
+def _h5_chanlocs_labels(h5_file, group) -> List[str]:
+    if 'chanlocs' not in group or 'labels' not in group['chanlocs']:
+        return []
+    labels_ds = group['chanlocs']['labels']
+    labels = []
+    for ref in np.asarray(labels_ds[()]).ravel():
+        try:
+            labels.append(_h5_string(h5_file[ref]))
+        except Exception:
+            labels.append('')
+    return labels
+
+
+def _h5_cell_value(h5_file, ref):
+    item = h5_file[ref]
+    matlab_class = item.attrs.get('MATLAB_class', b'')
+    if isinstance(matlab_class, bytes):
+        matlab_class = matlab_class.decode('ascii', 'ignore')
+    if matlab_class == 'char':
+        return _h5_string(item)
+    return _scalar(item[()])
+
+
+def _h5_struct_field(h5_file, group, name) -> List[Any]:
+    if name not in group:
+        return []
+    dataset = group[name]
+    if dataset.dtype.kind == 'O':
+        return [_h5_cell_value(h5_file, ref) for ref in np.asarray(dataset[()]).ravel()]
+    return list(np.asarray(dataset[()]).ravel())
+
+
+def _event_value(value):
+    """Normalize EEGLAB event types so 'S200' and 200 both index as strings"""
+    if isinstance(value, str):
+        return value.strip()
+    number = _scalar(value)
+    if isinstance(number, float) and number.is_integer():
+        number = int(number)
+    return '' if number is None else str(number)
+
+
+def _to_fieldtrip_events(types, codes, latencies, durations) -> List[Dict[str, Any]]:
+    """Map EEGLAB events the way FieldTrip's ft_read_event does
+
+    EEG.event.code (e.g. 'Stimulus' from BrainVision imports) becomes the
+    FieldTrip event type and EEG.event.type (e.g. 'S200') the event value;
+    without a code field every event is of type 'trigger'.
+    """
+    events = []
+    for position, raw_value in enumerate(types):
+        code = codes[position] if position < len(codes) else None
+        event_type = _event_value(code) if code is not None else ''
+        latency = _scalar(latencies[position], 0.0) if position < len(latencies) else 0.0
+        duration = _scalar(durations[position], 0.0) if position < len(durations) else 0.0
+        events.append({
+            'type': event_type or 'trigger',
+            'value': _event_value(raw_value),
+            'sample': float(latency or 0.0),
+            'duration': float(duration or 0.0),
+        })
+    return events
+
+
+def _v5_events(event_field) -> List[Dict[str, Any]]:
+    entries = _as_list(event_field)
+    if not entries:
+        return []
+    return _to_fieldtrip_events(
+        [getattr(entry, 'type', '') for entry in entries],
+        [getattr(entry, 'code', None) for entry in entries] if hasattr(entries[0], 'code') else [],
+        [getattr(entry, 'latency', 0.0) for entry in entries],
+        [getattr(entry, 'duration', 0.0) for entry in entries],
+    )
+
+
+def _h5_events(h5_file, group) -> List[Dict[str, Any]]:
+    if 'event' not in group or not hasattr(group['event'], 'keys'):
+        return []
+    event_group = group['event']
+    return _to_fieldtrip_events(
+        _h5_struct_field(h5_file, event_group, 'type'),
+        _h5_struct_field(h5_file, event_group, 'code'),
+        _h5_struct_field(h5_file, event_group, 'latency'),
+        _h5_struct_field(h5_file, event_group, 'duration'),
+    )
+
+
+def _load_v5_fields(path: str, skip=('data',)) -> Dict[str, Any]:
+    """Load the EEG struct fields of a v5/v7 .set file without the flattened signal variable"""
+    variables = [name for name, _, _ in scipy.io.whosmat(path)]
+    if 'EEG' in variables:
+        # Older EEGLAB files nest everything in one struct; with a separate
+        # .fdt the data field is just the file name, so this stays small.
+        mat = scipy.io.loadmat(path, variable_names=['EEG'], squeeze_me=True, struct_as_record=False)
+        eeg = mat['EEG']
+        fields = {name: getattr(eeg, name) for name in eeg._fieldnames if name not in skip}
+        if isinstance(getattr(eeg, 'data', None), str):
+            fields['data'] = eeg.data
+        return fields
+    wanted = [name for name in variables if name not in skip]
+    mat = scipy.io.loadmat(path, variable_names=wanted, squeeze_me=True, struct_as_record=False)
+    return {name: value for name, value in mat.items() if not name.startswith('__')}
+
+
+def _resolve_datfile(set_path: str, datfile) -> Optional[str]:
+    if isinstance(datfile, str) and datfile:
+        return os.path.join(os.path.dirname(set_path), datfile)
+    default_fdt = os.path.splitext(set_path)[0] + '.fdt'
+    return default_fdt if os.path.exists(default_fdt) else None
+
+
+def read_set_header(path: str, with_events: bool = False) -> Dict[str, Any]:
+    """Return nbchan, srate, pnts, trials, duration, labels and the .fdt path of a .set file
+
+    With ``with_events`` the FieldTrip-style event table (type, value, sample,
+    duration) is parsed from the same read and returned under ``events``.
+    """
+    events = []
+    if is_hdf5_mat(path):
+        import h5py
+        with h5py.File(path, 'r') as h5_file:
+            group = h5_file['EEG'] if 'EEG' in h5_file else h5_file
+            nbchan = _h5_value(group, 'nbchan', 0)
+            srate = _h5_value(group, 'srate', 0.0)
+            pnts = _h5_value(group, 'pnts', 0)
+            trials = _h5_value(group, 'trials', 1)
+            labels = _h5_chanlocs_labels(h5_file, group)
+            datfile = None
+            for key in ('datfile', 'data'):
+                if key in group and group[key].dtype.kind in ('u', 'i') and group[key].ndim <= 2:
+                    candidate = _h5_string(group[key])
+                    if candidate.lower().endswith('.fdt'):
+                        datfile = candidate
+                        break
+            if with_events:
+                events = _h5_events(h5_file, group)
+    else:
+        fields = _load_v5_fields(path)
+        nbchan = _scalar(fields.get('nbchan'), 0)
+        srate = _scalar(fields.get('srate'), 0.0)
+        pnts = _scalar(fields.get('pnts'), 0)
+        trials = _scalar(fields.get('trials'), 1)
+        labels = [str(getattr(loc, 'labels', '')) for loc in _as_list(fields.get('chanlocs'))]
+        datfile = None
+        for key in ('datfile', 'data'):
+            if isinstance(fields.get(key), str) and fields[key]:
+                datfile = fields[key]
+                break
+        if with_events:
+            events = _v5_events(fields.get('event'))
+
+    nbchan = int(nbchan or 0)
+    pnts = int(pnts or 0)
+    trials = int(trials or 1)
+    srate = float(srate or 0.0)
+    header = {
+        'nbchan': nbchan,
+        'srate': srate,
+        'pnts': pnts,
+        'trials': trials,
+        'duration': (pnts * trials / srate) if srate else 0.0,
+        'labels': labels,
+        'datfile': _resolve_datfile(path, datfile),
+    }
+    if with_events:
+        header['events'] = events
+    return header
+
+
+def read_set_events(path: str) -> List[Dict[str, Any]]:
+    """Return the FieldTrip-style event table of a .set file"""
+    return read_set_header(path, with_events=True)['events']
+
+
+CHANNEL_MAJOR_SUFFIX = '.chmajor.f32'
+SAMPLE_MAJOR_SUFFIX = '.samples.f32'
+READ_BLOCK_SAMPLES = 65536
+
+
+class _EpochedH5Samples:
+    """(samples, channels) row-slice access to an epoched v7.3 EEG.data without reading it
+
+    MATLAB's channels x pnts x trials array is stored in HDF5 as
+    (trials, pnts, channels); consecutive samples of the concatenated signal
+    are rows of consecutive trials, so a row range is read trial by trial.
+    """
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+        self.pnts = dataset.shape[1]
+        self.shape = (dataset.shape[0] * dataset.shape[1], dataset.shape[2])
+        self.dtype = dataset.dtype
+
+    def __getitem__(self, key):
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        if not isinstance(rows, slice):
+            raise TypeError("Epoched HDF5 signals only support sample ranges")
+        start, stop, step = rows.indices(self.shape[0])
+        if step != 1:
+            raise TypeError("Epoched HDF5 signals only support contiguous sample ranges")
+        parts = []
+        for trial in range(start // self.pnts, (stop - 1) // self.pnts + 1 if stop > start else 0):
+            first = max(start - trial * self.pnts, 0)
+            last = min(stop - trial * self.pnts, self.pnts)
+            parts.append(self._dataset[trial, first:last, columns])
+        if not parts:
+            return self._dataset[0, 0:0, columns]
+        return np.concatenate(parts, axis=0)
+
+
+class EEGLABRecording:
+    """Header, events and memory-mapped signal of one EEGLAB recording
+
+    ``data`` is a (channels, samples) view over the .fdt file; nothing is
+    read until it is sliced. Epoched files (trials > 1) are concatenated along
+    samples exactly as EEGLAB stores them, and ``epochs()`` exposes them as a
+    (trials, channels, pnts) view.
+
+    A signal embedded in a v7.3 .set (2-D continuous or 3-D epoched) is
+    mapped directly when HDF5 stores it contiguously; a chunked or compressed
+    one is read in blocks by ``read()``, and ``data`` first unpacks it once
+    into a float32 file beside the .set (``<name>.samples.f32``) to map that.
+    """
+
+    def __init__(self, set_path: str):
+        self.path = os.path.abspath(set_path)
+        header = read_set_header(self.path, with_events=True)
+        self.nbchan = header['nbchan']
+        self.srate = header['srate']
+        self.pnts = header['pnts']
+        self.trials = header['trials']
+        self.labels = header['labels']
+        self.events = header['events']
+        self.datfile = header['datfile']
+        self.n_samples = self.pnts * self.trials
+        self._h5_file = None
+        self._samples = self._open_samples()
+        self._channels = self._open_channel_major()
+
+    def _open_samples(self):
+        """(samples, channels) array-like over the signal without reading it"""
+        if self.datfile and os.path.exists(self.datfile):
+            expected = self.n_samples * self.nbchan * 4
+            actual = os.path.getsize(self.datfile)
+            if actual < expected:
+                raise ValueError(
+                    f"{self.datfile} holds {actual} bytes, expected {expected} "
+                    f"for {self.nbchan} channels x {self.n_samples} samples"
+                )
+            return np.memmap(self.datfile, dtype='<f4', mode='r', shape=(self.n_samples, self.nbchan))
+
+        # Signal embedded in the .set itself
+        if is_hdf5_mat(self.path):
+            import h5py
+            self._h5_file = h5py.File(self.path, 'r')
+            group = self._h5_file['EEG'] if 'EEG' in self._h5_file else self._h5_file
+            dataset = group['data']
+            # HDF5 keeps MATLAB's channels x samples (x trials) as (trials x) samples x channels,
+            # which in C order is the .fdt layout
+            if dataset.ndim not in (2, 3) or dataset.shape[-1] != self.nbchan or \
+                    int(np.prod(dataset.shape[:-1])) != self.n_samples:
+                raise ValueError(
+                    f"EEG.data in {self.path} has shape {dataset.shape[::-1]}, expected "
+                    f"{self.nbchan} channels x {self.pnts} points x {self.trials} trials"
+                )
+            offset = dataset.id.get_offset()
+            if dataset.chunks is None and offset is not None:
+                return np.memmap(self.path, dtype=dataset.dtype, mode='r', offset=offset,
+                                 shape=(self.n_samples, self.nbchan))
+            return _EpochedH5Samples(dataset) if dataset.ndim == 3 else dataset
+        mat = scipy.io.loadmat(self.path, variable_names=['EEG'], squeeze_me=True, struct_as_record=False)
+        signal = np.asarray(mat['EEG'].data, dtype=np.float32)
+        return signal.reshape(self.nbchan, self.n_samples, order='F').T
+
+    def _channel_major_path(self) -> Optional[str]:
+        if not self.datfile:
+            return None
+        return os.path.splitext(self.datfile)[0] + CHANNEL_MAJOR_SUFFIX
+
+    def _open_channel_major(self):
+        """(channels, samples) memmap of the channel-major copy, if present and current"""
+        path = self._channel_major_path()
+        if not path or not os.path.exists(path) or not os.path.exists(self.datfile):
+            return None
+        if os.path.getmtime(path) < os.path.getmtime(self.datfile):
+            return None
+        if os.path.getsize(path) != self.n_samples * self.nbchan * 4:
+            return None
+        return np.memmap(path, dtype='<f4', mode='r', shape=(self.nbchan, self.n_samples))
+
+    def build_channel_major_cache(self, block_samples: int = READ_BLOCK_SAMPLES) -> Optional[str]:
+        """Write a channel-major copy of the .fdt so channel subsets read only their own bytes"""
+        path = self._channel_major_path()
+        if path is None:
+            return None
+        if self._channels is None:
+            # Build beside the final name and rename when complete, so an interrupted build
+            # never leaves a full-size, newer file that _open_channel_major would accept
+            partial = path + '.tmp'
+            try:
+                target = np.memmap(partial, dtype='<f4', mode='w+', shape=(self.nbchan, self.n_samples))
+                for block_start in range(0, self.n_samples, block_samples):
+                    block_stop = min(block_start + block_samples, self.n_samples)
+                    target[:, block_start:block_stop] = self._samples[block_start:block_stop].T
+                target.flush()
+                del target
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            self._channels = self._open_channel_major()
+        return path
+
+    def close(self):
+        self._samples = None
+        self._channels = None
+        if self._h5_file is not None:
+            self._h5_file.close()
+            self._h5_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_sample_major(self):
+        """(samples, channels) memmap of the unpacked embedded signal, if present and current"""
+        path = os.path.splitext(self.path)[0] + SAMPLE_MAJOR_SUFFIX
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(self.path):
+            return None
+        if os.path.getsize(path) != self.n_samples * self.nbchan * 4:
+            return None
+        return np.memmap(path, dtype='<f4', mode='r', shape=(self.n_samples, self.nbchan))
+
+    def _unpack_embedded(self, block_samples: int = READ_BLOCK_SAMPLES) -> np.memmap:
+        """Decompress a chunked embedded signal block by block into a float32 memmap"""
+        samples = self._open_sample_major()
+        if samples is not None:
+            return samples
+        path = os.path.splitext(self.path)[0] + SAMPLE_MAJOR_SUFFIX
+        partial = path + '.tmp'
+        try:
+            target = np.memmap(partial, dtype='<f4', mode='w+', shape=(self.n_samples, self.nbchan))
+            for block_start in range(0, self.n_samples, block_samples):
+                block_stop = min(block_start + block_samples, self.n_samples)
+                target[block_start:block_stop] = self._samples[block_start:block_stop]
+            target.flush()
+            del target
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return self._open_sample_major()
+
+    @property
+    def data(self) -> np.ndarray:
+        """(channels, samples) zero-copy view of the whole signal
+
+        The channel-major copy is used when present, so a channel subset of
+        the view touches only those channels' pages. Chunked or compressed
+        v7.3 signals have no such view, so the first access unpacks them to
+        ``<name>.samples.f32`` (see the class docstring).
+        """
+        if self._channels is not None:
+            return self._channels
+        if not isinstance(self._samples, np.ndarray):
+            self._samples = self._unpack_embedded()
+        return self._samples.T
+
+    def epochs(self) -> np.ndarray:
+        """(trials, channels, pnts) zero-copy view of an epoched recording"""
+        return self.data.reshape(self.nbchan, self.trials, self.pnts).transpose(1, 0, 2)
+
+    def channel_indices(self, channels) -> List[int]:
+        """Map labels (or indices) to channel indices in file order"""
+        if channels is None:
+            return list(range(self.nbchan))
+        lookup = {label.lower(): position for position, label in enumerate(self.labels)}
+        indices = []
+        for channel in channels:
+            if isinstance(channel, (int, np.integer)):
+                indices.append(int(channel))
+            elif str(channel).lower() in lookup:
+                indices.append(lookup[str(channel).lower()])
+            else:
+                raise KeyError(f"Channel '{channel}' not found in {os.path.basename(self.path)}")
+        return indices
+
+    def read(self, channels=None, start: int = 0, stop: Optional[int] = None,
+             block_samples: int = READ_BLOCK_SAMPLES) -> np.ndarray:
+        """Return a (channels, samples) float32 block for the given labels/indices and sample range
+
+        Only the requested channels are copied out: from the channel-major
+        cache when present (reading just their bytes), otherwise through
+        strided views over blocks of ``block_samples`` rows, so memory never
+        holds more than the output plus one block.
+        """
+        stop = self.n_samples if stop is None else min(int(stop), self.n_samples)
+        start = max(0, int(start))
+        indices = self.channel_indices(channels)
+        out = np.empty((len(indices), max(0, stop - start)), dtype=np.float32)
+        if out.size == 0:
+            return out
+
+        if self._channels is not None:
+            for row, channel in enumerate(indices):
+                out[row] = self._channels[channel, start:stop]
+            return out
+
+        if isinstance(self._samples, np.ndarray):
+            column_select = indices
+            reorder = None
+        else:
+            # h5py only accepts increasing, unique column selections
+            column_select = sorted(set(indices))
+            position = {channel: offset for offset, channel in enumerate(column_select)}
+            reorder = [position[channel] for channel in indices]
+
+        for block_start in range(start, stop, block_samples):
+            block_stop = min(block_start + block_samples, stop)
+            block = self._samples[block_start:block_stop, column_select]
+            if reorder is not None:
+                block = block[:, reorder]
+            out[:, block_start - start:block_stop - start] = block.T
+        return out
@@ -0,0 +1,436 @@
+"""NumPy FastICA producing FieldTrip-compatible component structures.
+
+Python counterpart of applyICA.m (ft_componentanalysis with cfg.method =
+'fastica'). Every trial is demeaned and the trials are concatenated, as
+ft_componentanalysis does, then:
+
+* whitening uses one covariance product (a single BLAS gemm) and an
+  eigendecomposition instead of per-trial accumulation;
+* the whitening keeps only the data rank (average reference and
+  interpolated channels remove dimensions) and can reduce further to a
+  component count or explained-variance fraction, which shrinks every
+  iteration and usually the number of iterations too;
+* iterations update all components at once with matrix products over the
+  whitened block (symmetric) or one vector at a time (deflation), with the
+  logcosh or exp contrast functions.
+
+With ``warm_start`` each recording starts from the unmixing its previous run
+left in ``ica_cache/<subject>.mat`` (shared with applyICA.m), as long as the
+channels and component count match and that unmixing still nearly whitens
+the new data; otherwise the run starts from a random matrix as usual.
+
+The result carries ``unmixing`` (components x channels, whitening folded in),
+``topo`` (its pseudo-inverse), ``topolabel`` and ``label`` ('fastica001',
+...), so it can be written to the store and data_ICApplied.mat and browsed
+or rejected in MATLAB. Subjects run in a process pool; each worker reads its
+own subject from subjects.h5 and only the weights travel back.
+
+    python -m features.preprocessing.python.fastica <data_dir> --workers 4
+"""
+
+import multiprocessing
+import os
+import re
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.io
+
+from features.preprocessing.python.storage_formats import stage_format
+from features.preprocessing.python.subject_store import STORE_FILENAME, SubjectStore
+
+ICA_MAT_FILENAME = 'data_ICApplied.mat'
+PREPROCESSING_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'matlab', 'preprocessing.m')
+ALGORITHMS = ('symmetric', 'deflation')
+CONTRASTS = ('logcosh', 'exp')
+# Eigenvalues below this fraction of the largest are treated as zero, like fastica's pcamat rankTolerance
+RANK_TOLERANCE = 1e-7
+ICA_CACHE_DIRNAME = 'ica_cache'
+# RMS deviation of U C U' from identity above which a cached unmixing U is not reused
+MAX_WARM_START_DRIFT = 0.2
+
+
+@dataclass
+class ICAOptions:
+    algorithm: str = 'symmetric'
+    fun: str = 'logcosh'
+    max_iter: int = 1000
+    tol: float = 1e-4  # fastica's default epsilon
+    seed: Optional[int] = 0
+    # PCA reduction before ICA: a fixed number of components and/or a fraction of variance to keep
+    n_components: Optional[int] = None
+    variance: Optional[float] = None
+    # Also run the full-rank decomposition to report the measured speedup of the reduction
+    compare_full: bool = False
+    # Start from the cached unmixing of a previous run unless the data drifted more than max_drift
+    warm_start: bool = False
+    max_drift: float = MAX_WARM_START_DRIFT
+
+
+def read_ica_settings(script_path: str = PREPROCESSING_SCRIPT) -> ICAOptions:
+    """ICAOptions for the ``ica_numcomponent``/``ica_warm_start`` settings of preprocessing.m (see applyICA.m)"""
+    options = ICAOptions()
+    try:
+        with open(script_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+    except OSError:
+        return options
+    warm = re.search(r"^\s*ica_warm_start\s*=\s*(\w+)\s*;", content, re.MULTILINE)
+    if warm:
+        options.warm_start = warm.group(1).lower() in ('true', '1')
+    match = re.search(r"^\s*ica_numcomponent\s*=\s*([^;%]+);", content, re.MULTILINE)
+    if match:
+        value = match.group(1).strip().strip("'")
+        try:
+            number = float(value)
+        except ValueError:
+            return options  # 'rank'
+        if 0 < number < 1:
+            options.variance = number
+        elif number >= 1:
+            options.n_components = int(round(number))
+    return options
+
+
+# Contrast functions: return g(u) and the mean of g'(u) per component ------
+
+def _logcosh(u: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    gu = np.tanh(u, out=u)
+    return gu, (1.0 - gu ** 2).mean(axis=-1)
+
+
+def _exp(u: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    u2 = u ** 2
+    gauss = np.exp(-u2 / 2.0)
+    g_prime = ((1.0 - u2) * gauss).mean(axis=-1)
+    return np.multiply(u, gauss, out=u), g_prime
+
+
+_CONTRAST_FUNCTIONS: Dict[str, Callable] = {'logcosh': _logcosh, 'exp': _exp}
+
+
+# Whitening and iterations -----------------------------------------------
+
+def concatenate_trials(trials: Sequence[np.ndarray]) -> np.ndarray:
+    """(channels, total samples) float64 block of per-trial demeaned data"""
+    lengths = [np.shape(trial)[1] for trial in trials]
+    out = np.empty((np.shape(trials[0])[0], sum(lengths)), dtype=np.float64)
+    position = 0
+    for trial, length in zip(trials, lengths):
+        block = out[:, position:position + length]
+        block[...] = trial
+        block -= block.mean(axis=1, keepdims=True)
+        position += length
+    return out
+
+
+def whiten(data: np.ndarray, n_components: Optional[int] = None, variance: Optional[float] = None,
+           covariance: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Whitening/dewhitening matrices from the eigendecomposition of the channel covariance
+
+    Directions with (numerically) zero variance are dropped, so rank-deficient
+    data (average reference, interpolated channels) yields ``rank`` components
+    instead of a singular whitening. ``n_components`` and ``variance`` reduce
+    further to the leading principal components.
+    """
+    if covariance is None:
+        covariance = data @ data.T / data.shape[1]
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues, eigenvectors = eigenvalues[order], eigenvectors[:, order]
+    rank = int(np.count_nonzero(eigenvalues > max(eigenvalues[0], 0.0) * RANK_TOLERANCE))
+    explained = np.cumsum(np.maximum(eigenvalues, 0.0)) / max(np.maximum(eigenvalues, 0.0).sum(), np.finfo(float).tiny)
+    count = rank
+    if variance is not None:
+        count = min(count, int(np.searchsorted(explained, variance)) + 1)
+    if n_components is not None:
+        count = min(count, max(1, int(n_components)))
+    eigenvalues, eigenvectors = eigenvalues[:count], eigenvectors[:, :count]
+    return {
+        'rank': rank,
+        'variance_retained': float(explained[count - 1]),
+        'eigenvalues': eigenvalues,
+        'whitening': eigenvectors.T / np.sqrt(eigenvalues)[:, None],
+        'dewhitening': eigenvectors * np.sqrt(eigenvalues)[None, :],
+    }
+
+
+def _sym_decorrelation(w: np.ndarray) -> np.ndarray:
+    """(W W^T)^(-1/2) W"""
+    eigenvalues, eigenvectors = np.linalg.eigh(w @ w.T)
+    eigenvalues = np.maximum(eigenvalues, np.finfo(float).tiny)
+    return (eigenvectors / np.sqrt(eigenvalues)) @ eigenvectors.T @ w
+
+
+def _ica_symmetric(z: np.ndarray, w: np.ndarray, g: Callable, max_iter: int, tol: float) -> Tuple[np.ndarray, int]:
+    n_samples = z.shape[1]
+    w = _sym_decorrelation(w)
+    for iteration in range(1, max_iter + 1):
+        gwz, g_prime = g(w @ z)
+        w_new = _sym_decorrelation(gwz @ z.T / n_samples - g_prime[:, None] * w)
+        change = np.max(np.abs(np.abs(np.einsum('ij,ij->i', w_new, w)) - 1.0))
+        w = w_new
+        if change < tol:
+            return w, iteration
+    return w, max_iter
+
+
+def _ica_deflation(z: np.ndarray, w_init: np.ndarray, g: Callable, max_iter: int, tol: float) -> Tuple[np.ndarray, int]:
+    n_components, n_samples = w_init.shape[0], z.shape[1]
+    w = np.zeros_like(w_init)
+    iterations = 0
+    for component in range(n_components):
+        vector = w_init[component].copy()
+        vector -= w[:component].T @ (w[:component] @ vector)
+        vector /= np.linalg.norm(vector)
+        for iteration in range(1, max_iter + 1):
+            gwz, g_prime = g((vector @ z)[None, :])
+            new = (gwz @ z.T / n_samples).ravel() - g_prime[0] * vector
+            new -= w[:component].T @ (w[:component] @ new)
+            new /= np.linalg.norm(new)
+            change = abs(abs(new @ vector) - 1.0)
+            vector = new
+            if change < tol:
+                break
+        iterations = max(iterations, iteration)
+        w[component] = vector
+    return w, iterations
+
+
+def unmixing_drift(unmixing: np.ndarray, covariance: np.ndarray) -> float:
+    """How far an unmixing matrix is from whitening data with this covariance
+
+    FastICA's unmixing gives unit-variance, uncorrelated components on the data
+    it was fitted to, so ``U C U'`` is the identity; the RMS deviation from it
+    grows as the data changes.
+    """
+    component_covariance = unmixing @ covariance @ unmixing.T
+    return float(np.linalg.norm(component_covariance - np.eye(len(unmixing))) / np.sqrt(len(unmixing)))
+
+
+def fastica(data: np.ndarray, options: Optional[ICAOptions] = None,
+            w_init: Optional[np.ndarray] = None, initial_unmixing: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """Run FastICA on a (channels, samples) block that is already demeaned
+
+    ``initial_unmixing`` (components x channels, e.g. from a previous run) is
+    mapped into the new whitened space and used as the starting point when its
+    shape matches and its drift stays below ``options.max_drift``.
+    Returns the sensor-space ``unmixing``/``topo`` plus the whitening used, the
+    number of iterations and whether the warm start was taken.
+    """
+    options = options or ICAOptions()
+    if options.algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown ICA algorithm '{options.algorithm}'; choose one of {', '.join(ALGORITHMS)}")
+    if options.fun not in CONTRASTS:
+        raise ValueError(f"Unknown contrast '{options.fun}'; choose one of {', '.join(CONTRASTS)}")
+
+    covariance = data @ data.T / data.shape[1]
+    white = whiten(data, options.n_components, options.variance, covariance=covariance)
+    z = white['whitening'] @ data
+    n_components = z.shape[0]
+    drift = None
+    if w_init is None and initial_unmixing is not None and initial_unmixing.shape == (n_components, len(data)):
+        drift = unmixing_drift(initial_unmixing, covariance)
+        if drift <= options.max_drift:
+            w_init = initial_unmixing @ white['dewhitening']
+    warm_started = w_init is not None and drift is not None
+    if w_init is None:
+        w_init = np.random.default_rng(options.seed).standard_normal((n_components, n_components))
+    run = _ica_symmetric if options.algorithm == 'symmetric' else _ica_deflation
+    w, iterations = run(z, w_init, _CONTRAST_FUNCTIONS[options.fun], options.max_iter, options.tol)
+
+    unmixing = w @ white['whitening']
+    return {
+        'unmixing': unmixing,
+        'topo': np.linalg.pinv(unmixing),
+        'iterations': iterations,
+        'whitening': white,
+        'warm_started': warm_started,
+        'drift': drift,
+    }
+
+
+def component_activations(data: Dict[str, Any], unmixing: np.ndarray) -> Dict[str, Any]:
+    """Component time courses (trial/time/trialinfo/sampleinfo) of demeaned ``data`` trials"""
+    out = {'trial': [unmixing @ (trial - trial.mean(axis=1, keepdims=True))
+                     for trial in (np.asarray(trial, dtype=np.float64) for trial in data['trial'])],
+           'time': data['time']}
+    for name in ('trialinfo', 'sampleinfo'):
+        if data.get(name) is not None:
+            out[name] = data[name]
+    return out
+
+
+def component_analysis(data: Dict[str, Any], options: Optional[ICAOptions] = None,
+                       with_activations: bool = False, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """ft_componentanalysis(cfg.method = 'fastica') on a FieldTrip-like dict
+
+    Besides the FieldTrip fields, reports the data ``rank``, the variance
+    retained by the PCA reduction and, with ``options.compare_full``, the
+    measured ``speedup`` over decomposing at full rank. ``previous`` (unmixing
+    and topolabel of an earlier run) warm-starts the decomposition when the
+    channels match.
+    """
+    options = options or ICAOptions()
+    block = concatenate_trials(data['trial'])
+    initial_unmixing = None
+    if previous is not None and list(previous['topolabel']) == list(data['label']):
+        initial_unmixing = np.asarray(previous['unmixing'], dtype=np.float64)
+    started = timer.perf_counter()
+    result = fastica(block, options, initial_unmixing=initial_unmixing)
+    seconds = timer.perf_counter() - started
+    speedup = None
+    if options.compare_full and (options.n_components is not None or options.variance is not None):
+        started = timer.perf_counter()
+        fastica(block, replace(options, n_components=None, variance=None))
+        speedup = (timer.perf_counter() - started) / max(seconds, np.finfo(float).tiny)
+    n_components = result['unmixing'].shape[0]
+    comp = {
+        'label': [f'fastica{index:03d}' for index in range(1, n_components + 1)],
+        'topolabel': list(data['label']),
+        'unmixing': result['unmixing'],
+        'topo': result['topo'],
+        'fsample': data.get('fsample', 0.0),
+        'iterations': result['iterations'],
+        'seconds': seconds,
+        'rank': result['whitening']['rank'],
+        'variance_retained': result['whitening']['variance_retained'],
+        'speedup': speedup,
+        'warm_started': result['warm_started'],
+        'drift': result['drift'],
+    }
+    if with_activations:
+        comp.update(component_activations(data, comp['unmixing']))
+    return comp
+
+
+# Study-level runs -------------------------------------------------------
+
+def ica_cache_path(folder: str, subject: str) -> str:
+    """Per-recording unmixing cache shared with applyICA.m (unmixing, topolabel)"""
+    return os.path.join(folder, ICA_CACHE_DIRNAME, f'{subject}.mat')
+
+
+def load_cached_unmixing(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        cached = scipy.io.loadmat(path, variable_names=['unmixing', 'topolabel'], squeeze_me=True)
+        return {'unmixing': np.atleast_2d(cached['unmixing']),
+                'topolabel': [str(label) for label in np.atleast_1d(cached['topolabel'])]}
+    except (KeyError, ValueError, OSError):
+        return None
+
+
+def save_cached_unmixing(path: str, comp: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    topolabel = np.empty((len(comp['topolabel']), 1), dtype=object)
+    topolabel[:, 0] = comp['topolabel']
+    scipy.io.savemat(path, {'unmixing': comp['unmixing'], 'topolabel': topolabel})
+
+
+def _ica_worker(store_path: str, subject: str, options: ICAOptions) -> Dict[str, Any]:
+    with SubjectStore(store_path) as store:
+        data = store.read_subject(subject, 'data')
+    previous = None
+    if options.warm_start:
+        previous = load_cached_unmixing(ica_cache_path(os.path.dirname(store_path), subject))
+    return component_analysis(data, options, previous=previous)
+
+
+def _weights_struct_array(comps: List[Dict[str, Any]]) -> np.ndarray:
+    """1 x N ica_weights struct array (see ica_weights_only.m) for scipy.io.savemat"""
+    fields = ['unmixing', 'topo', 'topolabel', 'label']
+    out = np.empty((1, len(comps)), dtype=[(name, object) for name in fields])
+    for position, comp in enumerate(comps):
+        labels = {}
+        for name in ('topolabel', 'label'):
+            labels[name] = np.empty((len(comp[name]), 1), dtype=object)
+            labels[name][:, 0] = comp[name]
+        out[0, position] = (comp['unmixing'], comp['topo'], labels['topolabel'], labels['label'])
+    return out
+
+
+def run_ica_folder(folder: str, options: Optional[ICAOptions] = None,
+                   max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Decompose every subject's 'data' stage in subjects.h5 and write 'data_ICApplied'
+
+    The store gets the weights (plus activations unless the data_ICApplied
+    format is 'unmixing'); data_ICApplied.mat gets the ``ica_weights``
+    variable browse_ICA.m expands against data.mat. With ``warm_start`` the
+    unmixing is also cached in ``ica_cache/<subject>.mat`` for the next run.
+    """
+    options = options or ICAOptions()
+    store_path = os.path.join(folder, STORE_FILENAME)
+    with SubjectStore(store_path) as store:
+        subjects = store.subjects('data')
+    if not subjects:
+        raise FileNotFoundError(f"No preprocessed subjects (stage 'data') in {store_path}")
+
+    workers = max_workers or min(len(subjects), os.cpu_count() or 1)
+    # Spawned workers: the pool is started from the GUI, and forking a threaded Qt process is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        comps = list(pool.map(_ica_worker, [store_path] * len(subjects), subjects, [options] * len(subjects)))
+
+    weights_only = stage_format('data_ICApplied') == 'unmixing'
+    compression = stage_format('store')
+    with SubjectStore(store_path, 'a') as store:
+        for subject, comp in zip(subjects, comps):
+            entry = {name: comp[name] for name in ('label', 'topolabel', 'unmixing', 'topo', 'fsample')}
+            if not weights_only:
+                data = store.read_subject(subject, 'data')
+                entry.update(component_activations(data, comp['unmixing']))
+            store.write_subject(subject, 'data_ICApplied', entry, compression=compression)
+            if options.warm_start:
+                # Like applyICA.m, which only gets cache files when ica_warm_start is set
+                save_cached_unmixing(ica_cache_path(folder, subject), comp)
+    scipy.io.savemat(os.path.join(folder, ICA_MAT_FILENAME), {'ica_weights': _weights_struct_array(comps)},
+                     do_compression=True)
+    return {
+        'subjects': subjects,
+        'components': [len(comp['label']) for comp in comps],
+        'iterations': [comp['iterations'] for comp in comps],
+        'seconds': [comp['seconds'] for comp in comps],
+        'rank': [comp['rank'] for comp in comps],
+        'variance_retained': [comp['variance_retained'] for comp in comps],
+        'speedup': [comp['speedup'] for comp in comps],
+        'warm_started': [comp['warm_started'] for comp in comps],
+    }
+
+
+def format_ica_summary(summary: Dict[str, Any]) -> str:
+    """One line per subject: components out of rank, variance retained, iterations, time, speedup"""
+    lines = []
+    for index, subject in enumerate(summary['subjects']):
+        line = (f"{subject}: {summary['components'][index]}/{summary['rank'][index]} components "
+                f"({summary['variance_retained'][index]:.2%} variance), "
+                f"{summary['iterations'][index]} iterations, {summary['seconds'][index]:.1f} s")
+        if summary['speedup'][index] is not None:
+            line += f", {summary['speedup'][index]:.1f}x faster than full rank"
+        if summary['warm_started'][index]:
+            line += ", warm-started"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="FastICA on every subject of a folder's subjects.h5")
+    parser.add_argument('data_dir', help="Folder containing subjects.h5 with the 'data' stage")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--algorithm', choices=ALGORITHMS, default='symmetric')
+    parser.add_argument('--fun', choices=CONTRASTS, default='logcosh')
+    parser.add_argument('--max-iter', type=int, default=1000)
+    parser.add_argument('--tol', type=float, default=1e-4)
+    parser.add_argument('--components', type=int, default=None, help="PCA-reduce to this many components")
+    parser.add_argument('--variance', type=float, default=None, help="PCA-reduce to keep this fraction of variance")
+    parser.add_argument('--compare-full', action='store_true', help="Also time the full-rank run to report speedup")
+    parser.add_argument('--warm-start', action='store_true', help="Start from ica_cache/<subject>.mat when still valid")
+    args = parser.parse_args()
+    options = ICAOptions(args.algorithm, args.fun, args.max_iter, args.tol, n_components=args.components,
+                         variance=args.variance, compare_full=args.compare_full, warm_start=args.warm_start)
+    print(format_ica_summary(run_ica_folder(args.data_dir, options, args.workers)))
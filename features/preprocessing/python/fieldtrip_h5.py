@@ -0,0 +1,245 @@
+"""Lazy access to FieldTrip structures saved in MATLAB v7.3 (.mat/HDF5) files.
+
+Struct arrays, nested structs and cell arrays such as ``trial``/``time`` are
+wrapped in proxies that follow HDF5 object references only when indexed, so
+reading one subject's trials never touches the other subjects. Numeric
+datasets come back in MATLAB orientation as:
+
+* a read-only ``np.memmap`` of the file when the dataset is stored
+  contiguously without filters (true zero-copy), or
+* a ``read_direct`` into a preallocated buffer otherwise; ``CellProxy.arrays``
+  can reuse one buffer across equally shaped cells.
+
+MATLAB saves large variables compressed, so most trial matrices take the
+second path; either way only the bytes of the requested cells are read.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from features.preprocessing.python.eeglab_io import is_hdf5_mat
+
+
+def _matlab_class(node) -> str:
+    value = node.attrs.get('MATLAB_class', b'')
+    return value.decode('ascii', 'ignore') if isinstance(value, bytes) else str(value)
+
+
+def _is_reference_dataset(node) -> bool:
+    import h5py
+    return isinstance(node, h5py.Dataset) and node.dtype == h5py.ref_dtype
+
+
+def read_array(dataset, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return a numeric dataset in MATLAB orientation, memory-mapped when possible
+
+    ``out`` (shaped like the HDF5 dataset, C-contiguous) is filled with
+    ``read_direct`` and returned transposed, letting callers reuse a buffer.
+    """
+    if out is None and dataset.chunks is None and dataset.size and dataset.dtype.kind in 'fiub':
+        offset = dataset.id.get_offset()
+        if offset is not None:
+            mapped = np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r',
+                               offset=offset, shape=dataset.shape)
+            return mapped.T
+    if out is None:
+        out = np.empty(dataset.shape, dtype=dataset.dtype)
+    elif out.shape != dataset.shape or not out.flags['C_CONTIGUOUS']:
+        raise ValueError(f"Buffer of shape {out.shape} cannot receive dataset of shape {dataset.shape}")
+    if dataset.size:
+        dataset.read_direct(out)
+    return out.T
+
+
+def resolve(h5_file, node) -> Any:
+    """Wrap an HDF5 node as the matching lazy proxy or MATLAB value"""
+    import h5py
+    if isinstance(node, h5py.Group):
+        return StructProxy(h5_file, node)
+    matlab_class = _matlab_class(node)
+    if node.attrs.get('MATLAB_empty', 0):
+        return '' if matlab_class == 'char' else np.zeros((0, 0))
+    if matlab_class == 'cell' or _is_reference_dataset(node):
+        return CellProxy(h5_file, node)
+    if matlab_class == 'char':
+        return ''.join(chr(code) for code in node[()].ravel())
+    if matlab_class == 'logical':
+        return node[()].T.astype(bool)
+    return read_array(node)
+
+
+class CellProxy:
+    """MATLAB cell array whose elements are resolved through their references on access"""
+
+    def __init__(self, h5_file, dataset):
+        self._file = h5_file
+        self._dataset = dataset
+        self._refs = None
+
+    @property
+    def shape(self):
+        return tuple(self._dataset.shape[::-1])
+
+    def __len__(self):
+        return int(self._dataset.size)
+
+    def _ref(self, index: int):
+        if self._refs is None:
+            # HDF5 C order over the reversed dims is MATLAB's column-major linear order
+            self._refs = self._dataset[()].ravel()
+        return self._refs[index]
+
+    def node(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Cell index {index} out of range for {len(self)} elements")
+        return self._file[self._ref(index)]
+
+    def __getitem__(self, index: int) -> Any:
+        return resolve(self._file, self.node(index))
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def arrays(self, reuse_buffer: bool = False) -> Iterator[np.ndarray]:
+        """Yield numeric cells (e.g. trials) one by one
+
+        With ``reuse_buffer`` every cell is read into the same buffer while the
+        shape stays the same, so the yielded array is only valid until the next
+        iteration; copy it to keep it.
+        """
+        buffer = None
+        for index in range(len(self)):
+            node = self.node(index)
+            if not reuse_buffer:
+                yield read_array(node)
+                continue
+            if buffer is None or buffer.shape != node.shape or buffer.dtype != node.dtype:
+                buffer = np.empty(node.shape, dtype=node.dtype)
+            yield read_array(node, out=buffer)
+
+    def __repr__(self):
+        return f"<CellProxy {'x'.join(map(str, self.shape))}>"
+
+
+class StructProxy:
+    """MATLAB struct (array) whose fields are read only when accessed
+
+    For a struct array, ``proxy[i]`` selects one element and ``proxy[i]['trial']``
+    resolves that element's field without reading the other elements.
+    """
+
+    def __init__(self, h5_file, group, index: Optional[int] = None):
+        self._file = h5_file
+        self._group = group
+        self._index = index
+
+    @property
+    def fields(self) -> List[str]:
+        names = self._group.attrs.get('MATLAB_fields')
+        if names is None:
+            return [name for name in self._group.keys() if not name.startswith('#')]
+        return [b''.join(np.asarray(name).ravel()).decode('ascii', 'ignore') for name in names]
+
+    def keys(self) -> List[str]:
+        return self.fields
+
+    @property
+    def _array_field(self):
+        """A field dataset holding one reference per element, present only for struct arrays"""
+        for name in self._group.keys():
+            node = self._group[name]
+            if _is_reference_dataset(node) and not _matlab_class(node):
+                return node
+        return None
+
+    @property
+    def shape(self):
+        if self._index is not None:
+            return (1, 1)
+        field = self._array_field
+        return tuple(field.shape[::-1]) if field is not None else (1, 1)
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._group
+
+    def __iter__(self) -> Iterator["StructProxy"]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def _field_node(self, name: str, index: int):
+        node = self._group[name]
+        if _is_reference_dataset(node) and not _matlab_class(node):
+            return self._file[node[np.unravel_index(index, node.shape)]]
+        return node
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._group:
+                raise KeyError(f"Struct has no field '{key}'")
+            if self._index is None and len(self) > 1:
+                return [resolve(self._file, self._field_node(key, index)) for index in range(len(self))]
+            return resolve(self._file, self._field_node(key, self._index or 0))
+        index = int(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Struct index {index} out of range for {len(self)} elements")
+        return StructProxy(self._file, self._group, index)
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self._group else default
+
+    def __repr__(self):
+        return f"<StructProxy {'x'.join(map(str, self.shape))} fields={self.fields}>"
+
+
+class FieldTripMatFile:
+    """Open v7.3 .mat file exposing each variable as a lazy proxy"""
+
+    def __init__(self, path: str):
+        import h5py
+        self.path = path
+        self._file = h5py.File(path, 'r')
+
+    def keys(self) -> List[str]:
+        return [name for name in self._file.keys() if not name.startswith('#')]
+
+    def __getitem__(self, name: str) -> Any:
+        return resolve(self._file, self._file[name])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._file
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_fieldtrip_mat(path: str) -> FieldTripMatFile:
+    """Open a MATLAB v7.3 file for lazy FieldTrip access (v5 files are not HDF5 and raise)"""
+    if not is_hdf5_mat(path):
+        raise ValueError(f"{path} is not a MATLAB v7.3 file; save it with -v7.3 for lazy access")
+    return FieldTripMatFile(path)
+
+
+def trial_summary(subject: StructProxy) -> Dict[str, Any]:
+    """Labels, sampling rate and trial shapes of one FieldTrip raw structure without reading trials"""
+    trials = subject['trial']
+    return {
+        'label': list(subject['label']) if 'label' in subject else [],
+        'fsample': float(np.ravel(subject['fsample'])[0]) if 'fsample' in subject else None,
+        'trials': len(trials),
+        'shapes': [tuple(trials.node(index).shape[::-1]) for index in range(len(trials))],
+    }
@@ -1,22 +1,37 @@
 import os
-from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot, pyqtProperty, QStandardPaths
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot, pyqtProperty, QStandardPaths, QFileSystemWatcher, QTimer
+
+from features.preprocessing.python.dataset_index import DatasetIndex
+from features.preprocessing.python.dataset_registry import LazyMat, get_registry
+from features.preprocessing.python.eeglab_io import EEGLABRecording
+from features.preprocessing.python.file_list_model import (
+    FileListModel,
+    scan_folder,
+)
 
 
 class FileBrowser(QObject):
     """Class to handle file browser functionality"""
     
     # Signals for drive files (upper pane)
-    folderContentsChanged = pyqtSignal(list)
     currentFolderChanged = pyqtSignal(str)
     
-    # Signals for RAM files (lower pane)
-    ramContentsChanged = pyqtSignal(list)
-    
     def __init__(self):
         super().__init__()
         self._current_folder = ""
-        self._folder_contents = []
-        self._ram_contents = []
+        # Row model for the explorer views; sorting and filtering happen inside it
+        self._folder_model = FileListModel(parent=self)
+        # Watch the current folder (and its .mat outputs) and apply row diffs on change
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._onFolderChanged)
+        self._watcher.fileChanged.connect(self._onFolderChanged)
+        self._watch_debounce = QTimer(self)
+        self._watch_debounce.setSingleShot(True)
+        self._watch_debounce.setInterval(250)  # Coalesce bursts of events while MATLAB writes
+        self._watch_debounce.timeout.connect(self._applyFolderChanges)
+        # In-memory datasets live in the process-wide registry shared with the analysis engines
+        self._registry = get_registry()
     
     @pyqtProperty(str, notify=currentFolderChanged)
     def currentFolder(self):
@@ -28,15 +43,16 @@ class FileBrowser(QObject):
             self._current_folder = value
             self.currentFolderChanged.emit(value)
     
-    @pyqtProperty(list, notify=folderContentsChanged)
-    def folderContents(self):
-        return self._folder_contents
+    @pyqtProperty(QObject, constant=True)
+    def folderModel(self):
+        return self._folder_model
     
-    @folderContents.setter
-    def folderContents(self, value):
-        if self._folder_contents != value:
-            self._folder_contents = value
-            self.folderContentsChanged.emit(value)
+    @pyqtSlot(str, result=bool)
+    def containsFile(self, filename):
+        """Whether the current folder listing has a file of this name (case-insensitive)"""
+        filename = filename.lower()
+        return any(entry.type == "file" and entry.name.lower() == filename
+                   for entry in self._folder_model.entries())
     
     @pyqtSlot(str)
     def initializeWithPath(self, initial_path):
@@ -48,14 +64,14 @@ class FileBrowser(QObject):
     def clearFolder(self):
         """Clear the current folder selection"""
         self.currentFolder = ""  # Use property setter
-        self._folder_contents = []
-        self.folderContentsChanged.emit([])
+        self._folder_model.clear()
+        self._watch_paths([])
     
     @pyqtSlot()
     def refreshCurrentFolder(self):
-        """Refresh the contents of the current folder"""
+        """Refresh the contents of the current folder, touching only changed rows"""
         if self._current_folder:
-            self.loadFolder(self._current_folder)
+            self._applyFolderChanges()
     
     @pyqtSlot(str)
     def loadFolder(self, folder_path):
@@ -72,20 +88,114 @@ class FileBrowser(QObject):
             
             self.currentFolder = folder_path  # Use property setter
             
-            contents = []
-            for item in os.listdir(folder_path):
-                item_path = os.path.join(folder_path, item)
-                if os.path.isdir(item_path):
-                    contents.append(f"📁 {item}")
-                else:
-                    contents.append(f"📄 {item}")
-            
-            self._folder_contents = contents
-            self.folderContentsChanged.emit(contents)
+            entries = scan_folder(folder_path)
+            self._folder_model.setEntries(entries)
+            self._watch_paths([folder_path] + self._mat_paths(entries))
             
         except Exception as e:
             print(f"Error reading folder: {e}")
-            self.folderContentsChanged.emit([f"Error: {str(e)}"])
+            self._folder_model.clear()
+            self._watch_paths([])
+    
+    def _mat_paths(self, entries):
+        # Output files are rewritten in place, which only fires file (not directory) notifications
+        return [entry.path for entry in entries if entry.type == "file" and entry.name.lower().endswith('.mat')]
+    
+    def _watch_paths(self, paths):
+        """Point the watcher at exactly the given paths"""
+        wanted = set(paths)
+        current = set(self._watcher.directories()) | set(self._watcher.files())
+        stale = list(current - wanted)
+        fresh = [path for path in wanted - current if os.path.exists(path)]
+        if stale:
+            self._watcher.removePaths(stale)
+        if fresh:
+            self._watcher.addPaths(fresh)
+    
+    def _onFolderChanged(self, path):
+        self._watch_debounce.start()
+    
+    def _applyFolderChanges(self):
+        """Rescan the current folder and push only inserted/removed/updated rows to the model"""
+        if not self._current_folder:
+            return
+        try:
+            entries = scan_folder(self._current_folder)
+        except Exception as e:
+            print(f"Error reading folder: {e}")
+            return
+        
+        self._folder_model.applyEntries(entries)
+        self._watch_paths([self._current_folder] + self._mat_paths(entries))
+    
+    def _open_index(self):
+        """Open the current folder's header index, refreshed for files changed since the last query
+
+        Indexing runs here, when a view asks for it, rather than on every browse.
+        """
+        index = DatasetIndex(self._current_folder)
+        try:
+            index.update()
+            for record in index.query():
+                self._folder_model.setMetadata(record['path'], record)
+        except Exception:
+            index.close()
+            raise
+        return index
+    
+    @pyqtSlot(int, float, result=list)
+    def findRecordings(self, nbchan, srate):
+        """Return the .set files in the current folder with the given channel count and sample rate
+        
+        Pass 0 for either value to ignore that constraint.
+        """
+        if not self._current_folder:
+            return []
+        try:
+            index = self._open_index()
+            try:
+                records = index.query(
+                    nbchan=nbchan or None,
+                    srate=srate or None,
+                    kind='set',
+                )
+            finally:
+                index.close()
+            return [record['path'] for record in records]
+        except Exception as e:
+            print(f"Error querying dataset index: {e}")
+            return []
+    
+    @pyqtSlot(str, list, result='QVariant')
+    def previewTrialCounts(self, eventtype, eventvalues):
+        """Count matching events per recording in the current folder from the event index
+        
+        Returns {'recordings': [{'name', 'counts', 'total'}], 'missing': [values found nowhere]}
+        """
+        preview = {'recordings': [], 'missing': []}
+        if not self._current_folder or not eventtype:
+            return preview
+        try:
+            index = self._open_index()
+            try:
+                counts = index.event_counts(eventtype, eventvalues)
+            finally:
+                index.close()
+        except Exception as e:
+            print(f"Error reading event index: {e}")
+            return preview
+        
+        for path, per_value in counts.items():
+            preview['recordings'].append({
+                'name': os.path.relpath(path, self._current_folder),
+                'counts': per_value,
+                'total': sum(per_value.values()),
+            })
+        preview['missing'] = [
+            value for value in eventvalues
+            if counts and not any(per_value.get(value) for per_value in counts.values())
+        ]
+        return preview
     
     @pyqtSlot(result=str)
     def getCurrentFolder(self):
@@ -94,24 +204,50 @@ class FileBrowser(QObject):
     
     @pyqtSlot(list)
     def updateRamContents(self, filenames):
-        """Update RAM contents (lower pane) with processed filenames"""
-        try:
-            ram_contents = []
-            for filename in filenames:
-                ram_contents.append(f"🧠 {filename}")  # Brain emoji for RAM files
-            
-            self._ram_contents = ram_contents
-            self.ramContentsChanged.emit(ram_contents)
-            
-        except Exception as e:
-            print(f"Error updating RAM contents: {e}")
-            self.ramContentsChanged.emit([f"Error: {str(e)}"])
+        """Load processed files into the in-memory dataset registry
+        
+        Relative names are resolved against the current folder. Loading runs in a
+        background thread; the analysis engines pick the datasets up from the registry.
+        """
+        paths = []
+        for filename in filenames:
+            path = filename if os.path.isabs(filename) else os.path.join(self._current_folder, filename)
+            if os.path.isfile(path):
+                paths.append(path)
+            else:
+                print(f"Skipping RAM load, file not found: {path}")
+        
+        def load_all():
+            for path in paths:
+                # .set recordings stay on disk behind a memmap; .mat variables are read on first use
+                loader = EEGLABRecording if path.lower().endswith('.set') else LazyMat
+                try:
+                    self._registry.get_or_load(path, loader=loader)
+                except Exception as e:
+                    print(f"Error loading {path} into RAM: {e}")
+        
+        loader_thread = threading.Thread(target=load_all)
+        loader_thread.daemon = True
+        loader_thread.start()
     
     @pyqtSlot()
     def clearRamContents(self):
-        """Clear RAM contents"""
-        self._ram_contents = []
-        self.ramContentsChanged.emit([])
+        """Release every dataset held in RAM"""
+        self._registry.clear()
+    
+    @pyqtSlot(str, result=bool)
+    def releaseRamDataset(self, handle):
+        """Drop one dataset from RAM by its handle"""
+        return self._registry.release(handle)
+    
+    @pyqtSlot(int)
+    def setRamBudget(self, megabytes):
+        """Set the resident memory budget; least recently used datasets are evicted beyond it"""
+        self._registry.set_budget(megabytes * 1024 * 1024)
+    
+    @pyqtSlot(result=float)
+    def getRamUsageMB(self):
+        return self._registry.resident_bytes / (1024 * 1024)
     
     @pyqtSlot(result=str)
     def getDesktopPath(self):
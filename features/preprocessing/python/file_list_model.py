@@ -0,0 +1,283 @@
+import fnmatch
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt, pyqtSlot
+
+
+@dataclass
+class FileEntry:
+    """Lightweight row record for the explorer list models"""
+    name: str
+    path: str
+    type: str  # "folder" or "file"
+    size: int = 0
+    mtime: float = 0.0
+    metadata: Dict = field(default_factory=dict)
+
+    @property
+    def display(self) -> str:
+        # Keep the emoji-prefixed text the QML delegates already parse
+        if self.type == "folder":
+            return f"📁 {self.name}"
+        return f"📄 {self.name}"
+
+    @property
+    def sort_key(self) -> str:
+        # Folders first, then case-insensitive name
+        return ("0" if self.type == "folder" else "1") + self.name.lower()
+
+
+def scan_folder(folder_path: str) -> List[FileEntry]:
+    """List a folder with a single scandir pass (no per-entry listdir/isdir round trips)"""
+    entries = []
+    with os.scandir(os.path.abspath(folder_path)) as iterator:
+        for item in iterator:
+            try:
+                is_dir = item.is_dir()
+                stat = item.stat()
+                size = 0 if is_dir else stat.st_size
+                mtime = stat.st_mtime
+            except OSError:
+                is_dir, size, mtime = False, 0, 0.0
+            entries.append(FileEntry(
+                name=item.name,
+                path=item.path,
+                type="folder" if is_dir else "file",
+                size=size,
+                mtime=mtime,
+            ))
+    entries.sort(key=lambda entry: entry.sort_key)
+    return entries
+
+
+# Sort keys for setSortKey; ties fall back to the folders-first name order
+SORT_KEYS: Dict[str, Callable[[FileEntry], tuple]] = {
+    "name": lambda entry: (entry.sort_key, entry.path),
+    "type": lambda entry: (entry.type, entry.sort_key, entry.path),
+    "size": lambda entry: (entry.size, entry.sort_key, entry.path),
+    "mtime": lambda entry: (entry.mtime, entry.sort_key, entry.path),
+}
+
+
+class FileListModel(QAbstractListModel):
+    """Incrementally fetched, sorted and filtered list model backing the explorer panes
+
+    The full listing is held in Python and sorted/filtered there, over every
+    entry; only the first ``batch_size`` rows of the result are exposed to the
+    view at a time, and QML pulls more through canFetchMore/fetchMore as the
+    user scrolls, so very large folders never materialize every delegate.
+    """
+
+    NameRole = Qt.ItemDataRole.UserRole + 1
+    TypeRole = Qt.ItemDataRole.UserRole + 2
+    SizeRole = Qt.ItemDataRole.UserRole + 3
+    ModifiedRole = Qt.ItemDataRole.UserRole + 4
+    PathRole = Qt.ItemDataRole.UserRole + 5
+    MetadataRole = Qt.ItemDataRole.UserRole + 6
+    SortKeyRole = Qt.ItemDataRole.UserRole + 7
+
+    def __init__(self, batch_size: int = 256, parent=None):
+        super().__init__(parent)
+        self._all: List[FileEntry] = []  # Every entry of the listing
+        self._entries: List[FileEntry] = []  # Sorted and filtered rows; the first _loaded are exposed
+        self._loaded = 0
+        self._batch_size = batch_size
+        self._by_path: Dict[str, FileEntry] = {}
+        self._row_by_path: Dict[str, int] = {}
+        self._sort_key = SORT_KEYS["name"]
+        self._descending = False
+        self._name_filter = ""
+
+    # Qt model interface -------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded < len(self._entries)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        remaining = len(self._entries) - self._loaded
+        count = min(self._batch_size, remaining)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self._loaded:
+            return None
+        entry = self._entries[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return entry.display
+        if role == self.NameRole:
+            return entry.name
+        if role == self.TypeRole:
+            return entry.type
+        if role == self.SizeRole:
+            return entry.size
+        if role == self.ModifiedRole:
+            return entry.mtime
+        if role == self.PathRole:
+            return entry.path
+        if role == self.MetadataRole:
+            return entry.metadata
+        if role == self.SortKeyRole:
+            return entry.sort_key
+        return None
+
+    def roleNames(self):
+        return {
+            Qt.ItemDataRole.DisplayRole: b"display",
+            self.NameRole: b"name",
+            self.TypeRole: b"type",
+            self.SizeRole: b"size",
+            self.ModifiedRole: b"mtime",
+            self.PathRole: b"path",
+            self.MetadataRole: b"eegMetadata",
+            self.SortKeyRole: b"sortKey",
+        }
+
+    # Sorting and filtering ----------------------------------------------
+
+    @pyqtSlot(str)
+    def setNameFilter(self, pattern):
+        """Filter rows by a case-insensitive substring or wildcard (e.g. '*.mat')"""
+        pattern = (pattern or "").lower()
+        if pattern != self._name_filter:
+            self._name_filter = pattern
+            self._rearrange()
+
+    @pyqtSlot(str, bool)
+    def setSortKey(self, key, descending=False):
+        """Sort by 'name', 'type', 'size' or 'mtime'"""
+        self._sort_key = SORT_KEYS.get(key, SORT_KEYS["name"])
+        self._descending = bool(descending)
+        self._rearrange()
+
+    def _accepts(self, entry: FileEntry) -> bool:
+        if not self._name_filter:
+            return True
+        name = entry.name.lower()
+        if "*" in self._name_filter or "?" in self._name_filter:
+            return fnmatch.fnmatchcase(name, self._name_filter)
+        return self._name_filter in name
+
+    def _arrange(self, entries: List[FileEntry]) -> List[FileEntry]:
+        """The rows to show for ``entries``: filtered, then sorted as a whole"""
+        return sorted((entry for entry in entries if self._accepts(entry)),
+                      key=self._sort_key, reverse=self._descending)
+
+    def _rearrange(self):
+        """Re-sort/re-filter the full listing and page the result from the top"""
+        self.beginResetModel()
+        self._entries = self._arrange(self._all)
+        self._loaded = min(self._batch_size, len(self._entries))
+        self._row_by_path = {entry.path: row for row, entry in enumerate(self._entries)}
+        self.endResetModel()
+
+    # Python-side helpers ------------------------------------------------
+
+    def setEntries(self, entries: List[FileEntry]):
+        """Replace all rows; only the first batch is exposed until the view asks for more"""
+        self._all = list(entries)
+        self._by_path = {entry.path: entry for entry in self._all}
+        self._rearrange()
+
+    def clear(self):
+        self.setEntries([])
+
+    def applyEntries(self, entries: List[FileEntry]) -> Dict[str, int]:
+        """Move to a new listing with row-level remove/insert/update notifications
+
+        Unlike setEntries this keeps the view's scroll position, delegates and
+        attached metadata for rows that did not change.
+        """
+        removed = inserted = updated = 0
+        listing = []
+        moved = set()  # Paths whose sort position may have changed
+        for fresh in entries:
+            entry = self._by_path.get(fresh.path)
+            if entry is None:
+                listing.append(fresh)
+                continue
+            if (fresh.size, fresh.mtime, fresh.type) != (entry.size, entry.mtime, entry.type):
+                before = self._sort_key(entry)
+                entry.size, entry.mtime, entry.type = fresh.size, fresh.mtime, fresh.type
+                updated += 1
+                if self._sort_key(entry) != before:
+                    moved.add(entry.path)
+                elif entry.path in self._row_by_path and self._row_by_path[entry.path] < self._loaded:
+                    model_index = self.index(self._row_by_path[entry.path], 0)
+                    self.dataChanged.emit(model_index, model_index)
+            listing.append(entry)
+        listed = {entry.path for entry in listing}
+        removed = len(set(self._by_path) - listed)
+        inserted = len(listed - set(self._by_path))
+        self._all = listing
+        self._by_path = {entry.path: entry for entry in listing}
+
+        # Drop rows that left the listing or changed position, bottom up
+        for row in range(len(self._entries) - 1, -1, -1):
+            path = self._entries[row].path
+            if path in listed and path not in moved:
+                continue
+            if row < self._loaded:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._entries[row]
+                self._loaded -= 1
+                self.endRemoveRows()
+            else:
+                del self._entries[row]
+
+        # The surviving rows are an ordered subsequence of the new arrangement, so
+        # walking it top down inserts every missing row at its final position
+        for row, entry in enumerate(self._arrange(listing)):
+            if row < len(self._entries) and self._entries[row] is entry:
+                continue
+            if row < self._loaded or (row == self._loaded and self._loaded < self._batch_size):
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._entries.insert(row, entry)
+                self._loaded += 1
+                self.endInsertRows()
+            else:
+                self._entries.insert(row, entry)
+
+        self._row_by_path = {entry.path: row for row, entry in enumerate(self._entries)}
+        return {'removed': removed, 'inserted': inserted, 'updated': updated}
+
+    def entries(self) -> List[FileEntry]:
+        """Every entry of the listing, regardless of the current filter"""
+        return self._all
+
+    def entryForPath(self, path: str) -> Optional[FileEntry]:
+        return self._by_path.get(path)
+
+    def setMetadata(self, path: str, metadata: Dict) -> bool:
+        """Attach EEG header metadata to an entry and notify the view if its row is loaded"""
+        entry = self._by_path.get(path)
+        if entry is None:
+            return False
+        metadata = dict(metadata or {})
+        if entry.metadata == metadata:
+            return True
+        entry.metadata = metadata
+        row = self._row_by_path.get(path)
+        if row is not None and row < self._loaded:
+            model_index = self.index(row, 0)
+            self.dataChanged.emit(model_index, model_index, [self.MetadataRole])
+        return True
+
+    @pyqtSlot(result=int)
+    def totalCount(self):
+        """Rows after filtering, loaded or not"""
+        return len(self._entries)
@@ -0,0 +1,90 @@
+"""Metadata-only inspection of MATLAB .mat files.
+
+Lists variable names, MATLAB classes and shapes without reading any payload:
+``scipy.io.whosmat`` walks the v5/v7 variable headers, and v7.3 files are
+inspected through HDF5 object metadata. Results are cached per path and
+invalidated when the file's mtime or size changes.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import scipy.io
+
+from features.preprocessing.python.eeglab_io import is_hdf5_mat
+
+
+@dataclass(frozen=True)
+class MatVariable:
+    name: str
+    matlab_class: str
+    shape: Tuple[int, ...]
+
+    def as_dict(self) -> Dict:
+        return {'name': self.name, 'class': self.matlab_class, 'shape': list(self.shape)}
+
+
+_cache: Dict[str, Tuple[Tuple[float, int], List[MatVariable]]] = {}
+_cache_lock = threading.Lock()
+
+
+def _attr_string(node, name: str) -> str:
+    value = node.attrs.get(name, b'')
+    if isinstance(value, bytes):
+        return value.decode('ascii', 'ignore')
+    return str(value) if value is not None else ''
+
+
+def _h5_variable(name: str, node) -> MatVariable:
+    import h5py
+    matlab_class = _attr_string(node, 'MATLAB_class')
+    if isinstance(node, h5py.Group):
+        # Struct arrays keep one reference dataset per field, shaped like the array; a
+        # field that is itself a cell also stores references but carries its own MATLAB_class
+        shape = (1, 1)
+        for child in node.values():
+            if isinstance(child, h5py.Dataset) and child.dtype.kind == 'O' and 'MATLAB_class' not in child.attrs:
+                shape = tuple(child.shape[::-1])
+                break
+        return MatVariable(name, matlab_class or 'struct', shape)
+    if 'MATLAB_empty' in node.attrs and node.attrs['MATLAB_empty']:
+        return MatVariable(name, matlab_class, (0, 0))
+    # HDF5 stores MATLAB's column-major dims reversed
+    return MatVariable(name, matlab_class or str(node.dtype), tuple(node.shape[::-1]))
+
+
+def _inspect_uncached(path: str) -> List[MatVariable]:
+    if is_hdf5_mat(path):
+        import h5py
+        with h5py.File(path, 'r') as h5_file:
+            return [
+                _h5_variable(name, node)
+                for name, node in h5_file.items()
+                if not name.startswith('#')
+            ]
+    return [
+        MatVariable(name, matlab_class, tuple(shape))
+        for name, shape, matlab_class in scipy.io.whosmat(path)
+    ]
+
+
+def inspect_mat(path: str) -> List[MatVariable]:
+    """Return the variables of a .mat file without loading their data"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+    variables = _inspect_uncached(path)
+    with _cache_lock:
+        _cache[path] = (signature, variables)
+    return variables
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
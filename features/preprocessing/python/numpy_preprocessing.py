@@ -0,0 +1,250 @@
+"""NumPy backend for preprocess_data.m (epoching, demean, DFT line-noise filter).
+
+Runs the same steps ft_preprocessing performs for the cfg in preprocess_data.m,
+on whole (trials, channels, samples) blocks instead of trial-by-trial loops,
+so preprocessing can run on machines without a MATLAB licence:
+
+* trials from ``cfg.trialdef`` as ft_trialfun_general defines them
+  (trial_definition.define_trials), cut from the .fdt memmap;
+* ``cfg.dftfilter``: FieldTrip's default 'zero' replacement, a least-squares
+  fit of complex exponentials at ``cfg.dftfreq`` over the whole line-noise
+  cycles at the start of the demeaned trial, subtracted from the whole trial
+  (ft_preproc_dftfilter);
+* ``cfg.demean`` with ``cfg.baselinewindow``: subtract the mean over the
+  samples nearest to the window edges (ft_preproc_baselinecorrect).
+
+FieldTrip applies the filter before the baseline correction and so does this
+module, with the same sample selections and arithmetic; trials that extend
+past the recording are dropped instead of raising.
+
+    python -m features.preprocessing.python.numpy_preprocessing <data_dir> --workers 8
+"""
+
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import scipy.io
+
+from features.preprocessing.python.eeglab_io import EEGLABRecording
+from features.preprocessing.python.subject_store import STORE_FILENAME, SubjectStore
+from features.preprocessing.python.storage_formats import mat_outputs_enabled, stage_format
+from features.preprocessing.python.trial_definition import TrialDefinition, define_trials, epoch_tensor, matlab_round
+
+DATA_MAT_FILENAME = 'data.mat'
+PREPROCESS_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'matlab', 'preprocess_data.m')
+
+
+@dataclass
+class PreprocessConfig:
+    """The ft_preprocessing options of preprocess_data.m that this backend implements"""
+    trialdef: TrialDefinition = field(default_factory=TrialDefinition)
+    channels: Optional[List[str]] = None  # None is cfg.channel = 'all'
+    demean: bool = True
+    baselinewindow: Optional[Sequence[float]] = (-0.2, 0.0)  # None is 'all'
+    dftfilter: bool = True
+    dftfreq: Sequence[float] = (50.0, 60.0)
+
+
+def _numbers(text: str) -> List[float]:
+    return [float(value) for value in re.split(r'[\s,]+', text.strip()) if value]
+
+
+def read_preprocess_config(script_path: str = PREPROCESS_SCRIPT) -> PreprocessConfig:
+    """Parse the cfg assignments of preprocess_data.m into a PreprocessConfig"""
+    config = PreprocessConfig()
+    with open(script_path, 'r', encoding='utf-8') as file:
+        # Drop comments so disabled settings are not picked up
+        content = '\n'.join(line.split('%', 1)[0] for line in file.read().splitlines())
+
+    trialdef = config.trialdef
+    match = re.search(r"cfg\.trialdef\.eventtype\s*=\s*'([^']*)'", content)
+    if match:
+        trialdef.eventtype = match.group(1)
+    match = re.search(r'cfg\.trialdef\.eventvalue\s*=\s*\{([^}]*)\}', content)
+    if match:
+        trialdef.eventvalue = re.findall(r"'([^']*)'", match.group(1))
+    for name in ('prestim', 'poststim'):
+        match = re.search(rf'cfg\.trialdef\.{name}\s*=\s*(-?[\d.]+)', content)
+        if match:
+            setattr(trialdef, name, float(match.group(1)))
+
+    for name in ('demean', 'dftfilter'):
+        match = re.search(rf"cfg\.{name}\s*=\s*'([^']*)'", content)
+        if match:
+            setattr(config, name, match.group(1).lower() == 'yes')
+    match = re.search(r'cfg\.baselinewindow\s*=\s*\[([^\]]*)\]', content)
+    if match:
+        config.baselinewindow = tuple(_numbers(match.group(1)))
+    elif re.search(r"cfg\.baselinewindow\s*=\s*'all'", content):
+        config.baselinewindow = None
+    match = re.search(r'cfg\.dftfreq\s*=\s*\[([^\]]*)\]', content)
+    if match:
+        config.dftfreq = tuple(_numbers(match.group(1)))
+    match = re.search(r'cfg\.channel\s*=\s*\{([^}]*)\}', content)
+    if match:
+        config.channels = re.findall(r"'([^']*)'", match.group(1))
+    return config
+
+
+# Block operations -------------------------------------------------------
+
+def nearest_index(time: np.ndarray, value: float) -> int:
+    """FieldTrip's nearest(): index of the closest sample, clipped to the axis"""
+    return int(np.argmin(np.abs(np.asarray(time) - value)))
+
+
+def baseline_correct(block: np.ndarray, time: np.ndarray, window: Optional[Sequence[float]] = None) -> np.ndarray:
+    """Subtract the per-trial, per-channel mean over the baseline window in place"""
+    if window is None:
+        begsample, endsample = 0, block.shape[-1] - 1
+    else:
+        begsample, endsample = nearest_index(time, window[0]), nearest_index(time, window[1])
+    block -= block[..., begsample:endsample + 1].mean(axis=-1, keepdims=True)
+    return block
+
+
+def dft_filter(block: np.ndarray, fsample: float, freqs: Sequence[float]) -> np.ndarray:
+    """Remove line noise at ``freqs`` in place, as ft_preproc_dftfilter with dftreplace='zero'
+
+    FieldTrip fits the complex exponentials only on the first
+    ``n = round(floor(nsamples*f/fs)*fs/f)`` samples, the largest whole number
+    of cycles, and subtracts the fitted sinusoids from the whole trial. When
+    the frequencies need different ``n`` it filters them one after another.
+    The pseudo-inverse depends only on the trial length, so it is computed
+    once per fit and applied to every trial and channel with one matmul.
+    """
+    freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+    if freqs.size == 0:
+        return block
+    nsamples = block.shape[-1]
+    nfit = matlab_round(np.floor(nsamples * freqs / fsample) * fsample / freqs).astype(int)
+    if np.any(nfit != nfit[0]):
+        for freq in freqs:
+            dft_filter(block, fsample, [freq])
+        return block
+    nfit = int(nfit[0])
+    if nfit == 0:
+        # Shorter than one cycle; FieldTrip's fit is all NaN here, so leave the trial as is
+        return block
+    time = np.arange(nsamples) / fsample
+    basis = np.exp(2j * np.pi * freqs[:, None] * time[None, :])
+    solve = np.linalg.pinv(basis[:, :nfit])  # (nfit, freqs)
+    fitted = block[..., :nfit]
+    mean = fitted.mean(axis=-1, keepdims=True)
+    # (dat - mean) @ solve without materialising the demeaned copy; the mean FieldTrip
+    # removes before the fit is added back afterwards, so it cancels from the result
+    ampl = 2 * (fitted @ solve - mean * solve.sum(axis=0))
+    block -= ampl.real @ basis.real - ampl.imag @ basis.imag
+    return block
+
+
+# Per-file pipeline ------------------------------------------------------
+
+def preprocess_file(set_path: str, config: PreprocessConfig) -> Dict[str, Any]:
+    """Epoch and clean one .set file; returns a FieldTrip-like dict with a 3-D ``trial`` block"""
+    with EEGLABRecording(set_path) as recording:
+        fsample = float(recording.srate)
+        trials = define_trials(recording.events, fsample, config.trialdef, n_samples=recording.n_samples)
+        trl = trials['trl'][trials['in_bounds']]
+        channel_idx = recording.channel_indices(config.channels)
+        if len(channel_idx) < recording.nbchan:
+            # One pass over the .fdt now; this and every later subset run reads only its channels
+            recording.build_channel_major_cache()
+        block = np.array(epoch_tensor(recording, trl, channel_idx), dtype=np.float64)
+        labels = [recording.labels[idx] for idx in channel_idx]
+
+    nsamples = block.shape[-1]
+    offset = trl[0, 2] if len(trl) else 0.0
+    time = (offset + np.arange(nsamples)) / fsample
+    if len(trl):
+        if config.dftfilter:
+            dft_filter(block, fsample, config.dftfreq)
+        if config.demean:
+            baseline_correct(block, time, config.baselinewindow)
+    return {
+        'label': labels,
+        'trial': block,
+        'time': time,
+        'fsample': fsample,
+        'trialinfo': trl[:, 3:4],
+        'sampleinfo': trl[:, :2],
+        'dropped': int(np.count_nonzero(~trials['in_bounds'])),
+    }
+
+
+def _fieldtrip_struct_array(subjects: List[Dict[str, Any]]) -> np.ndarray:
+    """1 x N struct array of FieldTrip raw structures for scipy.io.savemat"""
+    fields = ['label', 'trial', 'time', 'fsample', 'trialinfo', 'sampleinfo']
+    out = np.empty((1, len(subjects)), dtype=[(name, object) for name in fields])
+    for position, subject in enumerate(subjects):
+        ntrials = len(subject['trial'])
+        label = np.empty((len(subject['label']), 1), dtype=object)
+        label[:, 0] = subject['label']
+        trial = np.empty((1, ntrials), dtype=object)
+        time = np.empty((1, ntrials), dtype=object)
+        for index in range(ntrials):
+            trial[0, index] = subject['trial'][index]
+            time[0, index] = subject['time'][None, :]
+        out[0, position] = (label, trial, time, subject['fsample'],
+                            subject['trialinfo'], subject['sampleinfo'])
+    return out
+
+
+def preprocess_folder(folder: str, config: Optional[PreprocessConfig] = None,
+                      max_workers: Optional[int] = None, write_mat: Optional[bool] = None) -> Dict[str, Any]:
+    """Preprocess every .set in ``folder`` in a process pool and write the 'data' stage
+
+    Subjects go to subjects.h5 (stage 'data', the configured store
+    compression) and, when ``write_mat`` (default: the mat_outputs setting)
+    is true, to data.mat. scipy cannot write MAT v7.3, so data.mat is saved
+    as compressed v7.
+    """
+    if write_mat is None:
+        write_mat = mat_outputs_enabled()
+    config = config or read_preprocess_config()
+    files = sorted(name for name in os.listdir(folder) if name.lower().endswith('.set'))
+    if not files:
+        raise FileNotFoundError(f"No .set files found in {folder}")
+    paths = [os.path.join(folder, name) for name in files]
+
+    # Spawned workers: the pool is started from the GUI, and forking a threaded Qt process is unsafe
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        subjects = list(pool.map(preprocess_file, paths, [config] * len(paths)))
+
+    store_path = os.path.join(folder, STORE_FILENAME)
+    with SubjectStore(store_path, 'w') as store:
+        for name, subject in zip(files, subjects):
+            # Every trial shares the same time axis; the store keeps one per trial like FieldTrip
+            entry = dict(subject, time=[subject['time']] * len(subject['trial']))
+            store.write_subject(os.path.splitext(name)[0], 'data', entry, compression=stage_format('store'))
+    mat_path = os.path.join(folder, DATA_MAT_FILENAME) if write_mat else None
+    if mat_path:
+        scipy.io.savemat(mat_path, {'data': _fieldtrip_struct_array(subjects)},
+                         do_compression=True, long_field_names=True)
+    return {
+        'store': store_path,
+        'mat': mat_path,
+        'subjects': [os.path.splitext(name)[0] for name in files],
+        'trials': [len(subject['trial']) for subject in subjects],
+        'dropped': [subject['dropped'] for subject in subjects],
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Preprocess a folder of .set files without MATLAB")
+    parser.add_argument('data_dir', help="Folder containing the .set files")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--script', default=PREPROCESS_SCRIPT, help="preprocess_data.m to read the cfg from")
+    parser.add_argument('--no-mat', action='store_true', help="Only write subjects.h5")
+    args = parser.parse_args()
+    summary = preprocess_folder(args.data_dir, read_preprocess_config(args.script), args.workers,
+                                write_mat=not args.no_mat)
+    for subject, count, dropped in zip(summary['subjects'], summary['trials'], summary['dropped']):
+        print(f"{subject}: {count} trials ({dropped} outside the recording)")
@@ -0,0 +1,185 @@
+"""Per-stage output format configuration and a storage benchmark.
+
+``config/storage_formats.json`` selects how every pipeline stage is written:
+one of the MAT formats for data.mat / data_ICApplied.mat /
+data_ICApplied_clean.mat and a compression codec for the chunked subject
+store. MATLAB reads the same file through ``storage_format.m``.
+
+The subject store is the primary output. ``mat_outputs`` is a transition
+switch: while it is true (the default) the full .mat files are written as
+well; set to false, the store is the only full copy of each stage
+(``stage_mat_outputs.m`` is the MATLAB side).
+
+The benchmark writes one sample subject in each available format, then reads
+it back and reports write time, read time and size on the local disk::
+
+    python -m features.preprocessing.python.storage_formats <data_dir>
+
+MAT v5 formats are written with scipy (the same on-disk format as MATLAB's
+-v6/-v7). MAT v7.3 timings need MATLAB itself; see benchmark_storage_formats.m.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import scipy.io
+
+from features.preprocessing.python.subject_store import (
+    STORE_COMPRESSIONS,
+    STORE_FILENAME,
+    SubjectStore,
+    available_store_compressions,
+)
+
+CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'config', 'storage_formats.json',
+)
+MAT_FORMATS = ('v6', 'v7', 'v7.3', 'v7.3-nocompression')
+# data_ICApplied can also keep only unmixing/topo/topolabel; activations are rebuilt from data.mat
+ICA_OUTPUT_FORMATS = MAT_FORMATS + ('unmixing',)
+DEFAULT_STAGES = {'data': 'v7.3', 'data_ICApplied': 'v7.3', 'clean_data': 'v7.3', 'store': 'gzip'}
+DEFAULT_MAT_OUTPUTS = True
+
+
+def load_config(path: str = CONFIG_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            config = json.load(file)
+    except (OSError, ValueError):
+        config = {}
+    config.setdefault('stages', {})
+    for stage, value in DEFAULT_STAGES.items():
+        config['stages'].setdefault(stage, value)
+    config.setdefault('mat_outputs', DEFAULT_MAT_OUTPUTS)
+    return config
+
+
+def stage_format(stage: str, path: str = CONFIG_PATH) -> str:
+    return load_config(path)['stages'].get(stage, DEFAULT_STAGES.get(stage, 'v7.3'))
+
+
+def set_stage_format(stage: str, value: str, path: str = CONFIG_PATH):
+    """Persist the format of one stage ('store' takes a compression, the others a MAT format)"""
+    if stage == 'store':
+        allowed = STORE_COMPRESSIONS
+    elif stage == 'data_ICApplied':
+        allowed = ICA_OUTPUT_FORMATS
+    else:
+        allowed = MAT_FORMATS
+    if value not in allowed:
+        raise ValueError(f"Unsupported format '{value}' for stage '{stage}'; choose one of {', '.join(allowed)}")
+    config = load_config(path)
+    config['stages'][stage] = value
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+        file.write('\n')
+
+
+def mat_outputs_enabled(path: str = CONFIG_PATH) -> bool:
+    """Whether stages are also written as full .mat files next to subjects.h5"""
+    return bool(load_config(path)['mat_outputs'])
+
+
+def set_mat_outputs(enabled: bool, path: str = CONFIG_PATH):
+    """Persist the mat_outputs transition switch"""
+    config = load_config(path)
+    config['mat_outputs'] = bool(enabled)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+        file.write('\n')
+
+
+# Benchmark --------------------------------------------------------------
+
+def load_sample_subject(folder: str) -> Dict[str, Any]:
+    """First subject of the folder's subjects.h5, read through the store (one subject only)"""
+    store_path = os.path.join(folder, STORE_FILENAME)
+    if not os.path.exists(store_path):
+        raise FileNotFoundError(f"No {STORE_FILENAME} in {folder}; run preprocessing first")
+    with SubjectStore(store_path) as store:
+        subjects = store.subjects('data')
+        if not subjects:
+            raise ValueError(f"{store_path} holds no preprocessed subjects")
+        return store.read_subject(subjects[0], 'data')
+
+
+def _directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _to_matlab_struct(subject: Dict[str, Any]) -> Dict[str, Any]:
+    trials = np.empty((1, len(subject['trial'])), dtype=object)
+    times = np.empty((1, len(subject['time'])), dtype=object)
+    for index, (trial, time_axis) in enumerate(zip(subject['trial'], subject['time'])):
+        trials[0, index] = np.asarray(trial)
+        times[0, index] = np.asarray(time_axis).reshape(1, -1)
+    struct = {'label': np.array(subject['label'], dtype=object).reshape(-1, 1), 'trial': trials,
+              'time': times, 'fsample': subject['fsample']}
+    if subject.get('trialinfo') is not None:
+        struct['trialinfo'] = subject['trialinfo']
+    return struct
+
+
+def benchmark_formats(subject: Dict[str, Any], target_dir: Optional[str] = None,
+                      repeats: int = 3) -> List[Dict[str, Any]]:
+    """Time writing/reading one subject in every format Python can produce; best of ``repeats``"""
+    work_dir = tempfile.mkdtemp(prefix='storage_bench_', dir=target_dir)
+    cases = [('v6', 'mat'), ('v7', 'mat')] + [(name, 'store') for name in available_store_compressions()]
+    results = []
+    try:
+        mat_struct = _to_matlab_struct(subject)
+        for name, kind in cases:
+            path = os.path.join(work_dir, f"sample_{name}.{'mat' if kind == 'mat' else 'h5'}")
+            write_times, read_times = [], []
+            for _ in range(repeats):
+                if os.path.exists(path):
+                    os.remove(path)
+                start = time.perf_counter()
+                if kind == 'mat':
+                    scipy.io.savemat(path, {'data': mat_struct}, do_compression=(name == 'v7'))
+                else:
+                    with SubjectStore(path, 'w') as store:
+                        store.write_subject('sample', 'data', subject, compression=name)
+                write_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                if kind == 'mat':
+                    scipy.io.loadmat(path)
+                else:
+                    with SubjectStore(path) as store:
+                        store.read_subject('sample', 'data')
+                read_times.append(time.perf_counter() - start)
+            results.append({
+                'format': name if kind == 'mat' else f'store-{name}',
+                'write_s': min(write_times),
+                'read_s': min(read_times),
+                'size_mb': _directory_size(path) / (1024 * 1024),
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def format_benchmark(results: List[Dict[str, Any]]) -> str:
+    lines = [f"{'format':<20}{'write (s)':>12}{'read (s)':>12}{'size (MB)':>12}"]
+    for row in results:
+        lines.append(f"{row['format']:<20}{row['write_s']:>12.3f}{row['read_s']:>12.3f}{row['size_mb']:>12.2f}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark output formats on one preprocessed subject")
+    parser.add_argument('data_dir', help="Folder containing subjects.h5 from a preprocessing run")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    print(format_benchmark(benchmark_formats(load_sample_subject(args.data_dir), args.data_dir, args.repeats)))
@@ -0,0 +1,246 @@
+"""Chunked per-subject HDF5 store for FieldTrip raw and component data.
+
+Replaces reading whole struct arrays out of data.mat / data_ICApplied.mat
+when only one subject, channel or time window is needed. Every subject and
+pipeline stage gets its own group, written by ``store_write_subject.m`` in
+MATLAB or ``SubjectStore.write_subject`` here::
+
+    /subjects/<subject>/<stage>/trial       trials concatenated along time
+    /subjects/<subject>/<stage>/time        concatenated time axis
+    /subjects/<subject>/<stage>/bounds      first/last sample (1-based) of each trial
+    /subjects/<subject>/<stage>/trialinfo   optional
+    /subjects/<subject>/<stage>/sampleinfo  optional
+    /subjects/<subject>/<stage>/unmixing    component stages only
+    /subjects/<subject>/<stage>/topo        component stages only
+    attributes: label, topolabel (newline-joined), fsample
+
+Datasets hold arrays in MATLAB orientation, so h5py sees their transpose
+(``trial`` is (total_samples, nchan) here); the helpers below transpose back.
+``trial`` is chunked a few channels wide and several thousand samples long,
+so single-channel and time-window reads only decompress the chunks they hit.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+STORE_FILENAME = 'subjects.h5'
+TRIAL_CHUNK_CHANNELS = 4
+TRIAL_CHUNK_SAMPLES = 8192
+COMPRESSION_LEVEL = 4
+STORE_COMPRESSIONS = ('none', 'gzip', 'lz4', 'zstd')
+
+# Registered HDF5 filter ids, shared with MATLAB's h5create CustomFilterID
+_FILTER_IDS = {'lz4': 32004, 'zstd': 32015}
+
+_OPTIONAL_MATRICES = ('trialinfo', 'sampleinfo', 'unmixing', 'topo')
+
+
+def store_path_for(folder: str) -> str:
+    return os.path.join(folder, STORE_FILENAME)
+
+
+def _attr_text(value) -> str:
+    if isinstance(value, np.ndarray):
+        value = value.ravel()[0] if value.size else ''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'ignore')
+    return str(value).rstrip('\x00')
+
+
+def _attr_labels(group, name: str) -> List[str]:
+    if name not in group.attrs:
+        return []
+    text = _attr_text(group.attrs[name])
+    return text.split('\n') if text else []
+
+
+def h5_compression(name: str) -> Dict[str, Any]:
+    """h5py create_dataset keyword arguments for a store compression name"""
+    if name in (None, 'none'):
+        return {}
+    if name == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': COMPRESSION_LEVEL, 'shuffle': True}
+    if name in _FILTER_IDS:
+        import h5py
+        try:
+            import hdf5plugin  # noqa: F401  registers the LZ4/Zstd filters with HDF5
+        except ImportError:
+            pass
+        if not h5py.h5z.filter_avail(_FILTER_IDS[name]):
+            raise ValueError(f"HDF5 filter for '{name}' is not available; install it with 'pip install hdf5plugin'")
+        return {'compression': _FILTER_IDS[name], 'shuffle': True}
+    raise ValueError(f"Unknown store compression '{name}'")
+
+
+def available_store_compressions() -> List[str]:
+    available = []
+    for name in STORE_COMPRESSIONS:
+        try:
+            h5_compression(name)
+            available.append(name)
+        except (ValueError, ImportError):
+            continue
+    return available
+
+
+class SubjectStore:
+    """Reader/writer for the per-subject HDF5 store (see module docstring for the layout)"""
+
+    def __init__(self, path: str, mode: str = 'r'):
+        import h5py
+        try:
+            import hdf5plugin  # noqa: F401  lets stores written with lz4/zstd be read back
+        except ImportError:
+            pass
+        self.path = os.path.abspath(path)
+        self._file = h5py.File(self.path, mode)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _group(self, subject: str, stage: str):
+        try:
+            return self._file[f'subjects/{subject}/{stage}']
+        except KeyError:
+            raise KeyError(f"Subject '{subject}' has no stage '{stage}' in {self.path}") from None
+
+    # Listing ------------------------------------------------------------
+
+    def subjects(self, stage: Optional[str] = None) -> List[str]:
+        """Subject ids in case-insensitive name order, as store_list_subjects.m lists them"""
+        if 'subjects' not in self._file:
+            return []
+        return sorted(
+            (name for name, group in self._file['subjects'].items() if stage is None or stage in group),
+            key=str.lower,
+        )
+
+    def stages(self, subject: str) -> List[str]:
+        return list(self._file[f'subjects/{subject}'].keys())
+
+    # Writing ------------------------------------------------------------
+
+    def write_subject(self, subject: str, stage: str, data: Dict, compression: str = 'gzip'):
+        """Write a FieldTrip-like dict (label, trial, time, fsample, ...) as one subject/stage
+
+        ``compression`` is one of STORE_COMPRESSIONS; lz4/zstd need the HDF5
+        filter plugins (e.g. from the hdf5plugin package).
+        """
+        filters = h5_compression(compression)
+        group_path = f'subjects/{subject}/{stage}'
+        if group_path in self._file:
+            del self._file[group_path]
+        group = self._file.require_group(group_path)
+
+        # Weights-only ICA entries (see ica_weights_only.m) carry no trial/time
+        trials = [np.asarray(trial, dtype=np.float64) for trial in data.get('trial', [])]
+        times = [np.asarray(time, dtype=np.float64).ravel() for time in data.get('time', [])]
+        nchan = len(data['label'])
+        lengths = np.array([trial.shape[1] for trial in trials], dtype=np.int64)
+        last = np.cumsum(lengths)
+        bounds = np.stack([last - lengths + 1, last], axis=1).astype(np.float64)
+        total = int(last[-1]) if len(last) else 0
+
+        if total:
+            trial_ds = group.create_dataset(
+                'trial', shape=(total, nchan), dtype='f8',
+                chunks=(min(total, TRIAL_CHUNK_SAMPLES), min(nchan, TRIAL_CHUNK_CHANNELS)), **filters,
+            )
+            for (first, stop), trial in zip(bounds.astype(np.int64), trials):
+                trial_ds[first - 1:stop] = trial.T
+            group.create_dataset(
+                'time', data=np.concatenate(times), chunks=(min(total, TRIAL_CHUNK_SAMPLES),), **filters,
+            )
+            group.create_dataset('bounds', data=bounds.T)
+
+        for name in _OPTIONAL_MATRICES:
+            value = data.get(name)
+            if value is None:
+                continue
+            value = np.asarray(value, dtype=np.float64)
+            if value.ndim == 1:
+                value = value.reshape(-1, 1)  # trialinfo vectors are ntrials x 1 in MATLAB
+            if value.size:
+                group.create_dataset(name, data=value.T)
+
+        group.attrs['label'] = '\n'.join(str(label) for label in data['label'])
+        if data.get('topolabel') is not None:
+            group.attrs['topolabel'] = '\n'.join(str(label) for label in data['topolabel'])
+        group.attrs['fsample'] = float(data.get('fsample', 0.0))
+
+    # Reading ------------------------------------------------------------
+
+    def info(self, subject: str, stage: str) -> Dict:
+        """Labels, sampling rate and trial bounds without touching the signal"""
+        group = self._group(subject, stage)
+        bounds = group['bounds'][()].T.astype(np.int64) if 'bounds' in group else np.zeros((0, 2), np.int64)
+        return {
+            'label': _attr_labels(group, 'label'),
+            'topolabel': _attr_labels(group, 'topolabel'),
+            'fsample': float(np.ravel(group.attrs.get('fsample', 0.0))[0]),
+            'bounds': bounds,
+            'ntrials': len(bounds),
+        }
+
+    def read_matrix(self, subject: str, stage: str, name: str) -> Optional[np.ndarray]:
+        """Read a small matrix (trialinfo, sampleinfo, unmixing, topo) in MATLAB orientation"""
+        group = self._group(subject, stage)
+        return group[name][()].T if name in group else None
+
+    def read_ica(self, subject: str, stage: str = 'data_ICApplied') -> Dict:
+        group = self._group(subject, stage)
+        return {
+            'unmixing': self.read_matrix(subject, stage, 'unmixing'),
+            'topo': self.read_matrix(subject, stage, 'topo'),
+            'topolabel': _attr_labels(group, 'topolabel'),
+        }
+
+    def read_subject(self, subject: str, stage: str, channels: Optional[Sequence] = None,
+                     trials: Optional[Sequence[int]] = None, latency: Optional[Sequence[float]] = None) -> Dict:
+        """Read a FieldTrip-like dict, restricted to channels, 0-based trials and a [t0, t1] latency"""
+        group = self._group(subject, stage)
+        meta = self.info(subject, stage)
+        labels = meta['label']
+        if channels is None:
+            channel_idx = list(range(len(labels)))
+        else:
+            lookup = {label: position for position, label in enumerate(labels)}
+            channel_idx = [lookup[channel] if isinstance(channel, str) else int(channel) for channel in channels]
+        trial_idx = range(meta['ntrials']) if trials is None else [int(trial) for trial in trials]
+
+        # h5py needs increasing unique column selections; restore the requested order afterwards
+        columns = sorted(set(channel_idx))
+        position = {channel: offset for offset, channel in enumerate(columns)}
+        reorder = [position[channel] for channel in channel_idx]
+
+        out = {'label': [labels[idx] for idx in channel_idx], 'fsample': meta['fsample'], 'trial': [], 'time': []}
+        for trial in trial_idx:
+            first, last = meta['bounds'][trial]
+            time = group['time'][first - 1:last]
+            start, stop = 0, len(time)
+            if latency is not None:
+                start = int(np.searchsorted(time, latency[0], side='left'))
+                stop = int(np.searchsorted(time, latency[1], side='right'))
+            if stop <= start or not columns:
+                out['trial'].append(np.zeros((len(channel_idx), 0)))
+                out['time'].append(np.zeros(0))
+                continue
+            block = group['trial'][first - 1 + start:first - 1 + stop, columns]
+            out['trial'].append(block[:, reorder].T)
+            out['time'].append(time[start:stop])
+
+        for name in ('trialinfo', 'sampleinfo'):
+            value = self.read_matrix(subject, stage, name)
+            if value is not None:
+                out[name] = value[list(trial_idx)]
+        if 'unmixing' in group:
+            out.update(self.read_ica(subject, stage))
+        return out
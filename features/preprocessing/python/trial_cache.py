@@ -0,0 +1,256 @@
+"""Shared memory-mapped trial tensor built once from cleaned data.
+
+All clean trials of a study are written to one contiguous float32 array of
+shape (trials, channels, samples) in ``<data_dir>/trial_cache/trials.npy``,
+next to a structured index (subject, condition, trialinfo, source trial).
+Rows are ordered by subject and then condition, so every subject and every
+(subject, condition) block is a contiguous zero-copy slice of the memmap;
+analysis engines and the classifier slice the same pages instead of each
+re-reading .mat files.
+
+The cache is rebuilt when the source (subjects.h5 or
+data_ICApplied_clean.mat) changes size or mtime.
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from features.preprocessing.python.eeglab_io import is_hdf5_mat
+from features.preprocessing.python.fieldtrip_h5 import open_fieldtrip_mat
+from features.preprocessing.python.subject_store import STORE_FILENAME, SubjectStore
+
+CACHE_DIRNAME = 'trial_cache'
+CLEAN_MAT_FILENAME = 'data_ICApplied_clean.mat'
+# trialinfo codes split by decompose.m
+CONDITION_CODES = {200: 'target', 201: 'standard', 202: 'novelty'}
+
+INDEX_DTYPE = np.dtype([
+    ('subject', np.int32),
+    ('condition', np.int32),
+    ('trialinfo', np.float64),
+    ('trial', np.int32),
+])
+
+
+def condition_name(code: float) -> str:
+    if np.isfinite(code) and float(code).is_integer() and int(code) in CONDITION_CODES:
+        return CONDITION_CODES[int(code)]
+    return str(int(code)) if np.isfinite(code) and float(code).is_integer() else str(code)
+
+
+class TrialCache:
+    """Read-side view of a built cache; slicing never copies"""
+
+    def __init__(self, cache_dir: str, mode: str = 'r'):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as file:
+            self.meta = json.load(file)
+        # mode 'c' gives copy-on-write pages, which consumers such as torch.from_numpy need
+        self.trials = np.load(os.path.join(cache_dir, 'trials.npy'), mmap_mode=mode)
+        self.index = np.load(os.path.join(cache_dir, 'index.npy'))
+        self.subjects: List[str] = self.meta['subjects']
+        self.conditions: List[str] = self.meta['conditions']
+        self.label: List[str] = self.meta['label']
+        self.time = np.asarray(self.meta['time'])
+        self.fsample = float(self.meta['fsample'])
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        """Drop the trials memmap; the file is unmapped once no slice of it is alive"""
+        self.trials = None
+
+    def _code(self, names: List[str], value) -> int:
+        if isinstance(value, str):
+            return names.index(value)
+        return int(value)
+
+    def rows(self, subject=None, condition=None, trialinfo=None) -> np.ndarray:
+        """Row numbers matching every given filter (names or codes)"""
+        mask = np.ones(len(self.index), dtype=bool)
+        if subject is not None:
+            mask &= self.index['subject'] == self._code(self.subjects, subject)
+        if condition is not None:
+            mask &= self.index['condition'] == self._code(self.conditions, condition)
+        if trialinfo is not None:
+            mask &= np.isin(self.index['trialinfo'], np.atleast_1d(trialinfo))
+        return np.flatnonzero(mask)
+
+    def block(self, subject, condition=None) -> np.ndarray:
+        """Zero-copy (trials, channels, samples) slice of one subject or (subject, condition)"""
+        rows = self.rows(subject=subject, condition=condition)
+        if len(rows) == 0:
+            return self.trials[0:0]
+        # Rows of a subject/condition are contiguous by construction
+        return self.trials[rows[0]:rows[-1] + 1]
+
+    def blocks(self, condition=None) -> Iterator[Tuple[str, str, np.ndarray]]:
+        """Yield (subject, condition, zero-copy slice) for every non-empty block"""
+        keys = np.stack([self.index['subject'], self.index['condition']], axis=1)
+        if len(keys) == 0:
+            return
+        starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+        stops = np.r_[starts[1:], len(keys)]
+        wanted = None if condition is None else self._code(self.conditions, condition)
+        for start, stop in zip(starts, stops):
+            subject_code, condition_code = keys[start]
+            if wanted is not None and condition_code != wanted:
+                continue
+            yield self.subjects[subject_code], self.conditions[condition_code], self.trials[start:stop]
+
+    def channel_indices(self, channels: Sequence) -> List[int]:
+        return [self.label.index(channel) if isinstance(channel, str) else int(channel) for channel in channels]
+
+
+# Sources ----------------------------------------------------------------
+
+def cache_source(folder: str) -> Optional[str]:
+    """The file a folder's cache is built from: subjects.h5 with clean_data, else a v7.3 clean .mat"""
+    store_path = os.path.join(folder, STORE_FILENAME)
+    if os.path.exists(store_path):
+        with SubjectStore(store_path) as store:
+            if store.subjects('clean_data'):
+                return store_path
+    mat_path = os.path.join(folder, CLEAN_MAT_FILENAME)
+    if os.path.exists(mat_path) and is_hdf5_mat(mat_path):
+        return mat_path
+    return None
+
+
+def _signature(path: str) -> Dict:
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _iter_store_subjects(store_path: str) -> Iterator[Tuple[str, Dict]]:
+    with SubjectStore(store_path) as store:
+        for subject in store.subjects('clean_data'):
+            yield subject, store.read_subject(subject, 'clean_data')
+
+
+def _iter_mat_subjects(mat_path: str) -> Iterator[Tuple[str, Dict]]:
+    with open_fieldtrip_mat(mat_path) as mat_file:
+        clean_data = mat_file['clean_data']
+        for position, subject in enumerate(clean_data):
+            trials = subject['trial']
+            yield f'sub{position + 1:02d}', {
+                'label': list(subject['label']),
+                'trial': list(trials.arrays()),
+                'time': list(subject['time'].arrays()),
+                'fsample': float(np.ravel(subject['fsample'])[0]),
+                'trialinfo': subject.get('trialinfo'),
+            }
+
+
+def _iter_subjects(source: str) -> Iterator[Tuple[str, Dict]]:
+    if source.endswith(STORE_FILENAME):
+        return _iter_store_subjects(source)
+    return _iter_mat_subjects(source)
+
+
+def _shape_pass(source: str) -> Tuple[int, int, int]:
+    """Trial count, channel count and trial length without reading the signal where possible"""
+    if source.endswith(STORE_FILENAME):
+        total, nchan, nsamples = 0, None, None
+        with SubjectStore(source) as store:
+            for subject in store.subjects('clean_data'):
+                info = store.info(subject, 'clean_data')
+                lengths = np.unique(info['bounds'][:, 1] - info['bounds'][:, 0] + 1)
+                total += info['ntrials']
+                nchan = nchan or len(info['label'])
+                for length in lengths:
+                    if nsamples is not None and length != nsamples:
+                        raise ValueError("Trials differ in length; the trial cache needs fixed-length trials")
+                    nsamples = int(length)
+        return total, nchan or 0, nsamples or 0
+    total, nchan, nsamples = 0, None, None
+    with open_fieldtrip_mat(source) as mat_file:
+        for subject in mat_file['clean_data']:
+            trials = subject['trial']
+            for position in range(len(trials)):
+                samples, channels = trials.node(position).shape  # HDF5 order of a chan x time matrix
+                if nsamples is not None and samples != nsamples:
+                    raise ValueError("Trials differ in length; the trial cache needs fixed-length trials")
+                nsamples, nchan = samples, nchan or channels
+            total += len(trials)
+    return total, nchan or 0, nsamples or 0
+
+
+# Build / load -----------------------------------------------------------
+
+def cache_dir_for(folder: str) -> str:
+    return os.path.join(folder, CACHE_DIRNAME)
+
+
+def is_trial_cache(path) -> bool:
+    path = str(path)
+    return os.path.isfile(os.path.join(path, 'trials.npy')) and os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+def build_trial_cache(folder: str) -> str:
+    """Write trials.npy/index.npy/meta.json for the folder's cleaned data and return the cache dir"""
+    source = cache_source(folder)
+    if source is None:
+        raise FileNotFoundError(f"No clean_data in {folder} ({STORE_FILENAME} or v7.3 {CLEAN_MAT_FILENAME})")
+    total, nchan, nsamples = _shape_pass(source)
+
+    target_dir = cache_dir_for(folder)
+    build_dir = target_dir + '.building'
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+    trials = np.lib.format.open_memmap(os.path.join(build_dir, 'trials.npy'), mode='w+',
+                                       dtype=np.float32, shape=(total, nchan, nsamples))
+    index = np.zeros(total, dtype=INDEX_DTYPE)
+    subjects, conditions, reference = [], [], {}
+    row = 0
+    for subject, data in _iter_subjects(source):
+        if not reference:
+            reference = {'label': list(data['label']), 'time': np.asarray(data['time'][0]).ravel().tolist(),
+                         'fsample': data['fsample']}
+        order = [list(data['label']).index(label) for label in reference['label']]
+        trialinfo = data.get('trialinfo')
+        codes = (np.asarray(trialinfo, dtype=float).reshape(len(data['trial']), -1)[:, 0]
+                 if trialinfo is not None else np.full(len(data['trial']), np.nan))
+        names = [condition_name(code) for code in codes]
+        for name in names:
+            if name not in conditions:
+                conditions.append(name)
+        condition_codes = np.array([conditions.index(name) for name in names], dtype=np.int32)
+        subject_code = len(subjects)
+        subjects.append(subject)
+        # Group the subject's trials by condition so each block is contiguous
+        for trial in np.argsort(condition_codes, kind='stable'):
+            trials[row] = np.asarray(data['trial'][trial])[order]
+            index[row] = (subject_code, condition_codes[trial], codes[trial], trial)
+            row += 1
+    trials.flush()
+    del trials
+
+    np.save(os.path.join(build_dir, 'index.npy'), index)
+    meta = dict(reference, subjects=subjects, conditions=conditions, shape=[total, nchan, nsamples],
+                signature=_signature(source))
+    with open(os.path.join(build_dir, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.replace(build_dir, target_dir)
+    return target_dir
+
+
+def load_trial_cache(folder: str, rebuild: bool = True, mode: str = 'r') -> Optional[TrialCache]:
+    """Open the folder's cache, (re)building it when missing or older than its source"""
+    cache_dir = cache_dir_for(folder)
+    source = cache_source(folder)
+    if is_trial_cache(cache_dir):
+        cache = TrialCache(cache_dir, mode=mode)
+        if source is None or cache.meta.get('signature') == _signature(source):
+            return cache
+        del cache
+    if not rebuild or source is None:
+        return None
+    return TrialCache(build_trial_cache(folder), mode=mode)
@@ -7,7 +7,6 @@ Item {
     id: fileBrowserUI
     
     // Properties exposed to parent
-    property var folderContents: []
     property string currentFolder: ""
     property alias folderDialog: folderDialog
     property alias fieldtripDialog: fieldtripDialog
@@ -15,7 +14,6 @@ Item {
     // Signals for parent communication
     signal refreshRequested()
     signal folderChanged(string folder)
-    signal contentsChanged(var contents)
     signal fieldtripPathRequested()
     signal dataDirectoryUpdateRequested(string path)
     
@@ -29,10 +27,6 @@ Item {
     // Connect to the fileBrowser backend signals
     Connections {
         target: fileBrowser
-        function onFolderContentsChanged(contents) {
-            fileBrowserUI.folderContents = contents
-            fileBrowserUI.contentsChanged(contents)
-        }
         function onCurrentFolderChanged(folder) {
             fileBrowserUI.currentFolder = folder
             fileBrowserUI.folderChanged(folder)
@@ -238,7 +232,7 @@ Item {
                             ListView {
                                 id: folderListView
                                 anchors.fill: parent
-                                model: fileBrowserUI.folderContents
+                                model: fileBrowser.folderModel
                                 
                                 delegate: Item {
                                     width: folderListView.width
@@ -259,7 +253,7 @@ Item {
                                             onClicked: function(mouse) {
                                                 if (mouse.button === Qt.RightButton) {
                                                     // Emit signal for right-click context menu
-                                                    var cleanFilename = modelData.replace(/^[^\w]+/, '')  // Remove leading emojis/symbols
+                                                    var cleanFilename = model.display.replace(/^[^\w]+/, '')  // Remove leading emojis/symbols
                                                     var fullPath = fileBrowserUI.currentFolder + "/" + cleanFilename
                                                     var isMatFile = cleanFilename.toLowerCase().endsWith('.mat')
                                                     
@@ -267,8 +261,8 @@ Item {
                                                     fileBrowserUI.fileRightClicked(cleanFilename, fullPath, isMatFile, mouse.x, mouse.y)
                                                 } else if (mouse.button === Qt.LeftButton) {
                                                     // Emit signal for left-click
-                                                    var cleanFilename = modelData.replace(/^[^\w]+/, '')  // Remove leading emojis/symbols
-                                                    fileBrowserUI.fileLeftClicked(cleanFilename, modelData)
+                                                    var cleanFilename = model.display.replace(/^[^\w]+/, '')  // Remove leading emojis/symbols
+                                                    fileBrowserUI.fileLeftClicked(cleanFilename, model.display)
                                                 }
                                             }
                                         }
@@ -280,18 +274,18 @@ Item {
                                             spacing: 5
                                             
                                             Text {
-                                                text: modelData
+                                                text: model.display
                                                 font.pixelSize: 10
-                                                color: modelData.endsWith('.mat') ? 
-                                                    (modelData.includes('ICA') || modelData.includes('ica') ? "#4caf50" : "#007bff") : "#333"
-                                                font.underline: modelData.endsWith('.mat') && fileMouseArea.containsMouse
+                                                color: model.display.endsWith('.mat') ? 
+                                                    (model.display.includes('ICA') || model.display.includes('ica') ? "#4caf50" : "#007bff") : "#333"
+                                                font.underline: model.display.endsWith('.mat') && fileMouseArea.containsMouse
                                             }
                                             
                                             Text {
-                                                text: modelData.endsWith('.mat') ? 
-                                                    (modelData.includes('ICA') || modelData.includes('ica') ? "🧠" : "📊") : ""
+                                                text: model.display.endsWith('.mat') ? 
+                                                    (model.display.includes('ICA') || model.display.includes('ica') ? "🧠" : "📊") : ""
                                                 font.pixelSize: 8
-                                                visible: modelData.endsWith('.mat') && fileMouseArea.containsMouse
+                                                visible: model.display.endsWith('.mat') && fileMouseArea.containsMouse
                                             }
                                         }
                                     }
@@ -10,13 +10,13 @@ Item {
     
     // Properties to communicate with main.qml
     property string currentFolder: ""
-    property var folderContents: []
     property string fieldtripPath: ""
     property string saveMessage: ""
     property bool isProcessing: false  // Track processing state
     property bool showICABrowser: false  // Track ICA browser visibility
     property int customDropdownCount: 0
     property int customRangeSliderCount: 0
+    property string trialCountPreview: ""  // Per-recording trial counts from the event index
     
     // Function to initialize eventvalues from main.qml
     function setInitialEventvalues(eventvalues) {
@@ -407,6 +407,40 @@ Item {
         return selectedChannels.length
     }
 
+    // Summarize how many trials each eventvalue yields per recording
+    function updateTrialCountPreview() {
+        if (!fileBrowser) {
+            return
+        }
+        var eventtype = eventtypeDropdown.selectedItems.length > 0 ? eventtypeDropdown.selectedItems[0] : ""
+        var eventvalues = eventvalueDropdown.selectedItems
+        var preview = fileBrowser.previewTrialCounts(eventtype, eventvalues)
+        if (!preview || preview.recordings.length === 0) {
+            trialCountPreview = ""
+            return
+        }
+        var lines = []
+        for (var i = 0; i < preview.recordings.length; i++) {
+            var recording = preview.recordings[i]
+            var parts = []
+            for (var j = 0; j < eventvalues.length; j++) {
+                parts.push(eventvalues[j] + ": " + recording.counts[eventvalues[j]])
+            }
+            lines.push(recording.name + "  " + parts.join(", "))
+        }
+        if (preview.missing.length > 0) {
+            lines.push("Eventvalue not found in any recording: " + preview.missing.join(", "))
+        }
+        trialCountPreview = lines.join("\n")
+    }
+
+    Connections {
+        target: fileBrowser
+        function onIndexUpdated(root) {
+            updateTrialCountPreview()
+        }
+    }
+
     // JavaScript functions for eventvalue selection
     function isEventvalueSelected(eventvalue) {
         return eventvalueDropdown.selectedItems.indexOf(eventvalue) !== -1
@@ -578,7 +612,7 @@ Item {
                         ListView {
                             id: folderListView
                             anchors.fill: parent
-                            model: preprocessingPageRoot.folderContents
+                            model: fileBrowser.folderModel
                             
                             delegate: Item {
                                 width: folderListView.width
@@ -599,7 +633,7 @@ Item {
                                         onClicked: function(mouse) {
                                             if (mouse.button === Qt.LeftButton) {
                                                 // Left-click: Check if it's a .mat file and handle accordingly
-                                                var cleanFilename = modelData.replace(/^[^\w]+/, '')  // Remove leading emojis/symbols
+                                                var cleanFilename = model.display.replace(/^[^\w]+/, '')  // Remove leading emojis/symbols
                                                 
                                                 if (cleanFilename.toLowerCase().endsWith('.mat')) {
                                                     // Check if it's an ICA file by looking for ICA indicators in filename
@@ -632,18 +666,18 @@ Item {
                                         spacing: 5
                                         
                                         Text {
-                                            text: modelData
+                                            text: model.display
                                             font.pixelSize: 10
-                                            color: modelData.endsWith('.mat') ? 
-                                                (modelData.includes('ICA') || modelData.includes('ica') ? "#4caf50" : "#007bff") : "#333"
-                                            font.underline: modelData.endsWith('.mat') && fileMouseArea.containsMouse
+                                            color: model.display.endsWith('.mat') ? 
+                                                (model.display.includes('ICA') || model.display.includes('ica') ? "#4caf50" : "#007bff") : "#333"
+                                            font.underline: model.display.endsWith('.mat') && fileMouseArea.containsMouse
                                         }
                                         
                                         Text {
-                                            text: modelData.endsWith('.mat') ? 
-                                                (modelData.includes('ICA') || modelData.includes('ica') ? "🧠" : "📊") : ""
+                                            text: model.display.endsWith('.mat') ? 
+                                                (model.display.includes('ICA') || model.display.includes('ica') ? "🧠" : "📊") : ""
                                             font.pixelSize: 8
-                                            visible: modelData.endsWith('.mat') && fileMouseArea.containsMouse
+                                            visible: model.display.endsWith('.mat') && fileMouseArea.containsMouse
                                         }
                                     }
                                 }
@@ -760,6 +794,7 @@ Item {
                 if (selected.length > 0) {
                     matlabExecutor.saveEventtypeSelection(selected[0], 0)
                 }
+                updateTrialCountPreview()
             }
 
             onAddItem: function(newItem) {
@@ -793,6 +828,7 @@ Item {
             onMultiSelectionChanged: function(selected) {
                 // Handle multi-selection changes for eventvalues
                 console.log("Eventvalues selected:", selected)
+                updateTrialCountPreview()
             }
 
             onAddItem: function(newItem) {
@@ -811,6 +847,17 @@ Item {
             }
         }
 
+        // Trials per condition and recording, read from the event index (no MATLAB needed)
+        Text {
+            id: trialCountPreviewText
+            width: parent.width
+            text: preprocessingPageRoot.trialCountPreview
+            font.pixelSize: 11
+            color: preprocessingPageRoot.trialCountPreview.indexOf("not found") !== -1 ? "#d32f2f" : "#666"
+            wrapMode: Text.Wrap
+            visible: text !== ""
+        }
+
         // Channel Selection
         // Channel Selection using DropdownTemplate
         DropdownTemplate {
@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 
 # Set Qt Quick Controls style to Fusion (supports customization)
 os.environ['QT_QUICK_CONTROLS_STYLE'] = 'Fusion'
@@ -32,36 +33,47 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-app = QApplication(sys.argv)  # Changed to QApplication for widget support
 
-# Register classes with QML
-qmlRegisterType(MatlabExecutor, "MatlabExecutor", 1, 0, "MatlabExecutor")
-qmlRegisterType(FileBrowser, "FileBrowser", 1, 0, "FileBrowser")
+def main():
+    """Create the application, register the QML types and run the event loop"""
+    app = QApplication(sys.argv)  # Changed to QApplication for widget support
 
+    # Register classes with QML
+    qmlRegisterType(MatlabExecutor, "MatlabExecutor", 1, 0, "MatlabExecutor")
+    qmlRegisterType(FileBrowser, "FileBrowser", 1, 0, "FileBrowser")
 
-# Create instances
-matlab_executor = MatlabExecutor()
-file_browser = FileBrowser()
-# classification_config = ClassificationConfig()
 
-engine = QQmlApplicationEngine()
-engine.quit.connect(app.quit)
+    # Create instances
+    matlab_executor = MatlabExecutor()
+    file_browser = FileBrowser()
+    # classification_config = ClassificationConfig()
 
-# Add import paths for QML
-engine.addImportPath(os.path.join(project_root, "features", "preprocessing", "ui"))
-engine.addImportPath(os.path.join(project_root, "features", "analysis", "ui"))
-engine.addImportPath(os.path.join(project_root, "ui"))
+    engine = QQmlApplicationEngine()
+    engine.quit.connect(app.quit)
 
-# Make instances available to QML
-engine.rootContext().setContextProperty("matlabExecutor", matlab_executor)
-engine.rootContext().setContextProperty("fileBrowser", file_browser)
-# engine.rootContext().setContextProperty("classificationConfig", classification_config)
+    # Add import paths for QML
+    engine.addImportPath(os.path.join(project_root, "features", "preprocessing", "ui"))
+    engine.addImportPath(os.path.join(project_root, "features", "analysis", "ui"))
+    engine.addImportPath(os.path.join(project_root, "ui"))
 
-engine.load(QUrl.fromLocalFile(os.path.join(project_root, 'ui', 'main.qml')))
+    # Make instances available to QML
+    engine.rootContext().setContextProperty("matlabExecutor", matlab_executor)
+    engine.rootContext().setContextProperty("fileBrowser", file_browser)
+    # engine.rootContext().setContextProperty("classificationConfig", classification_config)
 
-# Initialize file browser with the current data directory from MATLAB script
-current_data_dir = matlab_executor.getCurrentDataDirectory()
-if current_data_dir:
-    file_browser.initializeWithPath(current_data_dir)
+    engine.load(QUrl.fromLocalFile(os.path.join(project_root, 'ui', 'main.qml')))
 
-sys.exit(app.exec())
\ No newline at end of file
+    # Initialize file browser with the current data directory from MATLAB script
+    current_data_dir = matlab_executor.getCurrentDataDirectory()
+    if current_data_dir:
+        file_browser.initializeWithPath(current_data_dir)
+
+    return app.exec()
+
+
+# The NumPy backends run subjects in process pools; with the spawn start method
+# (Windows, macOS, frozen builds) every worker imports this module, so the GUI
+# must only start when it is run as the main script.
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
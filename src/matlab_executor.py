@@ -6,7 +6,20 @@ import threading
 import json
 from typing import List, Optional
 from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot, QThread
-import scipy.io
+
+from features.preprocessing.python.mat_inspect import inspect_mat
+from features.preprocessing.python.trial_definition import TrialDefinition, define_trials_for_files
+from features.analysis.python.result_export import export_folder
+from features.analysis.python.erp_timelock import erp_folder
+from features.analysis.python.freq_analysis import TIMEFREQ_SCRIPT, read_freq_cfg
+from features.analysis.python.timefreq_wavelet import read_wavelet_config, wavelet_folder
+from features.analysis.python.timefreq_mtmconvol import mtmconvol_folder, read_mtmconvol_config
+from features.analysis.python.spectral_multitaper import multitaper_folder, read_multitaper_config
+from features.preprocessing.python import storage_formats
+from features.preprocessing.python.trial_cache import build_trial_cache
+from features.preprocessing.python.numpy_preprocessing import preprocess_folder, read_preprocess_config
+from features.preprocessing.python.component_rejection import preview_store_subject
+from features.preprocessing.python.fastica import format_ica_summary, read_ica_settings, run_ica_folder
 
 # Function to get the resource path (works for both development and PyInstaller)
 def resource_path(relative_path):
@@ -329,6 +342,20 @@ class MatlabExecutor(QObject):
         print("Unable to resolve preprocess_data.m path.")
         return None
 
+    def _get_preprocessing_script_path(self) -> Optional[str]:
+        """Return the absolute path to preprocessing.m, resolved like preprocess_data.m."""
+        candidates = [
+            os.path.join(self._project_root, "features", "preprocessing", "matlab", "preprocessing.m"),
+            resource_path("preprocessing/preprocessing.m"),
+        ]
+
+        for candidate in candidates:
+            if candidate and os.path.isfile(candidate):
+                return candidate
+
+        print("Unable to resolve preprocessing.m path.")
+        return None
+
     def _get_decomp_timelock_script_path(self) -> Optional[str]:
         """Return the absolute path to decomp_timelock_func.m if it exists."""
         candidates = [
@@ -676,7 +703,288 @@ class MatlabExecutor(QObject):
         except Exception as e:
             print(f"Error reading cfg.latency range: {str(e)}")
             return []
+
+    def _current_trial_definition(self) -> TrialDefinition:
+        """Build a TrialDefinition from the cfg.trialdef lines of preprocess_data.m"""
+        trialdef = TrialDefinition(eventtype=self.getCurrentEventtype(), eventvalue=self.getCurrentEventvalue())
+        script_path = self._get_preprocess_data_script_path()
+        if script_path:
+            with open(script_path, 'r', encoding='utf-8') as file:
+                content = file.read()
+            # prestim/poststim may be negative, which the dropdown getters do not parse
+            for name in ('prestim', 'poststim'):
+                match = re.search(rf'cfg\.trialdef\.{name}\s*=\s*(-?[\d.]+);', content)
+                if match:
+                    setattr(trialdef, name, float(match.group(1)))
+        return trialdef
+
+    def _preview_trials(self, folder_path: str, trialdef: TrialDefinition) -> dict:
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+        if not folder_path or not os.path.isdir(folder_path):
+            return {'files': [], 'total': 0, 'error': f"Folder not found: {folder_path}"}
+
+        set_files = sorted(
+            os.path.join(folder_path, name) for name in os.listdir(folder_path) if name.lower().endswith('.set')
+        )
+        files, total = [], 0
+        for path, result in define_trials_for_files(set_files, trialdef).items():
+            if 'error' in result:
+                files.append({'name': os.path.basename(path), 'error': result['error']})
+                continue
+            trl, in_bounds = result['trl'], result['in_bounds']
+            counts = {str(value): 0 for value in trialdef.eventvalue}
+            for value in result['values'][in_bounds]:
+                counts[value] = counts.get(value, 0) + 1
+            kept = int(in_bounds.sum())
+            total += kept
+            files.append({
+                'name': os.path.basename(path),
+                'trials': kept,
+                'excluded': int(len(trl) - kept),
+                'counts': counts,
+                'segments': trl[in_bounds][:, :3].astype(int).tolist(),
+                'srate': result['srate'],
+            })
+        return {'files': files, 'total': total}
+
+    @pyqtSlot(str, float, float, str, list, result="QVariant")
+    def previewTrialDefinition(self, folder_path, prestim, poststim, eventtype, eventvalues):
+        """Compute ft_trialfun_general trl segments for every .set in a folder without MATLAB"""
+        try:
+            trialdef = TrialDefinition(eventtype=eventtype, eventvalue=[str(value) for value in eventvalues],
+                                       prestim=prestim, poststim=poststim)
+            return self._preview_trials(folder_path, trialdef)
+        except Exception as e:
+            print(f"Error previewing trial definition: {str(e)}")
+            return {'files': [], 'total': 0, 'error': str(e)}
+
+    @pyqtSlot(str, result="QVariant")
+    def previewCurrentTrialDefinition(self, folder_path):
+        """previewTrialDefinition using the trialdef currently saved in preprocess_data.m"""
+        try:
+            return self._preview_trials(folder_path, self._current_trial_definition())
+        except Exception as e:
+            print(f"Error previewing trial definition: {str(e)}")
+            return {'files': [], 'total': 0, 'error': str(e)}
+
+    @pyqtSlot(str, result=str)
+    def exportAnalysisResults(self, folder_path):
+        """Write ERP/TFR/spectral results in a folder to results.parquet; returns the path or ''"""
+        try:
+            folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+            summary = export_folder(folder_path)
+            message = (f"Exported {summary['rows']} rows ({', '.join(summary['measures'])}) "
+                       f"for {len(summary['subjects'])} subjects to {summary['path']}")
+            print(message)
+            self.configSaved.emit(message)
+            self.fileExplorerRefresh.emit()
+            return summary['path']
+        except Exception as e:
+            error_msg = f"Error exporting analysis results: {str(e)}"
+            print(error_msg)
+            self.configSaved.emit(error_msg)
+            return ""
+
+    @pyqtSlot(str)
+    def computeGroupedERP(self, folder_path):
+        """Grouped ERP timelocks of a folder's cleaned data to erp_output.mat, in the background"""
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+        latency = self.getCurrentErpLatency()
+        latency = latency[:2] if len(latency) >= 2 else None
+
+        def run_erp():
+            try:
+                result = erp_folder(folder_path, latency=latency)
+                message = f"ERP timelocks for {len(result['subjects'])} subjects saved to {result['path']}"
+                print(message)
+                self.configSaved.emit(message)
+                self.fileExplorerRefresh.emit()
+            except Exception as e:
+                error_msg = f"Error computing grouped ERPs: {str(e)}"
+                print(error_msg)
+                self.configSaved.emit(error_msg)
+
+        threading.Thread(target=run_erp, daemon=True).start()
+
+    @pyqtSlot(str)
+    def computeTimeFrequencyTFR(self, folder_path):
+        """TFRs with the engine timefreqanalysis.m's cfg.method selects (wavelet or mtmconvol)
+
+        Results go to timefreq_output.mat; runs in the background.
+        """
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+
+        def run_tfr():
+            try:
+                method = read_freq_cfg(TIMEFREQ_SCRIPT).get('method', 'wavelet')
+                if method == 'wavelet':
+                    result = wavelet_folder(folder_path, read_wavelet_config())
+                elif method == 'mtmconvol':
+                    result = mtmconvol_folder(folder_path, read_mtmconvol_config())
+                else:
+                    raise ValueError(f"timefreqanalysis.m uses cfg.method = '{method}', "
+                                     f"expected 'wavelet' or 'mtmconvol'")
+                message = f"{method} TFRs for {len(result['subjects'])} subjects saved to {result['path']}"
+                print(message)
+                self.configSaved.emit(message)
+                self.fileExplorerRefresh.emit()
+            except Exception as e:
+                error_msg = f"Error computing time-frequency TFRs: {str(e)}"
+                print(error_msg)
+                self.configSaved.emit(error_msg)
+
+        threading.Thread(target=run_tfr, daemon=True).start()
+
+    @pyqtSlot(str)
+    def computeMultitaperSpectra(self, folder_path):
+        """mtmfft/mtmwelch spectra (cfg of spectralanalysis.m) to spectral_output.mat, in the background"""
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+
+        def run_spectra():
+            try:
+                result = multitaper_folder(folder_path, read_multitaper_config())
+                message = f"Spectra for {len(result['subjects'])} subjects saved to {result['path']}"
+                print(message)
+                self.configSaved.emit(message)
+                self.fileExplorerRefresh.emit()
+            except Exception as e:
+                error_msg = f"Error computing multitaper spectra: {str(e)}"
+                print(error_msg)
+                self.configSaved.emit(error_msg)
+
+        threading.Thread(target=run_spectra, daemon=True).start()
+
+    @pyqtSlot(result="QVariant")
+    def getStorageFormats(self):
+        """Configured output format per stage plus the choices available on this machine"""
+        config = storage_formats.load_config()
+        return {
+            'stages': config['stages'],
+            'matOutputs': bool(config['mat_outputs']),
+            'matFormats': list(storage_formats.MAT_FORMATS),
+            'icaFormats': list(storage_formats.ICA_OUTPUT_FORMATS),
+            'storeCompressions': storage_formats.available_store_compressions(),
+        }
+
+    @pyqtSlot(str, str, result=bool)
+    def setStorageFormat(self, stage, value):
+        """Persist the output format of one stage in config/storage_formats.json"""
+        try:
+            storage_formats.set_stage_format(stage, value)
+            self.configSaved.emit(f"Output format for {stage} set to {value}")
+            return True
+        except Exception as e:
+            error_msg = f"Error saving storage format: {str(e)}"
+            print(error_msg)
+            self.configSaved.emit(error_msg)
+            return False
+
+    @pyqtSlot(bool, result=bool)
+    def setMatOutputs(self, enabled):
+        """Turn the full .mat copies of each stage on or off (subjects.h5 is always written)"""
+        try:
+            storage_formats.set_mat_outputs(enabled)
+            self.configSaved.emit(f"Full .mat outputs {'enabled' if enabled else 'disabled'}; subjects.h5 is always written")
+            return True
+        except Exception as e:
+            error_msg = f"Error saving storage format: {str(e)}"
+            print(error_msg)
+            self.configSaved.emit(error_msg)
+            return False
+
+    @pyqtSlot(str)
+    def runStorageBenchmark(self, folder_path):
+        """Benchmark output formats on the first subject of a folder's subjects.h5 in the background"""
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+
+        def run_benchmark():
+            try:
+                subject = storage_formats.load_sample_subject(folder_path)
+                table = storage_formats.format_benchmark(
+                    storage_formats.benchmark_formats(subject, target_dir=folder_path))
+                print(table)
+                self.configSaved.emit(f"Storage benchmark (MAT v7.3 timings: benchmark_storage_formats in MATLAB)\n{table}")
+            except Exception as e:
+                error_msg = f"Error running storage benchmark: {str(e)}"
+                print(error_msg)
+                self.configSaved.emit(error_msg)
+
+        threading.Thread(target=run_benchmark, daemon=True).start()
+
+    @pyqtSlot(str)
+    def buildTrialCache(self, folder_path):
+        """Build the shared trial tensor cache from a folder's cleaned data in the background"""
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+
+        def run_build():
+            try:
+                cache_dir = build_trial_cache(folder_path)
+                message = f"Trial cache written to {cache_dir}"
+                print(message)
+                self.configSaved.emit(message)
+                self.fileExplorerRefresh.emit()
+            except Exception as e:
+                error_msg = f"Error building trial cache: {str(e)}"
+                print(error_msg)
+                self.configSaved.emit(error_msg)
+
+        threading.Thread(target=run_build, daemon=True).start()
     
+    @pyqtSlot(str, str, list, result="QVariant")
+    def previewComponentRejection(self, folder_path, subject, rejected):
+        """Variance removed by the rejected components and by each further candidate for one subject"""
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+        try:
+            preview = preview_store_subject(os.path.join(folder_path, 'subjects.h5'), subject,
+                                            [int(component) for component in rejected])
+            return {
+                'subject': subject,
+                'rejected': preview.rejected,
+                'varianceRemoved': preview.variance_removed(),
+                'candidates': preview.rank_candidates(),
+            }
+        except Exception as e:
+            error_msg = f"Error previewing component rejection: {str(e)}"
+            print(error_msg)
+            self.configSaved.emit(error_msg)
+            return {}
+
+    @pyqtSlot(str, str)
+    def executePreprocessingBackend(self, backend, folder_path):
+        """Run preprocess_data.m's pipeline with MATLAB ('matlab') or the NumPy backend ('numpy')"""
+        if backend != 'numpy':
+            self.executePreprocessing()
+            return
+        folder_path = folder_path.replace('file:///', '') if folder_path else self._current_data_dir
+
+        def run_numpy():
+            try:
+                script_path = self._get_preprocess_data_script_path()
+                config = read_preprocess_config(script_path) if script_path else read_preprocess_config()
+                summary = preprocess_folder(folder_path, config)
+                self.configSaved.emit(f"Preprocessed {len(summary['subjects'])} subjects, running FastICA...")
+                # ica_numcomponent/ica_warm_start live in preprocessing.m, next to the preprocess_data.m used above
+                ica_script_path = self._get_preprocessing_script_path()
+                ica_options = read_ica_settings(ica_script_path) if ica_script_path else read_ica_settings()
+                ica_summary = run_ica_folder(folder_path, ica_options)
+                ica_report = format_ica_summary(ica_summary)
+                print(ica_report)
+                self.configSaved.emit(ica_report)
+                message = (f"NumPy preprocessing finished: {len(summary['subjects'])} subjects, "
+                           f"{sum(summary['trials'])} trials written to {summary['store']}"
+                           f"{' and data.mat' if summary['mat'] else ''}; "
+                           f"ICA weights ({sum(ica_summary['seconds']):.1f} s of decomposition) in data_ICApplied.mat")
+                print(message)
+                self.configSaved.emit(message)
+                self.fileExplorerRefresh.emit()
+            except Exception as e:
+                error_msg = f"Error running NumPy preprocessing: {str(e)}"
+                print(error_msg)
+                self.configSaved.emit(error_msg)
+
+        self.configSaved.emit("Starting NumPy preprocessing in the background...")
+        threading.Thread(target=run_numpy, daemon=True).start()
+
     @pyqtSlot(result=str)
     def getCurrentDataDirectory(self):
         """Read the current data_dir from preprocessing.m"""
@@ -1842,15 +2150,15 @@ class MatlabExecutor(QObject):
             data_dir = os.path.dirname(mat_file_path)
             mat_filename = os.path.basename(mat_file_path)
             
-            # Debug: Check what's actually in the file
+            # Check what's in the file from variable headers only (no payload is read)
             try:
-                import scipy.io as sio
                 print(f"Checking contents of: {mat_file_path}")
-                mat_data = sio.loadmat(mat_file_path)
-                print(f"All variables in file: {list(mat_data.keys())}")
+                variables = inspect_mat(mat_file_path)
+                for variable in variables:
+                    shape_text = 'x'.join(str(dim) for dim in variable.shape)
+                    print(f"  {variable.name}: {variable.matlab_class} [{shape_text}]")
                 
-                # Look for any variable that might be ICA data (excluding metadata)
-                data_vars = [k for k in mat_data.keys() if not k.startswith('__')]
+                data_vars = [variable.name for variable in variables]
                 print(f"Data variables found: {data_vars}")
                 
                 if not data_vars:
@@ -1858,35 +2166,19 @@ class MatlabExecutor(QObject):
                     self.configSaved.emit("Error: No data variables found in the .mat file")
                     return
                     
+            except ImportError:
+                msg = (
+                    "Unable to read MATLAB v7.3 file because h5py is not installed. "
+                    "Please install h5py to browse ICA files saved in v7.3 format."
+                )
+                print(msg)
+                self.configSaved.emit(msg)
+                return
             except Exception as e:
                 error_message = str(e)
-                print(f"Primary loader failed: {error_message}")
-                if "Please use HDF reader" in error_message or "matlab v7.3" in error_message.lower():
-                    try:
-                        import h5py
-                        print("Falling back to h5py for v7.3 file inspection...")
-                        with h5py.File(mat_file_path, 'r') as h5_file:
-                            data_vars = list(h5_file.keys())
-                            print(f"HDF5 datasets in file: {data_vars}")
-                        if not data_vars:
-                            self.configSaved.emit("Error: No datasets found in the v7.3 .mat file")
-                            return
-                    except ImportError:
-                        msg = (
-                            "Unable to read MATLAB v7.3 file because h5py is not installed. "
-                            "Please install h5py to browse ICA files saved in v7.3 format."
-                        )
-                        print(msg)
-                        self.configSaved.emit(msg)
-                        return
-                    except Exception as h5_error:
-                        msg = f"Error reading v7.3 .mat file with h5py: {h5_error}"
-                        print(msg)
-                        self.configSaved.emit(msg)
-                        return
-                else:
-                    self.configSaved.emit(f"Error reading .mat file: {error_message}")
-                    return
+                print(f"Error inspecting .mat file: {error_message}")
+                self.configSaved.emit(f"Error reading .mat file: {error_message}")
+                return
             
             # Get paths
             preprocessing_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "features", "preprocessing")